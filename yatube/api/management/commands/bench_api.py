@@ -0,0 +1,90 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from posts.models import Group, Post
+
+User = get_user_model()
+
+"""Свой кеш замера в памяти процесса: cache.clear() без кеша страниц
+не должен сбрасывать общий кеш работающего сайта.
+"""
+BENCH_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'bench_api',
+    },
+}
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность JSON API и HTML-страниц '
+            'на одной синтетической ленте: без кеша и из кеша страниц '
+            'в памяти процесса. Все данные откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--authors', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=2000)
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Запросов к каждой странице.')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        with transaction.atomic(), override_settings(
+                ALLOWED_HOSTS=['*'], CACHES=BENCH_CACHES):
+            group = self.make_feed(rnd, options)
+            pages = (
+                ('html /', reverse('posts:index')),
+                ('api posts', reverse('api:posts')),
+                ('api fields', reverse('api:posts') + '?fields=id,text'),
+                ('html group', reverse('posts:group_page',
+                                       kwargs={'slug': group.slug})),
+                ('api group', reverse('api:posts') + f'?group={group.slug}'),
+            )
+            client = Client()
+            for name, url in pages:
+                for cached in (False, True):
+                    self.run(client, name, url, cached, options['requests'])
+            transaction.set_rollback(True)
+            cache.clear()
+
+    def make_feed(self, rnd, options):
+        prefix = f'bench_api_{options["seed"]}_'
+        User.objects.bulk_create(
+            User(username=f'{prefix}{i}') for i in range(options['authors'])
+        )
+        authors = list(User.objects.filter(
+            username__startswith=prefix).values_list('id', flat=True))
+        group = Group.objects.create(title='bench', slug=f'{prefix}group',
+                                     description='bench')
+        Post.objects.bulk_create(
+            Post(author_id=rnd.choice(authors), text=f'bench {i}',
+                 group=group if rnd.random() < 0.3 else None)
+            for i in range(options['posts'])
+        )
+        return group
+
+    def run(self, client, name, url, cached, count):
+        """Средние время, запросы к базе и размер ответа страницы."""
+        elapsed = queries = size = 0
+        for _ in range(count):
+            if not cached:
+                cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = client.get(url)
+                elapsed += time.perf_counter() - start
+            queries += len(captured)
+            size += len(response.content)
+        mode = 'кеш' if cached else 'без кеша'
+        self.stdout.write(
+            f'{name:>10} {mode:>8}: {count / elapsed:8.1f} запросов/с, '
+            f'{queries / count:.1f} SQL/ответ, {size / count / 1024:.1f} КБ'
+        )
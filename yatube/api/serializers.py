@@ -0,0 +1,88 @@
+class FieldsError(Exception):
+    """В ?fields= есть поля, которых у ресурса нет."""
+
+
+def user_data(user):
+    return {
+        'id': user.pk,
+        'username': user.username,
+        'full_name': user.get_full_name(),
+    }
+
+
+def group_data(group):
+    return {
+        'id': group.pk,
+        'slug': group.slug,
+        'title': group.title,
+    }
+
+
+class Resource:
+    """Представление модели в API; связи подгружаются, только если нужны."""
+
+    def __init__(self, fields, embedded=None):
+        self.fields = fields
+        self.embedded = embedded or {}
+
+    def parse_fields(self, value):
+        """Поля из значения ?fields=, по умолчанию - все."""
+        if not value:
+            return list(self.fields)
+        names = list(dict.fromkeys(
+            name.strip() for name in value.split(',') if name.strip()))
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise FieldsError(', '.join(unknown))
+        return names
+
+    def prepare(self, queryset, names):
+        related = [self.embedded[name] for name in names
+                   if name in self.embedded]
+        return queryset.select_related(*related) if related else queryset
+
+    def serialize(self, obj, names):
+        return {name: self.fields[name](obj) for name in names}
+
+
+POST = Resource(
+    {
+        'id': lambda post: post.pk,
+        'text': lambda post: post.text,
+        'created': lambda post: post.created,
+        'author': lambda post: user_data(post.author),
+        # group_id проверяется до обращения к group: без группы
+        # связь не подгружается и запроса нет
+        'group': lambda post: (
+            group_data(post.group) if post.group_id else None),
+        'image': lambda post: post.image.url if post.image else None,
+        'comments_count': lambda post: post.comments_count,
+    },
+    embedded={'author': 'author', 'group': 'group'},
+)
+
+COMMENT = Resource(
+    {
+        'id': lambda comment: comment.pk,
+        'post': lambda comment: comment.post_id,
+        'text': lambda comment: comment.text,
+        'created': lambda comment: comment.created,
+        'author': lambda comment: user_data(comment.author),
+    },
+    embedded={'author': 'author'},
+)
+
+GROUP = Resource({
+    'id': lambda group: group.pk,
+    'slug': lambda group: group.slug,
+    'title': lambda group: group.title,
+    'description': lambda group: group.description,
+})
+
+FOLLOW = Resource(
+    {
+        'id': lambda follow: follow.pk,
+        'author': lambda follow: user_data(follow.author),
+    },
+    embedded={'author': 'author'},
+)
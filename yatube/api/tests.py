@@ -0,0 +1,236 @@
+# api/tests.py
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from posts.models import Comment, Follow, Group, Post
+
+from .views import API_PAGE_SIZE
+
+User = get_user_model()
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.authors = [
+            User.objects.create_user(username=f'author{i}',
+                                     first_name='Имя', last_name=f'№{i}')
+            for i in range(3)
+        ]
+        cls.groups = [
+            Group.objects.create(title=f'Группа №{i}', slug=f'api-slug{i}',
+                                 description='Описание')
+            for i in range(2)
+        ]
+        cls.posts = [
+            Post.objects.create(
+                author=cls.authors[i % 3],
+                text=f'Пост №{i}',
+                group=cls.groups[i % 2] if i % 3 else None,
+            )
+            for i in range(API_PAGE_SIZE + 5)
+        ]
+        cls.post = cls.posts[-1]
+        for author in cls.authors:
+            Comment.objects.create(post=cls.post, author=author,
+                                   text='Коммент')
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+
+    def get_all(self, url):
+        """Все записи списка, по страницам через next."""
+        results = []
+        while url:
+            data = self.client.get(url).json()
+            results.extend(data['results'])
+            url = data['next']
+        return results
+
+    def test_posts_cursor_pagination(self):
+        """Лента отдаётся целиком, новые сверху, без повторов."""
+        url = reverse('api:posts')
+        first = self.client.get(url).json()
+        self.assertEqual(len(first['results']), API_PAGE_SIZE)
+        self.assertIsNone(first['previous'])
+        ids = [post['id'] for post in self.get_all(url)]
+        self.assertEqual(ids, [post.pk for post in reversed(self.posts)])
+        second = self.client.get(first['next']).json()
+        self.assertEqual(
+            self.client.get(second['previous']).json()['results'],
+            first['results'])
+        response = self.client.get(url, {'limit': 3})
+        self.assertEqual(len(response.json()['results']), 3)
+        for params in ({'cursor': 'broken'}, {'limit': 'x'}):
+            with self.subTest(params=params):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('detail', response.json())
+
+    def test_embedded_objects_without_n_plus_one(self):
+        """Авторы и группы приходят в том же запросе, что и посты."""
+        with self.assertNumQueries(2):
+            data = self.client.get(reverse('api:posts')).json()
+        post = data['results'][0]
+        self.assertEqual(post['author'], {
+            'id': self.post.author.pk,
+            'username': self.post.author.username,
+            'full_name': self.post.author.get_full_name(),
+        })
+        self.assertIsNone(post['group'])
+        self.assertEqual(data['results'][1]['group']['slug'],
+                         self.posts[-2].group.slug)
+
+    def test_sparse_fieldsets(self):
+        """?fields= оставляет только нужные поля и лишние JOIN."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('api:posts'),
+                                       {'fields': 'id,text'})
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'text'})
+        self.assertNotIn('JOIN', queries.captured_queries[-1]['sql'])
+        response = self.client.get(reverse('api:posts'),
+                                   {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_filters(self):
+        group = self.groups[0]
+        author = self.authors[1]
+        cases = (
+            ({'group': group.slug},
+             [post for post in self.posts if post.group == group]),
+            ({'author': author.username},
+             [post for post in self.posts if post.author == author]),
+            ({'group': 'missing'}, []),
+        )
+        for params, posts in cases:
+            with self.subTest(params=params):
+                url = reverse('api:posts') + '?' + '&'.join(
+                    f'{key}={value}' for key, value in params.items())
+                self.assertEqual(
+                    [post['id'] for post in self.get_all(url)],
+                    [post.pk for post in reversed(posts)])
+
+    def test_details(self):
+        response = self.client.get(
+            reverse('api:post', kwargs={'post_id': self.post.pk}))
+        self.assertEqual(response.json()['text'], self.post.text)
+        response = self.client.get(
+            reverse('api:group', kwargs={'slug': self.groups[1].slug}))
+        self.assertEqual(response.json()['title'], self.groups[1].title)
+        comments = self.get_all(
+            reverse('api:comments', kwargs={'post_id': self.post.pk}))
+        self.assertEqual([comment['author']['id'] for comment in comments],
+                         [author.pk for author in reversed(self.authors)])
+        groups = self.get_all(reverse('api:groups') + '?limit=1')
+        self.assertEqual([group['slug'] for group in groups],
+                         [group.slug for group in reversed(self.groups)])
+        for url in (reverse('api:post', kwargs={'post_id': 0}),
+                    reverse('api:comments', kwargs={'post_id': 0}),
+                    reverse('api:group', kwargs={'slug': 'missing'})):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 404)
+                self.assertIn('detail', response.json())
+        response = self.client.post(reverse('api:posts'))
+        self.assertEqual(response.status_code, 405)
+
+    def test_follows(self):
+        """Подписки видны только своему пользователю."""
+        url = reverse('api:follows')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        reader = User.objects.create_user(username='reader')
+        for author in self.authors[:2]:
+            Follow.objects.create(user=reader, author=author)
+        self.client.force_login(reader)
+        response = self.client.get(url)
+        self.assertEqual(
+            [follow['author']['username']
+             for follow in response.json()['results']],
+            [author.username for author in reversed(self.authors[:2])])
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            .status_code, 304)
+
+    @override_settings(PAGE_CACHE_VERIFY=False)
+    def test_cache_and_etag(self):
+        """Повтор из кеша, 304 по ETag, новый пост сбрасывает ленту."""
+        url = reverse('api:posts')
+        first = self.client.get(url)
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertEqual(second.content, first.content)
+        cache.clear()
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        post = Post.objects.create(author=self.authors[0],
+                                   text='<!--hole:WyJ4Il0=-->')
+        data = self.client.get(url).json()
+        self.assertEqual(data['results'][0]['id'], post.pk)
+        # Метка дыры в тексте поста не подставляется в JSON
+        self.assertEqual(data['results'][0]['text'], post.text)
+
+    def test_comment_updates_cached_lists(self):
+        """Новый комментарий меняет comments_count во всех лентах поста."""
+        post = self.posts[-2]
+        base = reverse('api:posts')
+        urls = (base, f'{base}?group={post.group.slug}',
+                f'{base}?author={post.author.username}')
+        before = {url: self.client.get(url) for url in urls}
+        Comment.objects.create(post=post, author=self.authors[0],
+                               text='Ещё')
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=before[url]['ETag'])
+                self.assertEqual(response.status_code, 200)
+                counts = {item['id']: item['comments_count']
+                          for item in response.json()['results']}
+                self.assertEqual(counts[post.pk], 1)
+
+
+class ExportApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.staff = User.objects.create_user(username='staff',
+                                             is_staff=True)
+        cls.posts = [Post.objects.create(author=cls.author, text=f'№{i}')
+                     for i in range(3)]
+
+    def test_access(self):
+        url = reverse('api:export', kwargs={'kind': 'posts'})
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.client.force_login(self.author)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_streaming_export(self):
+        """Выгрузка идёт потоком; граница годится для следующей."""
+        self.client.force_login(self.staff)
+        url = reverse('api:export', kwargs={'kind': 'posts'})
+        response = self.client.get(url)
+        self.assertTrue(response.streaming)
+        self.assertIn('no-cache', response['Cache-Control'])
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines],
+                         [post.pk for post in self.posts])
+        post = Post.objects.create(author=self.author, text='Новый')
+        response = self.client.get(url, {'since': response['X-Export-Until'],
+                                         'format': 'csv'})
+        content = b''.join(response.streaming_content).decode()
+        self.assertEqual(content.splitlines()[1].split(',')[0], str(post.pk))
+        for params in ({'format': 'xml'}, {'since': 'вчера'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(url, params).status_code,
+                                 400)
+        response = self.client.get(
+            reverse('api:export', kwargs={'kind': 'users'}))
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,48 @@
+# api/urls.py
+from django.urls import path
+
+from . import views
+
+app_name = 'api'
+
+urlpatterns = [
+    # Посты и комментарии к ним
+    path(
+        'posts/',
+        views.posts,
+        name='posts'
+    ),
+    path(
+        'posts/<int:post_id>/',
+        views.post,
+        name='post'
+    ),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.comments,
+        name='comments'
+    ),
+    # Группы
+    path(
+        'groups/',
+        views.groups,
+        name='groups'
+    ),
+    path(
+        'groups/<slug:slug>/',
+        views.group,
+        name='group'
+    ),
+    # Выгрузка для аналитики
+    path(
+        'export/<str:kind>/',
+        views.export,
+        name='export'
+    ),
+    # Подписки текущего пользователя
+    path(
+        'follows/',
+        views.follows,
+        name='follows'
+    ),
+]
@@ -0,0 +1,203 @@
+from functools import wraps
+
+from django.contrib.auth import get_user_model
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import add_never_cache_headers
+from django.views.decorators.http import require_safe
+from core.paginator import CursorPaginator, InvalidCursor
+from posts import exporter
+from posts.models import Comment, Follow, Group, Post
+from posts.pagecache import shared_cache
+from posts.stamps import (INDEX_SCOPE, comments_scope, conditional,
+                          group_scope, post_scope, profile_scope)
+
+from .serializers import COMMENT, FOLLOW, GROUP, POST, FieldsError
+
+User = get_user_model()
+
+"""Размер страницы списков API по умолчанию и наибольший для ?limit=.
+"""
+API_PAGE_SIZE: int = 20
+API_MAX_PAGE_SIZE: int = 100
+
+"""Ключи курсора для моделей без даты создания."""
+ID_KEYS = ('id', 'id')
+
+
+class ApiError(Exception):
+    def __init__(self, status, detail):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status,
+                        json_dumps_params={'ensure_ascii': False})
+
+
+def api_view(view):
+    """Вьюха API только для чтения; ошибки отдаются в JSON."""
+    @require_safe
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except Http404:
+            return json_response({'detail': 'Не найдено.'}, status=404)
+        except ApiError as error:
+            return json_response({'detail': error.detail},
+                                 status=error.status)
+    return wrapper
+
+
+def authenticated(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            raise ApiError(401, 'Нужна авторизация.')
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def requested_fields(request, resource):
+    try:
+        return resource.parse_fields(request.GET.get('fields'))
+    except FieldsError as error:
+        raise ApiError(400, f'Неизвестные поля: {error}.')
+
+
+def page_size(request):
+    try:
+        size = int(request.GET.get('limit', API_PAGE_SIZE))
+    except ValueError:
+        raise ApiError(400, 'limit должен быть числом.')
+    return min(max(size, 1), API_MAX_PAGE_SIZE)
+
+
+def page_link(request, cursor):
+    """Относительная ссылка: страница попадает в общий кеш, а хост
+    у посетителей может быть разным.
+    """
+    if cursor is None:
+        return None
+    params = request.GET.copy()
+    params['cursor'] = cursor
+    return f'{request.path}?{params.urlencode()}'
+
+
+def paginate(request, resource, queryset, **keys):
+    """Страница списка по курсору; keys по умолчанию (created, id)."""
+    names = requested_fields(request, resource)
+    paginator = CursorPaginator(resource.prepare(queryset, names),
+                                page_size(request), **keys)
+    try:
+        page = paginator.page(request.GET.get('cursor'))
+    except InvalidCursor:
+        raise ApiError(400, 'Неверный курсор.')
+    return json_response({
+        'results': [resource.serialize(obj, names) for obj in page],
+        'next': page_link(request, page.next_cursor),
+        'previous': page_link(request, page.previous_cursor),
+    })
+
+
+def detail(request, resource, queryset, **lookup):
+    names = requested_fields(request, resource)
+    obj = get_object_or_404(resource.prepare(queryset, names), **lookup)
+    return json_response(resource.serialize(obj, names))
+
+
+def post_list_scopes(request):
+    """Лента API показывает и число комментариев постов."""
+    scopes = []
+    if 'group' in request.GET:
+        scopes.append(group_scope(request.GET['group']))
+    if 'author' in request.GET:
+        scopes.append(profile_scope(request.GET['author']))
+    scopes = scopes or [INDEX_SCOPE]
+    return scopes + [comments_scope(scope) for scope in scopes]
+
+
+@api_view
+@shared_cache(post_list_scopes)
+def posts(request):
+    """Лента постов; ?group=<slug> и ?author=<username> сужают её."""
+    post_list = Post.objects.all()
+    # Подзапрос вместо JOIN: лента идёт по индексу (group, created, id)
+    if 'group' in request.GET:
+        post_list = post_list.filter(group_id__in=Group.objects.filter(
+            slug=request.GET['group']).values('id'))
+    if 'author' in request.GET:
+        post_list = post_list.filter(author_id__in=User.objects.filter(
+            username=request.GET['author']).values('id'))
+    return paginate(request, POST, post_list)
+
+
+@api_view
+@shared_cache(lambda request, post_id: [post_scope(post_id)])
+def post(request, post_id):
+    return detail(request, POST, Post.objects.all(), pk=post_id)
+
+
+@api_view
+@shared_cache(lambda request, post_id: [post_scope(post_id)])
+def comments(request, post_id):
+    get_object_or_404(Post.objects.only('id'), pk=post_id)
+    return paginate(request, COMMENT,
+                    Comment.objects.filter(post_id=post_id))
+
+
+@api_view
+@shared_cache(lambda request: [INDEX_SCOPE])
+def groups(request):
+    return paginate(request, GROUP, Group.objects.all(),
+                    keys=ID_KEYS, parse_key=int)
+
+
+@api_view
+@shared_cache(lambda request, slug: [group_scope(slug)])
+def group(request, slug):
+    return detail(request, GROUP, Group.objects.all(), slug=slug)
+
+
+@api_view
+@authenticated
+@conditional(lambda request: [profile_scope(request.user.username)])
+def follows(request):
+    """Подписки текущего пользователя. Ответ у каждого свой, поэтому
+    без общего кеша - только ETag.
+    """
+    return paginate(request, FOLLOW,
+                    Follow.objects.filter(user=request.user),
+                    keys=ID_KEYS, parse_key=int)
+
+
+@api_view
+@authenticated
+def export(request, kind):
+    """Потоковая выгрузка для персонала; граница - в X-Export-Until."""
+    if not request.user.is_staff:
+        raise ApiError(403, 'Выгрузка доступна только персоналу.')
+    source = exporter.SOURCES.get(kind)
+    if source is None:
+        raise Http404
+    fmt = request.GET.get('format', 'jsonl')
+    if fmt not in exporter.FORMATS:
+        raise ApiError(400, f'Неизвестный формат {fmt}.')
+    since = request.GET.get('since')
+    try:
+        since = source.parse_watermark(since) if since else None
+    except exporter.WatermarkError:
+        raise ApiError(400, 'Неверный since.')
+    until = source.upper_bound()
+    _, content_type, extension = exporter.FORMATS[fmt]
+    response = StreamingHttpResponse(
+        exporter.stream(source, fmt, since, until),
+        content_type=f'{content_type}; charset=utf-8')
+    response['Content-Disposition'] = (
+        f'attachment; filename="{kind}.{extension}"')
+    response['X-Export-Until'] = source.format_watermark(until)
+    add_never_cache_headers(response)
+    return response
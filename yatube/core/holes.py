@@ -0,0 +1,47 @@
+import base64
+import json
+import re
+
+from django.template.loader import render_to_string
+
+# Метка дыры в общей странице. Текст пользователей экранируется,
+# поэтому подделать метку в посте или комментарии нельзя.
+MARKER_RE = re.compile(r'<!--hole:([A-Za-z0-9_=-]+)-->')
+
+_context_functions = {}
+
+
+def register(template_name):
+    """Регистрирует функцию контекста дыры: (request, аргументы) -> словарь."""
+    def decorator(func):
+        _context_functions[template_name] = func
+        return func
+    return decorator
+
+
+def punching(request):
+    """Рисуется ли страница для общего кеша: дыры остаются метками."""
+    return getattr(request, 'punch_holes', False)
+
+
+def marker(template_name, kwargs):
+    data = json.dumps([template_name, kwargs]).encode()
+    return f'<!--hole:{base64.urlsafe_b64encode(data).decode()}-->'
+
+
+def render(request, template_name, kwargs):
+    """Содержимое дыры для текущего пользователя."""
+    context = dict(kwargs)
+    func = _context_functions.get(template_name)
+    if func is not None:
+        context.update(func(request, **kwargs))
+    return render_to_string(template_name, context, request=request)
+
+
+def stitch(request, content):
+    """Подставляет в общую страницу дыры текущего пользователя."""
+    def replace(match):
+        template_name, kwargs = json.loads(
+            base64.urlsafe_b64decode(match.group(1)))
+        return render(request, template_name, kwargs)
+    return MARKER_RE.sub(replace, content.decode()).encode()
@@ -0,0 +1,27 @@
+import base64
+import io
+
+from PIL import Image
+
+"""Длинная сторона LQIP-заглушки в пикселях."""
+PLACEHOLDER_SIZE: int = 16
+
+"""Качество JPEG заглушки: она всё равно показывается размытой."""
+PLACEHOLDER_QUALITY: int = 40
+
+
+def describe(file):
+    """Ширина, высота и LQIP-заглушка картинки; файл перематывается в начало.
+    """
+    file.seek(0)
+    with Image.open(file) as image:
+        width, height = image.size
+        # JPEG сразу декодируется в уменьшенном виде
+        image.draft('RGB', (PLACEHOLDER_SIZE * 4, PLACEHOLDER_SIZE * 4))
+        preview = image.convert('RGB')
+    file.seek(0)
+    preview.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+    buffer = io.BytesIO()
+    preview.save(buffer, format='JPEG', quality=PLACEHOLDER_QUALITY)
+    data = base64.b64encode(buffer.getvalue()).decode()
+    return width, height, f'data:image/jpeg;base64,{data}'
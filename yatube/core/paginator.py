@@ -0,0 +1,136 @@
+import base64
+import binascii
+
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+ELLIPSIS = '…'
+
+
+def elided_page_range(number, num_pages, on_each_side=2, on_ends=1):
+    """Номера страниц для навигации: края и окно вокруг текущей."""
+    if num_pages <= (on_each_side + on_ends) * 2:
+        return list(range(1, num_pages + 1))
+    pages = []
+    if number > on_each_side + on_ends + 2:
+        pages.extend(range(1, on_ends + 1))
+        pages.append(ELLIPSIS)
+        pages.extend(range(number - on_each_side, number + 1))
+    else:
+        pages.extend(range(1, number + 1))
+    if number < num_pages - on_each_side - on_ends - 1:
+        pages.extend(range(number + 1, number + on_each_side + 1))
+        pages.append(ELLIPSIS)
+        pages.extend(range(num_pages - on_ends + 1, num_pages + 1))
+    else:
+        pages.extend(range(number + 1, num_pages + 1))
+    return pages
+
+
+class InvalidCursor(Exception):
+    """Курсор не удалось разобрать."""
+
+
+def keyset(queryset, keys, direction, bound):
+    """Строки queryset после bound по keys: 'n' - к старым, 'p' - к новым."""
+    created_field, id_field = keys
+    if direction == 'n':
+        ordering = (f'-{created_field}', f'-{id_field}')
+        lookup = 'lt'
+    else:
+        ordering = (created_field, id_field)
+        lookup = 'gt'
+    if bound is not None:
+        created, pk = bound
+        queryset = queryset.filter(
+            Q(**{f'{created_field}__{lookup}': created})
+            | Q(**{created_field: created, f'{id_field}__{lookup}': pk})
+        )
+    return queryset.order_by(*ordering)
+
+
+class CursorPaginator(Paginator):
+    """Пагинация по ключу (created, id) без COUNT(*) и OFFSET.
+
+    Страницы - обычные Page с next_cursor и previous_cursor; номер
+    страницы и num_pages лишь отличают первую и последнюю.
+    """
+
+    cursor_mode = True
+
+    def __init__(self, object_list, per_page, keys=('created', 'id'),
+                 parse_key=parse_datetime):
+        super().__init__(object_list, per_page)
+        self.keys = keys
+        self.parse_key = parse_key
+
+    def encode_cursor(self, obj, direction):
+        created_field, id_field = self.keys
+        created = getattr(obj, created_field)
+        if hasattr(created, 'isoformat'):
+            created = created.isoformat()
+        value = f'{direction}|{created}|{getattr(obj, id_field)}'
+        return base64.urlsafe_b64encode(value.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        padding = '=' * (-len(cursor) % 4)
+        try:
+            value = base64.urlsafe_b64decode(cursor + padding).decode()
+            direction, created, pk = value.split('|')
+            created = self.parse_key(created)
+            pk = int(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError) as error:
+            raise InvalidCursor(cursor) from error
+        if direction not in ('n', 'p') or created is None:
+            raise InvalidCursor(cursor)
+        return direction, created, pk
+
+    def page(self, cursor=None):
+        """Возвращает страницу, следующую за курсором (или первую)."""
+        if not cursor:
+            direction, bound = 'n', None
+        else:
+            direction, created, pk = self.decode_cursor(cursor)
+            bound = (created, pk)
+        rows = self.fetch(direction, bound, self.per_page + 1)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == 'n':
+            return self._build_page(rows, has_next=has_more,
+                                    has_previous=bound is not None)
+        rows.reverse()
+        return self._build_page(rows, has_next=True, has_previous=has_more)
+
+    def fetch(self, direction, bound, limit):
+        """Строки после bound; источник с методом keyset() отдаёт их сам."""
+        if hasattr(self.object_list, 'keyset'):
+            return self.object_list.keyset(direction, bound, limit)
+        return list(keyset(self.object_list, self.keys, direction, bound)
+                    [:limit])
+
+    def get_page(self, cursor=None):
+        """Как page(), но при битом курсоре отдаёт первую страницу."""
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self.page()
+
+    def _build_page(self, rows, has_next, has_previous):
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = self.encode_cursor(rows[-1], 'n')
+        if rows and has_previous:
+            previous_cursor = self.encode_cursor(rows[0], 'p')
+        # has_next() и has_previous() Page сравнивают номер с num_pages
+        number = 1 if previous_cursor is None else 2
+        self._num_pages = number + (next_cursor is not None)
+        page = Page(rows, number, self)
+        page.next_cursor = next_cursor
+        page.previous_cursor = previous_cursor
+        return page
+
+    @property
+    def num_pages(self):
+        return getattr(self, '_num_pages', 1)
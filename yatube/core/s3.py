@@ -0,0 +1,237 @@
+import datetime
+import hashlib
+import hmac
+from urllib.parse import quote, urlencode, urlsplit
+from xml.etree import ElementTree
+
+import requests
+from requests.adapters import HTTPAdapter
+
+ALGORITHM = 'AWS4-HMAC-SHA256'
+UNSIGNED_PAYLOAD = 'UNSIGNED-PAYLOAD'
+XMLNS = '{http://s3.amazonaws.com/doc/2006-03-01/}'
+
+
+class S3Error(Exception):
+    """Ответ S3 с кодом ошибки."""
+
+    def __init__(self, status, code, message=''):
+        super().__init__(f'{status} {code}: {message}')
+        self.status = status
+        self.code = code
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _hmac(key, message):
+    return hmac.new(key, message.encode(), hashlib.sha256).digest()
+
+
+def canonical_query(params):
+    return '&'.join(
+        f'{quote(str(key), safe="~")}={quote(str(value), safe="~")}'
+        for key, value in sorted(params.items())
+    )
+
+
+def find(element, tag):
+    """Текст дочернего элемента с учётом пространства имён S3."""
+    node = element.find(XMLNS + tag)
+    if node is None:
+        node = element.find(tag)
+    return None if node is None else node.text
+
+
+def find_all(element, tag):
+    return element.findall(XMLNS + tag) or element.findall(tag)
+
+
+class Signer:
+    """Подпись запросов AWS Signature V4, общая для клиента и заглушки."""
+
+    def __init__(self, access_key, secret_key, region):
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+
+    def scope(self, date):
+        return f'{date}/{self.region}/s3/aws4_request'
+
+    def signature(self, method, path, params, headers, payload_hash,
+                  timestamp):
+        """Подпись запроса; headers - подписываемые заголовки."""
+        names = sorted(name.lower() for name in headers)
+        lowered = {name.lower(): str(value).strip()
+                   for name, value in headers.items()}
+        canonical_request = '\n'.join([
+            method,
+            quote(path, safe='/~'),
+            canonical_query(params),
+            ''.join(f'{name}:{lowered[name]}\n' for name in names),
+            ';'.join(names),
+            payload_hash,
+        ])
+        date = timestamp[:8]
+        string_to_sign = '\n'.join([
+            ALGORITHM,
+            timestamp,
+            self.scope(date),
+            sha256(canonical_request.encode()),
+        ])
+        key = _hmac(f'AWS4{self.secret_key}'.encode(), date)
+        for part in (self.region, 's3', 'aws4_request'):
+            key = _hmac(key, part)
+        return hmac.new(key, string_to_sign.encode(),
+                        hashlib.sha256).hexdigest()
+
+    def authorization(self, method, path, params, headers, payload_hash,
+                      timestamp):
+        signature = self.signature(method, path, params, headers,
+                                   payload_hash, timestamp)
+        names = ';'.join(sorted(name.lower() for name in headers))
+        return (f'{ALGORITHM} '
+                f'Credential={self.access_key}/{self.scope(timestamp[:8])}, '
+                f'SignedHeaders={names}, Signature={signature}')
+
+    def presign_params(self, method, path, host, expires, timestamp):
+        """Параметры строки запроса для подписанной ссылки."""
+        params = {
+            'X-Amz-Algorithm': ALGORITHM,
+            'X-Amz-Credential':
+                f'{self.access_key}/{self.scope(timestamp[:8])}',
+            'X-Amz-Date': timestamp,
+            'X-Amz-Expires': str(expires),
+            'X-Amz-SignedHeaders': 'host',
+        }
+        params['X-Amz-Signature'] = self.signature(
+            method, path, params, {'host': host}, UNSIGNED_PAYLOAD,
+            timestamp)
+        return params
+
+
+def amz_timestamp(moment=None):
+    moment = moment or datetime.datetime.now(datetime.timezone.utc)
+    return moment.strftime('%Y%m%dT%H%M%SZ')
+
+
+class S3Client:
+    """Минимальный клиент S3 (path-style) с пулом соединений."""
+
+    def __init__(self, endpoint_url, bucket, access_key, secret_key,
+                 region='us-east-1', pool_size=10, timeout=30):
+        self.endpoint_url = endpoint_url.rstrip('/')
+        self.host = urlsplit(self.endpoint_url).netloc
+        self.bucket = bucket
+        self.signer = Signer(access_key, secret_key, region)
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def path(self, key=''):
+        return f'/{self.bucket}/{key}'
+
+    def request(self, method, key='', params=None, body=b'', headers=None,
+                stream=False, expected=(200,)):
+        params = params or {}
+        path = self.path(key)
+        timestamp = amz_timestamp()
+        payload_hash = sha256(body)
+        signed = {
+            'host': self.host,
+            'x-amz-content-sha256': payload_hash,
+            'x-amz-date': timestamp,
+        }
+        headers = {**(headers or {}), **signed}
+        headers['Authorization'] = self.signer.authorization(
+            method, path, params, signed, payload_hash, timestamp)
+        url = self.endpoint_url + quote(path, safe='/~')
+        if params:
+            url += '?' + canonical_query(params)
+        response = self.session.request(
+            method, url, data=body, headers=headers, stream=stream,
+            timeout=self.timeout)
+        if response.status_code not in expected:
+            code = message = ''
+            if response.content:
+                try:
+                    error = ElementTree.fromstring(response.content)
+                    code = find(error, 'Code') or ''
+                    message = find(error, 'Message') or ''
+                except ElementTree.ParseError:
+                    message = response.text[:200]
+            raise S3Error(response.status_code, code, message)
+        return response
+
+    def put_object(self, key, body, content_type=None):
+        headers = {'Content-Type': content_type} if content_type else {}
+        self.request('PUT', key, body=body, headers=headers)
+
+    def get_object(self, key):
+        """Ответ с телом объекта для чтения потоком."""
+        return self.request('GET', key, stream=True)
+
+    def head_object(self, key):
+        """Заголовки объекта или None, если его нет."""
+        response = self.request('HEAD', key, expected=(200, 404))
+        if response.status_code == 404:
+            return None
+        return response.headers
+
+    def delete_object(self, key):
+        self.request('DELETE', key, expected=(200, 204))
+
+    def list_objects(self, prefix='', delimiter=None, start_after=None):
+        """Ключи и общие префиксы по возрастанию, со всех страниц."""
+        params = {'list-type': '2', 'prefix': prefix}
+        if delimiter:
+            params['delimiter'] = delimiter
+        if start_after:
+            params['start-after'] = start_after
+        while True:
+            result = ElementTree.fromstring(
+                self.request('GET', params=params).content)
+            for common in find_all(result, 'CommonPrefixes'):
+                yield 'prefix', find(common, 'Prefix')
+            for item in find_all(result, 'Contents'):
+                yield 'key', find(item, 'Key')
+            token = find(result, 'NextContinuationToken')
+            if find(result, 'IsTruncated') != 'true' or not token:
+                return
+            params['continuation-token'] = token
+
+    def create_multipart_upload(self, key, content_type=None):
+        headers = {'Content-Type': content_type} if content_type else {}
+        result = ElementTree.fromstring(self.request(
+            'POST', key, params={'uploads': ''}, headers=headers).content)
+        return find(result, 'UploadId')
+
+    def upload_part(self, key, upload_id, number, body):
+        response = self.request('PUT', key, params={
+            'partNumber': number, 'uploadId': upload_id}, body=body)
+        return response.headers['ETag']
+
+    def complete_multipart_upload(self, key, upload_id, etags):
+        parts = ''.join(
+            f'<Part><PartNumber>{number}</PartNumber>'
+            f'<ETag>{etag}</ETag></Part>'
+            for number, etag in enumerate(etags, 1)
+        )
+        body = (f'<CompleteMultipartUpload>{parts}'
+                f'</CompleteMultipartUpload>').encode()
+        self.request('POST', key, params={'uploadId': upload_id}, body=body)
+
+    def abort_multipart_upload(self, key, upload_id):
+        self.request('DELETE', key, params={'uploadId': upload_id},
+                     expected=(200, 204))
+
+    def presigned_url(self, key, expires, moment=None, method='GET'):
+        """Ссылка, по которой объект отдаёт само хранилище."""
+        path = self.path(key)
+        params = self.signer.presign_params(
+            method, path, self.host, expires, amz_timestamp(moment))
+        return (self.endpoint_url + quote(path, safe='/~') + '?'
+                + urlencode(params, quote_via=quote))
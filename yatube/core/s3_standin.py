@@ -0,0 +1,276 @@
+import datetime
+import hashlib
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+from core.s3 import UNSIGNED_PAYLOAD, Signer, find, find_all, sha256
+
+"""Сколько записей отдаёт одна страница ListObjectsV2 по умолчанию."""
+MAX_KEYS: int = 1000
+
+
+class S3StandIn:
+    """S3-совместимый сервер в памяти: ровно то, чем пользуется S3Client."""
+
+    def __init__(self, access_key, secret_key, region='us-east-1',
+                 max_keys=MAX_KEYS):
+        self.signer = Signer(access_key, secret_key, region)
+        self.max_keys = max_keys
+        self.objects = {}
+        self.uploads = {}
+        self.connections = set()
+        self.lock = threading.Lock()
+        self.server = None
+
+    @property
+    def endpoint_url(self):
+        host, port = self.server.server_address
+        return f'http://{host}:{port}'
+
+    def start(self):
+        handler = type('Handler', (S3RequestHandler,), {'standin': self})
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        # Клиент держит соединения открытыми, ждать их при остановке нельзя
+        self.server.block_on_close = False
+        threading.Thread(target=self.server.serve_forever,
+                         daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def error_body(code, message=''):
+    return (f'<Error><Code>{code}</Code>'
+            f'<Message>{escape(message)}</Message></Error>').encode()
+
+
+class Rejected(Exception):
+    """Запрос отклонён с кодом ошибки S3."""
+
+    def __init__(self, status, code, message=''):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+
+
+class S3RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    standin = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_HEAD(self):
+        self.dispatch('HEAD')
+
+    def do_PUT(self):
+        self.dispatch('PUT')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def do_DELETE(self):
+        self.dispatch('DELETE')
+
+    def dispatch(self, method):
+        self.standin.connections.add(self.client_address)
+        url = urlsplit(self.path)
+        self.raw_path = unquote(url.path)
+        self.params = {
+            key: values[0] for key, values in
+            parse_qs(url.query, keep_blank_values=True).items()
+        }
+        length = int(self.headers.get('Content-Length') or 0)
+        self.body = self.rfile.read(length) if length else b''
+        _, _, self.key = self.raw_path.lstrip('/').partition('/')
+        try:
+            self.authenticate(method)
+            with self.standin.lock:
+                status, headers, body = getattr(self, method.lower())()
+        except Rejected as error:
+            status, headers = error.status, {}
+            body = error_body(error.code, str(error))
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if 'Content-Length' not in headers:
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if method != 'HEAD':
+            self.wfile.write(body)
+
+    def authenticate(self, method):
+        signer = self.standin.signer
+        host = {'host': self.headers['Host']}
+        if 'X-Amz-Signature' in self.params:
+            params = dict(self.params)
+            signature = params.pop('X-Amz-Signature')
+            timestamp = params.get('X-Amz-Date', '')
+            credential = params.get('X-Amz-Credential', '')
+            try:
+                signed_at = datetime.datetime.strptime(
+                    timestamp, '%Y%m%dT%H%M%SZ').replace(
+                    tzinfo=datetime.timezone.utc).timestamp()
+                expires = int(params.get('X-Amz-Expires', ''))
+            except ValueError:
+                raise Rejected(403, 'AccessDenied', 'Bad presigned URL')
+            if time.time() > signed_at + expires:
+                raise Rejected(403, 'AccessDenied', 'Request has expired')
+            expected = signer.signature(method, self.raw_path, params, host,
+                                        UNSIGNED_PAYLOAD, timestamp)
+        else:
+            fields = dict(
+                part.strip().split('=', 1) for part in
+                self.headers.get('Authorization', '').split(' ', 1)[-1]
+                .split(',') if '=' in part
+            )
+            signature = fields.get('Signature')
+            credential = fields.get('Credential', '')
+            timestamp = self.headers.get('x-amz-date', '')
+            payload_hash = self.headers.get('x-amz-content-sha256', '')
+            if payload_hash != sha256(self.body):
+                raise Rejected(400, 'XAmzContentSHA256Mismatch')
+            signed = {
+                name: self.headers.get(name, '')
+                for name in fields.get('SignedHeaders', 'host').split(';')
+            }
+            expected = signer.signature(method, self.raw_path, self.params,
+                                        signed, payload_hash, timestamp)
+        if credential.split('/', 1)[0] != signer.access_key:
+            raise Rejected(403, 'InvalidAccessKeyId')
+        if signature != expected:
+            raise Rejected(403, 'SignatureDoesNotMatch')
+
+    def get_object(self):
+        item = self.standin.objects.get(self.key)
+        if item is None:
+            raise Rejected(404, 'NoSuchKey', self.key)
+        return item
+
+    def object_headers(self, item):
+        return {
+            'Content-Type': item['content_type'],
+            'ETag': item['etag'],
+            'Last-Modified': formatdate(item['modified'], usegmt=True),
+        }
+
+    def head(self):
+        item = self.get_object()
+        headers = self.object_headers(item)
+        headers['Content-Length'] = str(len(item['body']))
+        return 200, headers, b''
+
+    def get(self):
+        if not self.key:
+            return self.list_objects()
+        item = self.get_object()
+        return 200, self.object_headers(item), item['body']
+
+    def put(self):
+        if 'uploadId' in self.params:
+            upload = self.standin.uploads.get(self.params['uploadId'])
+            if upload is None:
+                raise Rejected(404, 'NoSuchUpload')
+            etag = f'"{hashlib.md5(self.body).hexdigest()}"'
+            upload['parts'][int(self.params['partNumber'])] = (
+                etag, self.body)
+            return 200, {'ETag': etag}, b''
+        self.store(self.body)
+        return 200, {}, b''
+
+    def store(self, body, content_type=None):
+        self.standin.objects[self.key] = {
+            'body': body,
+            'content_type': content_type
+            or self.headers.get('Content-Type') or 'binary/octet-stream',
+            'etag': f'"{hashlib.md5(body).hexdigest()}"',
+            'modified': time.time(),
+        }
+
+    def post(self):
+        uploads = self.standin.uploads
+        if 'uploads' in self.params:
+            upload_id = hashlib.sha256(
+                f'{self.key}{time.time()}{len(uploads)}'.encode()
+            ).hexdigest()[:32]
+            uploads[upload_id] = {
+                'content_type': self.headers.get('Content-Type'),
+                'parts': {},
+            }
+            return 200, {}, (
+                f'<InitiateMultipartUploadResult>'
+                f'<UploadId>{upload_id}</UploadId>'
+                f'</InitiateMultipartUploadResult>').encode()
+        upload = uploads.pop(self.params.get('uploadId'), None)
+        if upload is None:
+            raise Rejected(404, 'NoSuchUpload')
+        body = []
+        request = ElementTree.fromstring(self.body)
+        for part in find_all(request, 'Part'):
+            etag, data = upload['parts'].get(
+                int(find(part, 'PartNumber')), (None, b''))
+            if etag != find(part, 'ETag'):
+                raise Rejected(400, 'InvalidPart')
+            body.append(data)
+        self.store(b''.join(body), upload['content_type'])
+        return 200, {}, b'<CompleteMultipartUploadResult/>'
+
+    def delete(self):
+        if 'uploadId' in self.params:
+            self.standin.uploads.pop(self.params['uploadId'], None)
+        else:
+            self.standin.objects.pop(self.key, None)
+        return 204, {}, b''
+
+    def list_objects(self):
+        """ListObjectsV2: ключи и общие префиксы по возрастанию."""
+        prefix = self.params.get('prefix', '')
+        delimiter = self.params.get('delimiter')
+        after = max(self.params.get('start-after', ''),
+                    self.params.get('continuation-token', ''))
+        max_keys = int(self.params.get('max-keys', self.standin.max_keys))
+        entries = []
+        for key in sorted(self.standin.objects):
+            if not key.startswith(prefix) or key <= after:
+                continue
+            if after.endswith(delimiter or '\0') and key.startswith(after):
+                continue
+            rest = key[len(prefix):]
+            if delimiter and delimiter in rest:
+                common = prefix + rest[:rest.index(delimiter) + 1]
+                if not entries or entries[-1] != ('prefix', common):
+                    entries.append(('prefix', common))
+            else:
+                entries.append(('key', key))
+        page, truncated = entries[:max_keys], len(entries) > max_keys
+        xml = ['<ListBucketResult>', f'<Prefix>{escape(prefix)}</Prefix>',
+               f'<IsTruncated>{str(truncated).lower()}</IsTruncated>']
+        if truncated:
+            xml.append(f'<NextContinuationToken>{escape(page[-1][1])}'
+                       f'</NextContinuationToken>')
+        for kind, value in page:
+            if kind == 'prefix':
+                xml.append(f'<CommonPrefixes><Prefix>{escape(value)}'
+                           f'</Prefix></CommonPrefixes>')
+            else:
+                size = len(self.standin.objects[value]['body'])
+                xml.append(f'<Contents><Key>{escape(value)}</Key>'
+                           f'<Size>{size}</Size></Contents>')
+        xml.append('</ListBucketResult>')
+        return 200, {'Content-Type': 'application/xml'}, ''.join(xml).encode()
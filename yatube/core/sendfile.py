@@ -0,0 +1,135 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# Имя файла в хранилище с адресацией по содержимому - sha256 содержимого
+CONTENT_HASH_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+class RangeNotSatisfiable(Exception):
+    """Диапазон Range целиком за пределами файла."""
+
+
+class RangeFile:
+    """Окно [start, start + length) файла; fileno() и tell() - как у файла."""
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.file.seek(start)
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def tell(self):
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+def file_etag(path, stat):
+    """Сильный ETag: хеш из имени файла или время изменения и размер."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    if CONTENT_HASH_RE.match(stem):
+        return f'"{stem}"'
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def parse_range(header, size):
+    """(первый, последний) байт из заголовка Range или None."""
+    match = RANGE_RE.match(header or '')
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # bytes=-N - последние N байт
+        if not int(last):
+            raise RangeNotSatisfiable
+        return max(size - int(last), 0), size - 1
+    first = int(first)
+    last = min(int(last), size - 1) if last else size - 1
+    if first > last:
+        if first >= size:
+            raise RangeNotSatisfiable
+        return None
+    return first, last
+
+
+def if_range_matches(request, etag, mtime):
+    """Совпадает ли If-Range с текущей версией файла."""
+    value = request.META.get('HTTP_IF_RANGE')
+    if not value:
+        return True
+    if value.startswith('"'):
+        return value == etag
+    return parse_http_date_safe(value) == int(mtime)
+
+
+def file_response(request, path, stat, etag, content_type):
+    """FileResponse с поддержкой Range для работы без прокси."""
+    size = stat.st_size
+    window = None
+    if if_range_matches(request, etag, stat.st_mtime):
+        try:
+            window = parse_range(request.META.get('HTTP_RANGE'), size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+    file = open(path, 'rb')
+    if window is None:
+        response = FileResponse(file, content_type=content_type)
+    else:
+        first, last = window
+        response = FileResponse(
+            RangeFile(file, first, last - first + 1),
+            status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {first}-{last}/{size}'
+        response['Content-Length'] = last - first + 1
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def send_file(request, path, name):
+    """Ответ с файлом path через MEDIA_SENDFILE или FileResponse."""
+    stat = os.stat(path)
+    etag = file_etag(path, stat)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        content_type, encoding = mimetypes.guess_type(path)
+        content_type = content_type or 'application/octet-stream'
+        backend = settings.MEDIA_SENDFILE
+        if backend == 'x-accel-redirect':
+            response = HttpResponse(content_type=content_type)
+            response['X-Accel-Redirect'] = (
+                settings.MEDIA_ACCEL_PREFIX + quote(name))
+        elif backend == 'x-sendfile':
+            response = HttpResponse(content_type=content_type)
+            response['X-Sendfile'] = path
+        else:
+            response = file_response(request, path, stat, etag,
+                                     content_type)
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    return response
@@ -0,0 +1,258 @@
+import datetime
+import hashlib
+import mimetypes
+import os
+import time
+from email.utils import parsedate_to_datetime
+from tempfile import SpooledTemporaryFile
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import (FileSystemStorage, Storage,
+                                       get_storage_class)
+from django.core.signals import setting_changed
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+from django.utils.functional import cached_property
+from core.s3 import S3Client, S3Error
+
+"""Сколько уровней вложенных каталогов строится из начала хеша."""
+SHARD_DEPTH: int = 2
+
+"""Длина имени каталога одного уровня в символах хеша."""
+SHARD_WIDTH: int = 2
+
+
+def content_hash(content):
+    """sha256 содержимого файла; файл читается частями."""
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def sharded_name(name, digest):
+    """posts/photo.JPG -> posts/ab/cd/abcd...ef.jpg"""
+    directory = os.path.dirname(name)
+    extension = os.path.splitext(name)[1].lower()
+    shards = [
+        digest[level * SHARD_WIDTH:(level + 1) * SHARD_WIDTH]
+        for level in range(SHARD_DEPTH)
+    ]
+    return os.path.join(directory, *shards, digest + extension)
+
+
+class ContentAddressedMixin:
+    """Хранилище, которое называет файлы по хешу содержимого."""
+
+    def content_name(self, name, content):
+        return sharded_name(name, content_hash(content))
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.content_name(name, content)
+        if self.exists(name):
+            return name
+        return self._save(name, content)
+
+
+@deconstructible
+class ContentAddressedStorage(ContentAddressedMixin, FileSystemStorage):
+    """Локальное хранилище с именами по хешу содержимого."""
+
+
+"""Сколько байт скачанного объекта держать в памяти до записи на диск."""
+SPOOL_SIZE: int = 10 * 1024 * 1024
+
+
+@deconstructible
+class S3Storage(Storage):
+    """Хранилище в S3-совместимом объектном хранилище, настройки S3_*."""
+
+    def __init__(self, endpoint_url=None, bucket=None, access_key=None,
+                 secret_key=None, region=None, public_url=None):
+        self._endpoint_url = endpoint_url
+        self._bucket = bucket
+        self._access_key = access_key
+        self._secret_key = secret_key
+        self._region = region
+        self._public_url = public_url
+        setting_changed.connect(self._clear_cached_properties)
+
+    def _clear_cached_properties(self, setting, **kwargs):
+        if setting.startswith('S3_'):
+            self.__dict__.pop('client', None)
+
+    @cached_property
+    def client(self):
+        return S3Client(
+            self._endpoint_url or settings.S3_ENDPOINT_URL,
+            self._bucket or settings.S3_BUCKET,
+            self._access_key or settings.S3_ACCESS_KEY,
+            self._secret_key or settings.S3_SECRET_KEY,
+            region=self._region or settings.S3_REGION,
+            pool_size=settings.S3_POOL_SIZE,
+        )
+
+    def key(self, name):
+        return name.replace('\\', '/').lstrip('/')
+
+    def _open(self, name, mode='rb'):
+        try:
+            response = self.client.get_object(self.key(name))
+        except S3Error as error:
+            if error.status == 404:
+                raise FileNotFoundError(name) from error
+            raise
+        spool = SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        for chunk in response.iter_content(File.DEFAULT_CHUNK_SIZE):
+            spool.write(chunk)
+        spool.seek(0)
+        return File(spool, name)
+
+    def _save(self, name, content):
+        key = self.key(name)
+        content_type = mimetypes.guess_type(name)[0]
+        content.seek(0)
+        if content.size <= settings.S3_MULTIPART_THRESHOLD:
+            self.client.put_object(key, content.read(), content_type)
+            return name
+        upload_id = self.client.create_multipart_upload(key, content_type)
+        try:
+            etags = [
+                self.client.upload_part(key, upload_id, number, chunk)
+                for number, chunk in enumerate(
+                    content.chunks(settings.S3_MULTIPART_CHUNK_SIZE), 1)
+            ]
+            self.client.complete_multipart_upload(key, upload_id, etags)
+        except Exception:
+            self.client.abort_multipart_upload(key, upload_id)
+            raise
+        return name
+
+    def delete(self, name):
+        self.client.delete_object(self.key(name))
+
+    def exists(self, name):
+        return self.client.head_object(self.key(name)) is not None
+
+    def size(self, name):
+        headers = self.client.head_object(self.key(name))
+        if headers is None:
+            raise FileNotFoundError(name)
+        return int(headers['Content-Length'])
+
+    def get_modified_time(self, name):
+        headers = self.client.head_object(self.key(name))
+        if headers is None:
+            raise FileNotFoundError(name)
+        modified = parsedate_to_datetime(headers['Last-Modified'])
+        if not settings.USE_TZ:
+            modified = timezone.make_naive(modified, timezone.utc)
+        return modified
+
+    def listdir(self, path):
+        prefix = self.key(path).rstrip('/')
+        prefix = f'{prefix}/' if prefix else ''
+        directories, files = [], []
+        for kind, value in self.client.list_objects(prefix, '/'):
+            value = value[len(prefix):]
+            if kind == 'prefix':
+                directories.append(value.rstrip('/'))
+            else:
+                files.append(value)
+        return directories, files
+
+    def iter_keys(self, prefix='', start_after=''):
+        """Имена файлов по возрастанию, как media.walk() для диска."""
+        for kind, key in self.client.list_objects(
+                self.key(prefix), start_after=start_after or None):
+            yield key
+
+    def url(self, name):
+        """Подписанная ссылка, неизменная в пределах полусрока жизни."""
+        key = self.key(name)
+        public_url = self._public_url or settings.S3_PUBLIC_URL
+        if public_url:
+            return f'{public_url.rstrip("/")}/{quote(key, safe="/~")}'
+        expires = settings.S3_URL_EXPIRES
+        now = int(time.time())
+        signed_at = now - now % max(expires // 2, 1)
+        return self.client.presigned_url(
+            key, expires, datetime.datetime.fromtimestamp(
+                signed_at, datetime.timezone.utc))
+
+
+@deconstructible
+class ContentAddressedS3Storage(ContentAddressedMixin, S3Storage):
+    """Объектное хранилище с именами по хешу содержимого."""
+
+
+@deconstructible
+class PostImageStorage(Storage):
+    """Хранилище из POST_IMAGE_STORAGE: смена класса не требует миграции."""
+
+    def __init__(self):
+        setting_changed.connect(self._reset)
+
+    def _reset(self, setting, **kwargs):
+        if setting == 'POST_IMAGE_STORAGE':
+            self.__dict__.pop('backend', None)
+
+    @cached_property
+    def backend(self):
+        return get_storage_class(settings.POST_IMAGE_STORAGE)()
+
+    def __getattr__(self, name):
+        # Методы, которых нет у Storage: content_name(), iter_keys()
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.backend, name)
+
+    def open(self, name, mode='rb'):
+        return self.backend.open(name, mode)
+
+    def save(self, name, content, max_length=None):
+        return self.backend.save(name, content, max_length)
+
+    def get_valid_name(self, name):
+        return self.backend.get_valid_name(name)
+
+    def get_available_name(self, name, max_length=None):
+        return self.backend.get_available_name(name, max_length)
+
+    def generate_filename(self, filename):
+        return self.backend.generate_filename(filename)
+
+    def path(self, name):
+        return self.backend.path(name)
+
+    def delete(self, name):
+        return self.backend.delete(name)
+
+    def exists(self, name):
+        return self.backend.exists(name)
+
+    def listdir(self, path):
+        return self.backend.listdir(path)
+
+    def size(self, name):
+        return self.backend.size(name)
+
+    def url(self, name):
+        return self.backend.url(name)
+
+    def get_accessed_time(self, name):
+        return self.backend.get_accessed_time(name)
+
+    def get_created_time(self, name):
+        return self.backend.get_created_time(name)
+
+    def get_modified_time(self, name):
+        return self.backend.get_modified_time(name)
@@ -0,0 +1,17 @@
+from django import template
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from core import holes
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def hole(context, template_name, **kwargs):
+    """{% hole 'шаблон' ключ=значение %} - персональный фрагмент страницы."""
+    request = context.get('request')
+    if request is None:
+        return render_to_string(template_name, kwargs)
+    if holes.punching(request):
+        return mark_safe(holes.marker(template_name, kwargs))
+    return mark_safe(holes.render(request, template_name, kwargs))
@@ -1,5 +1,14 @@
 # core/views.py
+import os
+import posixpath
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import Http404
 from django.shortcuts import render
+from django.utils._os import safe_join
+from django.views.decorators.http import require_safe
+from core.sendfile import send_file
 
 
 def page_not_found(request, exception):
@@ -8,9 +17,37 @@ def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
 
 
-def handler403(request, reason=''):
+def handler403(request, exception):
     return render(request, 'core/403.html', status=403)
 
 
+def csrf_failure(request, reason=''):
+    return render(request, 'core/403csrf.html', status=403)
+
+
 def handler500(request, **kwargs):
     return render(request, 'core/500.html', status=500)
+
+
+@require_safe
+def media(request, path):
+    """Файл из MEDIA_ROOT: вне MEDIA_PUBLIC_PREFIXES - только персоналу."""
+    name = posixpath.normpath(path).lstrip('/')
+    if any(part.startswith('.') for part in name.split('/')):
+        raise Http404
+    public = name.startswith(settings.MEDIA_PUBLIC_PREFIXES)
+    if not public and not request.user.is_staff:
+        raise PermissionDenied
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, name)
+    except ValueError:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+    response = send_file(request, full_path, name)
+    if public:
+        response['Cache-Control'] = (
+            f'public, max-age={settings.MEDIA_MAX_AGE}, immutable')
+    else:
+        response['Cache-Control'] = 'private'
+    return response
@@ -0,0 +1,10 @@
+import django
+from django.conf import settings
+
+
+def setup(overrides):
+    """Инициализатор процесса пула: django.setup() и настройки родителя."""
+    # Модуль без моделей: при spawn он распаковывается до django.setup()
+    django.setup()
+    for name, value in overrides.items():
+        setattr(settings, name, value)
@@ -1,7 +1,8 @@
 # posts/admin.py
 from django.contrib import admin
 from django.utils.safestring import mark_safe
-from posts.models import Group, Post, Comment, Follow
+from posts import search
+from posts.models import Group, Post, Comment, Counter, Follow, MediaFile
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -28,9 +29,28 @@ class PostAdmin(admin.ModelAdmin):
         'preview_image',
     )
 
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по полнотекстовому индексу вместо LIKE '%...%'."""
+        match = search.match_expression(search_term)
+        if not match or not search.available():
+            return super().get_search_results(
+                request, queryset, search_term)
+        queryset = queryset.extra(
+            where=[f'{Post._meta.db_table}.id IN '
+                   f'({search.matching_ids_sql()})'],
+            params=[match],
+        )
+        return queryset, False
+
     def preview_image(self, obj):
-        if obj.image:
-            return mark_safe(f'<img src="{obj.image.url}" width=100>')
+        if not obj.image:
+            return None
+        size = 'width=100'
+        if obj.image_width and obj.image_height:
+            height = round(100 * obj.image_height / obj.image_width)
+            size += f' height={height}'
+        return mark_safe(
+            f'<img src="{obj.image.url}" {size} loading="lazy">')
 
     preview_image.short_description = "Миниатюра"
 
@@ -63,7 +83,28 @@ class FollowAdmin(admin.ModelAdmin):
     list_filter = ('user',)
 
 
+class CounterAdmin(admin.ModelAdmin):
+
+    list_display = ('user',
+                    'posts',
+                    'followers',
+                    'following',
+                    )
+    readonly_fields = ('posts', 'followers', 'following',)
+
+
+class MediaFileAdmin(admin.ModelAdmin):
+
+    list_display = ('name',
+                    'refs',
+                    )
+    search_fields = ('name',)
+    readonly_fields = ('name', 'refs',)
+
+
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group, GroupAdmin)
 admin.site.register(Comment, CommentAdmin)
 admin.site.register(Follow, FollowAdmin)
+admin.site.register(Counter, CounterAdmin)
+admin.site.register(MediaFile, MediaFileAdmin)
@@ -0,0 +1,63 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+FEED_VERSION_KEY = 'posts:feed_version'
+
+TAG_KEY_PREFIX = 'posts:tag'
+
+
+def feed_version():
+    """Текущая версия закешированных фрагментов лент."""
+    version = cache.get(FEED_VERSION_KEY)
+    if version is None:
+        # Ключ мог быть вытеснен: начинаем с метки времени, чтобы не
+        # вернуться к версии, под которой лежат устаревшие фрагменты.
+        cache.add(FEED_VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(FEED_VERSION_KEY)
+    return version
+
+
+def bump_feed_version():
+    """Делает все закешированные фрагменты лент устаревшими."""
+    try:
+        cache.incr(FEED_VERSION_KEY)
+    except ValueError:
+        feed_version()
+
+
+def tag_key(tag):
+    # Слаги и имена пользователей бывают не ASCII
+    return f'{TAG_KEY_PREFIX}:{hashlib.md5(tag.encode()).hexdigest()}'
+
+
+def tag_versions(tags):
+    """Текущие версии тегов кеша; вытесненные начинаются с метки
+    времени, как версия лент.
+    """
+    keys = {tag_key(tag): tag for tag in tags}
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        start = int(time.time() * 1000)
+        for key in missing:
+            cache.add(key, start, None)
+        versions.update(cache.get_many(missing))
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def _bump_tags(tags):
+    for tag in tags:
+        try:
+            cache.incr(tag_key(tag))
+        except ValueError:
+            # Версии нет - закешированного с ней тоже
+            pass
+
+
+def bump_tags(*tags):
+    """Сбрасывает закешированное с тегами - сразу и после коммита."""
+    _bump_tags(tags)
+    transaction.on_commit(lambda: _bump_tags(tags))
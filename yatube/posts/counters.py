@@ -0,0 +1,125 @@
+from django.db.models import Count, F
+from posts.models import Comment, Counter, Follow, Post
+
+"""Сколько ключей пересчитывать одним запросом: у SQLite до 999
+параметров."""
+RECOUNT_CHUNK_SIZE: int = 500
+
+"""Поле счётчика пользователя, таблица и столбец, по которому
+он считается."""
+SOURCES = (
+    ('posts', Post.objects, 'author_id'),
+    ('followers', Follow.objects, 'author_id'),
+    ('following', Follow.objects, 'user_id'),
+)
+
+FIELDS = tuple(field for field, queryset, key in SOURCES)
+
+
+def change(user_id, field, delta):
+    """Атомарно меняет счётчик пользователя на delta, не ниже нуля."""
+    counters = Counter.objects.filter(user_id=user_id)
+    if delta < 0:
+        counters = counters.filter(**{f'{field}__gte': -delta})
+    updated = counters.update(**{field: F(field) + delta})
+    if not updated and delta > 0:
+        _, created = Counter.objects.get_or_create(
+            user_id=user_id, defaults={field: delta})
+        if not created:
+            counters.update(**{field: F(field) + delta})
+
+
+def change_comments(post_id, delta):
+    """Атомарно меняет счётчик комментариев поста."""
+    posts = Post.objects.filter(pk=post_id)
+    if delta < 0:
+        posts = posts.filter(comments_count__gte=-delta)
+    posts.update(comments_count=F('comments_count') + delta)
+
+
+def get_counter(user):
+    """Счётчики пользователя; нулевые, если он ещё ничего не делал."""
+    return getattr(user, 'counter', None) or Counter(user=user)
+
+
+def repair():
+    """Пересчитывает все счётчики и исправляет расхождения."""
+    actual = {}
+    for field, queryset, key in SOURCES:
+        rows = queryset.order_by().values(key).annotate(total=Count('pk'))
+        for row in rows.iterator():
+            actual.setdefault(row[key], {})[field] = row['total']
+
+    changed = []
+    for counter in Counter.objects.iterator():
+        expected = actual.pop(counter.user_id, {})
+        values = {field: expected.get(field, 0) for field in FIELDS}
+        if any(getattr(counter, field) != values[field] for field in FIELDS):
+            changed.append((counter.pk, values))
+    for user_id, values in changed:
+        Counter.objects.filter(pk=user_id).update(**values)
+    Counter.objects.bulk_create(
+        Counter(user_id=user_id, **values)
+        for user_id, values in actual.items()
+    )
+
+    comments = Comment.objects.order_by().values('post_id').annotate(
+        total=Count('pk'))
+    comments = {row['post_id']: row['total'] for row in comments.iterator()}
+    stored = Post.objects.order_by().values_list('pk', 'comments_count')
+    wrong = [
+        (post_id, comments.get(post_id, 0))
+        for post_id, count in stored.iterator()
+        if comments.get(post_id, 0) != count
+    ]
+    for post_id, count in wrong:
+        Post.objects.filter(pk=post_id).update(comments_count=count)
+    return len(changed) + len(actual), len(wrong)
+
+
+def recount(user_ids=(), post_ids=()):
+    """Как repair(), но только для user_ids и post_ids, пачками."""
+    users = posts = 0
+    user_ids, post_ids = sorted(set(user_ids)), sorted(set(post_ids))
+    for start in range(0, len(user_ids), RECOUNT_CHUNK_SIZE):
+        users += recount_users(user_ids[start:start + RECOUNT_CHUNK_SIZE])
+    for start in range(0, len(post_ids), RECOUNT_CHUNK_SIZE):
+        posts += recount_posts(post_ids[start:start + RECOUNT_CHUNK_SIZE])
+    return users, posts
+
+
+def recount_users(user_ids):
+    actual = {user_id: dict.fromkeys(FIELDS, 0) for user_id in user_ids}
+    for field, queryset, key in SOURCES:
+        rows = queryset.filter(**{f'{key}__in': user_ids}).order_by()
+        for row in rows.values(key).annotate(total=Count('pk')):
+            actual[row[key]][field] = row['total']
+    stored = Counter.objects.in_bulk(user_ids)
+    changed = 0
+    for user_id, values in actual.items():
+        counter = stored.get(user_id)
+        if counter is None:
+            # Без строк в таблицах счётчик нулевой и не нужен
+            if any(values.values()):
+                Counter.objects.create(user_id=user_id, **values)
+                changed += 1
+        elif any(getattr(counter, field) != values[field]
+                 for field in FIELDS):
+            Counter.objects.filter(pk=user_id).update(**values)
+            changed += 1
+    return changed
+
+
+def recount_posts(post_ids):
+    rows = Comment.objects.filter(post_id__in=post_ids).order_by()
+    comments = {row['post_id']: row['total'] for row in rows.values(
+        'post_id').annotate(total=Count('pk'))}
+    wrong = [
+        (post_id, comments.get(post_id, 0))
+        for post_id, count in Post.objects.filter(
+            pk__in=post_ids).values_list('pk', 'comments_count')
+        if comments.get(post_id, 0) != count
+    ]
+    for post_id, count in wrong:
+        Post.objects.filter(pk=post_id).update(comments_count=count)
+    return len(wrong)
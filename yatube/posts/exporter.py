@@ -0,0 +1,152 @@
+import csv
+import json
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Max
+from posts.models import Comment, Follow, Post
+
+"""Строк в одном окне keyset: запрос окна не держит курсор
+на всю таблицу, а память ограничена окном.
+"""
+EXPORT_WINDOW: int = 10000
+
+"""Строк в одной выборке курсора внутри окна (iterator(chunk_size))."""
+EXPORT_CHUNK_SIZE: int = 1000
+
+"""Строк в одной группе колоночного формата."""
+EXPORT_ROW_GROUP: int = 10000
+
+
+class WatermarkError(ValueError):
+    """Водяной знак не удалось разобрать."""
+
+
+class Source:
+    """Выгружаемая таблица с водяным знаком по id. Строка поздно закоммиченной
+    транзакции может лечь ниже выгруженной границы.
+    """
+
+    def __init__(self, model, columns):
+        self.model = model
+        self.columns = columns
+
+    def parse_watermark(self, value):
+        try:
+            return int(value)
+        except ValueError:
+            raise WatermarkError(value)
+
+    def format_watermark(self, value):
+        return str(value)
+
+    def upper_bound(self):
+        """Граница выгрузки, зафиксированная до её начала: строки,
+        добавленные во время выгрузки, достанутся следующей.
+        """
+        return self.model.objects.aggregate(last=Max('id'))['last'] or 0
+
+    def rows(self, since=None, until=None, window=EXPORT_WINDOW,
+             chunk_size=EXPORT_CHUNK_SIZE):
+        """Словари строк по возрастанию id, окнами по window строк."""
+        queryset = self.model.objects.values(*self.columns.values())
+        if until is not None:
+            queryset = queryset.filter(id__lte=until)
+        queryset = queryset.order_by('id')
+        bound = since
+        while True:
+            rows = queryset if bound is None else queryset.filter(
+                id__gt=bound)
+            count = 0
+            for row in rows[:window].iterator(chunk_size=chunk_size):
+                count += 1
+                yield {column: row[field]
+                       for column, field in self.columns.items()}
+            if count < window:
+                return
+            bound = row['id']
+
+
+SOURCES = {
+    'posts': Source(Post, {
+        'id': 'id',
+        'created': 'created',
+        'author_id': 'author_id',
+        'author': 'author__username',
+        'group': 'group__slug',
+        'text': 'text',
+        'image': 'image',
+        'comments_count': 'comments_count',
+    }),
+    'comments': Source(Comment, {
+        'id': 'id',
+        'created': 'created',
+        'post_id': 'post_id',
+        'author_id': 'author_id',
+        'author': 'author__username',
+        'text': 'text',
+    }),
+    'follows': Source(Follow, {
+        'id': 'id',
+        'user_id': 'user_id',
+        'user': 'user__username',
+        'author_id': 'author_id',
+        'author': 'author__username',
+    }),
+}
+
+
+def to_json(value):
+    return json.dumps(value, cls=DjangoJSONEncoder, ensure_ascii=False)
+
+
+def jsonl(rows, columns):
+    for row in rows:
+        yield to_json(row) + '\n'
+
+
+class Echo:
+    """Файл для csv.writer, который возвращает строку, а не пишет её."""
+
+    def write(self, value):
+        return value
+
+
+def plain(value):
+    if value is None:
+        return ''
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def csv_lines(rows, columns):
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([plain(row[column]) for column in columns])
+
+
+def columnar(rows, columns):
+    """Раскладка по столбцам, как в Parquet: строка файла - группа
+    строк таблицы, в ней для каждого столбца список значений.
+    """
+    rows = iter(rows)
+    while True:
+        group = list(islice(rows, EXPORT_ROW_GROUP))
+        if not group:
+            return
+        yield to_json({column: [row[column] for row in group]
+                       for column in columns}) + '\n'
+
+
+"""Формат -> (функция записи, Content-Type, расширение файла)."""
+FORMATS = {
+    'jsonl': (jsonl, 'application/x-ndjson', 'jsonl'),
+    'csv': (csv_lines, 'text/csv', 'csv'),
+    'columnar': (columnar, 'application/x-ndjson', 'columnar.jsonl'),
+}
+
+
+def stream(source, fmt, since=None, until=None, **options):
+    """Строки выгрузки source в формате fmt, по частям."""
+    write = FORMATS[fmt][0]
+    return write(source.rows(since, until, **options), list(source.columns))
@@ -0,0 +1,193 @@
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, transaction
+from core.paginator import keyset
+from posts.models import Counter, Follow, Post, Timeline
+
+"""Размер пачки вставки записей ленты."""
+TIMELINE_BATCH_SIZE: int = 200
+
+
+def push_threshold():
+    """Порог возврата в ленты, не выше порога подмешивания."""
+    return min(settings.FEED_PUSH_THRESHOLD, settings.FEED_PULL_THRESHOLD)
+
+
+def is_pulled(author_id):
+    """Посты автора подмешиваются при чтении (Counter.pulled)."""
+    return Counter.objects.filter(user_id=author_id, pulled=True).exists()
+
+
+def pulled_authors(user):
+    """Авторы из подписок пользователя, чьи посты читаются напрямую."""
+    return list(Follow.objects.filter(
+        user=user, author__counter__pulled=True,
+    ).values_list('author_id', flat=True))
+
+
+def push_post(post):
+    """Раскладывает новый пост в ленты подписчиков автора."""
+    push_posts([post])
+
+
+def push_posts(posts):
+    """Раскладывает пачку постов: подписчики каждого автора читаются
+    один раз на все его посты в пачке.
+    """
+    by_author = {}
+    for post in posts:
+        by_author.setdefault(post.author_id, []).append(post)
+    for author_id, author_posts in by_author.items():
+        if is_pulled(author_id):
+            continue
+        followers = Follow.objects.filter(
+            author_id=author_id).values_list('user_id', flat=True)
+        Timeline.objects.bulk_create(
+            (Timeline(user_id=user_id, post_id=post.id,
+                      author_id=author_id, created=post.created)
+             for user_id in followers.iterator()
+             for post in author_posts),
+            batch_size=TIMELINE_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика все посты автора."""
+    Counter.objects.filter(
+        user_id=author_id, pulled=False,
+        followers__gte=settings.FEED_PULL_THRESHOLD,
+    ).update(pulled=True)
+    if is_pulled(author_id):
+        return
+    posts = Post.objects.filter(
+        author_id=author_id).order_by().values_list('id', 'created')
+    Timeline.objects.bulk_create(
+        (Timeline(user_id=user_id, post_id=post_id,
+                  author_id=author_id, created=created)
+         for post_id, created in posts.iterator()),
+        batch_size=TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты подписчика посты автора."""
+    Timeline.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def repush():
+    """Возвращает в ленты авторов ниже push_threshold()."""
+    authors = Counter.objects.filter(
+        pulled=True, followers__lt=push_threshold(),
+    ).values_list('user_id', flat=True)
+    pushed = 0
+    for author_id in list(authors):
+        with transaction.atomic():
+            pushed += repush_author(author_id)
+    return pushed
+
+
+def repush_author(author_id):
+    """Раскладывает все посты автора по лентам его подписчиков."""
+    # Флаг снимается первым и с проверкой порога заново
+    if not Counter.objects.filter(
+            user_id=author_id, pulled=True,
+            followers__lt=push_threshold()).update(pulled=False):
+        return 0
+    # Записи, оставшиеся с тех пор, когда автор ещё раскладывался
+    Timeline.objects.filter(author_id=author_id).delete()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {Timeline._meta.db_table} '
+            f'(user_id, post_id, author_id, created) '
+            f'SELECT f.user_id, p.id, p.author_id, p.created '
+            f'FROM {Follow._meta.db_table} f '
+            f'JOIN {Post._meta.db_table} p ON p.author_id = f.author_id '
+            f'WHERE f.author_id = %s',
+            [author_id])
+    return 1
+
+
+def classify():
+    """Делит авторов по FEED_PULL_THRESHOLD заново."""
+    threshold = settings.FEED_PULL_THRESHOLD
+    Counter.objects.filter(followers__gte=threshold).update(pulled=True)
+    Counter.objects.filter(followers__lt=threshold).update(pulled=False)
+
+
+def rebuild():
+    """Раскладывает все посты по лентам заново одним INSERT ... SELECT."""
+    classify()
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {Timeline._meta.db_table}')
+        cursor.execute(
+            f'INSERT INTO {Timeline._meta.db_table} '
+            f'(user_id, post_id, author_id, created) '
+            f'SELECT f.user_id, p.id, p.author_id, p.created '
+            f'FROM {Follow._meta.db_table} f '
+            f'JOIN {Post._meta.db_table} p ON p.author_id = f.author_id '
+            f'LEFT JOIN {Counter._meta.db_table} c '
+            f'ON c.user_id = f.author_id '
+            f'WHERE COALESCE(c.pulled, %s) = %s',
+            [False, False])
+        return cursor.rowcount
+
+
+class HybridFeed:
+    """Лента подписок: Timeline плюс посты популярных авторов."""
+
+    def __init__(self, user, pulled=None):
+        self.user = user
+        self.pulled = pulled_authors(user) if pulled is None else pulled
+
+    def sources(self):
+        """Пары (queryset, поля ключа) всех источников ленты."""
+        timeline = Timeline.objects.filter(user=self.user).select_related(
+            'post__author', 'post__group')
+        if self.pulled:
+            timeline = timeline.exclude(author_id__in=self.pulled)
+        yield timeline, ('created', 'post_id')
+        for author_id in self.pulled:
+            posts = Post.objects.filter(
+                author_id=author_id).select_related('author', 'group')
+            yield posts, ('created', 'id')
+
+    def count(self):
+        return sum(queryset.count() for queryset, keys in self.sources())
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        return list(islice(self.merge('n', None, stop), start, stop))
+
+    def keyset(self, direction, bound, limit):
+        return list(islice(self.merge(direction, bound, limit), limit))
+
+    def merge(self, direction, bound, limit):
+        """Сливает источники, каждый ограничен limit строками."""
+        streams = []
+        for queryset, keys in self.sources():
+            rows = keyset(queryset, keys, direction, bound)[:limit]
+            streams.append(as_posts(rows))
+        return heapq.merge(
+            *streams,
+            key=lambda post: (post.created, post.id),
+            reverse=direction == 'n',
+        )
+
+
+def as_posts(rows):
+    for row in rows:
+        yield row.post if isinstance(row, Timeline) else row
+
+
+def follow_feed(user):
+    """Лента подписок пользователя."""
+    return HybridFeed(user)
@@ -0,0 +1,18 @@
+from core import holes
+from posts.forms import CommentForm
+from posts.models import Follow
+
+
+@holes.register('includes/holes/follow_button.html')
+def follow_button(request, author_id, username):
+    user_id = request.user.pk
+    return {
+        'its_not_me': user_id != author_id,
+        'following': bool(user_id) and Follow.objects.filter(
+            user=user_id, author=author_id).exists(),
+    }
+
+
+@holes.register('includes/holes/comment_form.html')
+def comment_form(request, post_id):
+    return {'form': CommentForm()}
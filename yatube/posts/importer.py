@@ -0,0 +1,345 @@
+import csv
+import json
+import os
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.db import connection
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from posts import feeds, media, search, stamps, thumbnails
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+"""Сколько имён искать одним запросом: у SQLite до 999 параметров."""
+LOOKUP_CHUNK_SIZE: int = 500
+
+
+class RowError(Exception):
+    """Строка входа не прошла проверку и пропускается."""
+
+
+class RowExists(RowError):
+    """Строка уже загружена, повторный импорт её пропускает."""
+
+
+def chunked(values):
+    values = list(values)
+    for start in range(0, len(values), LOOKUP_CHUNK_SIZE):
+        yield values[start:start + LOOKUP_CHUNK_SIZE]
+
+
+def read_rows(file, fmt):
+    """Словари строк из JSONL или CSV, по одной, без чтения файла
+    целиком.
+    """
+    if fmt == 'csv':
+        yield from csv.DictReader(file)
+        return
+    for line in file:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            row = RowError(f'не JSON: {error}')
+        if not isinstance(row, (dict, RowError)):
+            row = RowError('ожидается объект JSON')
+        yield row
+
+
+@contextmanager
+def explicit_created(*models):
+    """На время импорта created берётся из входа, а не текущее время."""
+    fields = [model._meta.get_field('created') for model in models]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def bulk_insert(model, objs, batch_size, **options):
+    """bulk_create пачками не больше предела базы: Django 2.2 не урезает
+    явный batch_size (у SQLite - 999 параметров на запрос).
+    """
+    limit = connection.ops.bulk_batch_size(model._meta.concrete_fields, objs)
+    model.objects.bulk_create(objs, batch_size=max(min(batch_size, limit), 1),
+                              **options)
+
+
+def required(row, name):
+    value = str(row.get(name) or '').strip()
+    if not value:
+        raise RowError(f'нет поля {name}')
+    return value
+
+
+def integer(row, name):
+    try:
+        value = int(required(row, name))
+    except ValueError:
+        raise RowError(f'{name} должно быть целым числом')
+    if value < 1:
+        raise RowError(f'{name} должно быть положительным')
+    return value
+
+
+def created(row):
+    value = row.get('created')
+    if not value:
+        return timezone.now()
+    moment = parse_datetime(str(value))
+    if moment is None:
+        raise RowError(f'неверная дата {value!r}')
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment, timezone.utc)
+    return moment
+
+
+def existing_ids(model, rows):
+    """id строк пачки, которые уже есть в таблице модели."""
+    ids = set()
+    for row in rows:
+        try:
+            ids.add(int(row['id']))
+        except (KeyError, TypeError, ValueError):
+            pass
+    present = set()
+    for chunk in chunked(ids):
+        present.update(model.objects.filter(pk__in=chunk).values_list(
+            'pk', flat=True))
+    return present
+
+
+class Lookups:
+    """Отображения username -> id и slug -> id в памяти."""
+
+    def __init__(self, create_users=False):
+        self.create_users = create_users
+        self.users = {}
+        self.groups = dict(Group.objects.values_list('slug', 'id'))
+        self.usernames = {}
+
+    def load_users(self, names):
+        missing = sorted({name for name in names if name}
+                         - self.users.keys())
+        if missing and self.create_users:
+            new_users = []
+            for name in missing:
+                user = User(username=name)
+                user.set_unusable_password()
+                new_users.append(user)
+            User.objects.bulk_create(new_users, ignore_conflicts=True)
+        self.users.update(dict.fromkeys(missing))
+        for chunk in chunked(missing):
+            for name, user_id in User.objects.filter(
+                    username__in=chunk).values_list('username', 'id'):
+                self.users[name] = user_id
+                self.usernames[user_id] = name
+
+    def user_id(self, row, name):
+        username = required(row, name)
+        user_id = self.users.get(username)
+        if user_id is None:
+            raise RowError(f'нет пользователя {username!r}')
+        return user_id
+
+    def group_id(self, row):
+        slug = row.get('group')
+        if not slug:
+            return None
+        if slug not in self.groups:
+            raise RowError(f'нет группы {slug!r}')
+        return self.groups[slug]
+
+
+class Importer:
+    """Строки пачки -> объекты модели и их производные данные."""
+
+    model = None
+    user_fields = ('author',)
+    rebuild_feeds = False
+
+    def __init__(self, lookups, images=None):
+        self.lookups = lookups
+        self.images = images
+        self.counted = set()
+        self.user_ids = set()
+        self.post_ids = set()
+
+    def prepare(self, rows):
+        """Подгружает всё, что нужно build(), для пачки целиком,
+        и ключи строк пачки, которые уже есть в базе.
+        """
+        self.lookups.load_users(
+            row.get(name) for row in rows for name in self.user_fields)
+        self.present = set()
+
+    def claim(self, key):
+        """Отмечает ключ строки занятым; уже занятый - RowExists."""
+        if key in self.present:
+            raise RowExists(key)
+        self.present.add(key)
+
+    def build(self, row):
+        raise NotImplementedError
+
+    def after(self, objs):
+        """Производные данные пачки. Возвращает области изменений
+        для posts.stamps.touch().
+        """
+        return set()
+
+
+class PostImporter(Importer):
+    """Пост: id (обязателен), author, text, created, group, image."""
+
+    model = Post
+
+    def prepare(self, rows):
+        super().prepare(rows)
+        self.present = existing_ids(Post, rows)
+
+    def build(self, row):
+        # Раньше картинки: файл существующего поста не сохраняется
+        self.claim(integer(row, 'id'))
+        post = Post(
+            id=integer(row, 'id'),
+            author_id=self.lookups.user_id(row, 'author'),
+            text=required(row, 'text'),
+            created=created(row),
+            group_id=self.lookups.group_id(row),
+        )
+        if row.get('image'):
+            post.image = self.save_image(row['image'])
+            post.describe_image()
+        return post
+
+    def save_image(self, name):
+        if self.images is None:
+            raise RowError('картинки без --images')
+        path = os.path.join(self.images, name)
+        if not os.path.isfile(path):
+            raise RowError(f'нет файла {name!r}')
+        field = Post._meta.get_field('image')
+        with open(path, 'rb') as file:
+            # Хранилище читает файл кусками, в память он не грузится
+            return field.storage.save(
+                field.generate_filename(None, os.path.basename(name)),
+                File(file))
+
+    def after(self, posts):
+        search.index_posts(posts)
+        feeds.push_posts(posts)
+        for post in posts:
+            if post.image:
+                media.acquire(post.image.name)
+                thumbnails.schedule(post.image.name)
+        group_ids = {post.group_id for post in posts}
+        author_ids = {post.author_id for post in posts}
+        self.user_ids |= author_ids
+        profiles = {stamps.profile_scope(self.lookups.usernames[author_id])
+                    for author_id in author_ids}
+        self.counted |= profiles
+        return ({stamps.INDEX_SCOPE}
+                | {stamps.group_scope(slug)
+                   for slug, group_id in self.lookups.groups.items()
+                   if group_id in group_ids}
+                | profiles)
+
+
+class CommentImporter(Importer):
+    """Комментарий: id (необязательно), post, author, text, created."""
+
+    model = Comment
+
+    def prepare(self, rows):
+        super().prepare(rows)
+        self.present = existing_ids(Comment, rows)
+        ids = set()
+        for row in rows:
+            try:
+                ids.add(int(row['post']))
+            except (KeyError, TypeError, ValueError):
+                pass
+        # Для поста - его группа и автор: на их лентах API число
+        # комментариев
+        self.posts = {}
+        for chunk in chunked(ids):
+            for pk, slug, username in Post.objects.filter(
+                    pk__in=chunk).values_list(
+                    'pk', 'group__slug', 'author__username'):
+                self.posts[pk] = (slug, username)
+
+    def build(self, row):
+        post_id = integer(row, 'post')
+        if post_id not in self.posts:
+            raise RowError(f'нет поста {post_id}')
+        comment = Comment(
+            post_id=post_id,
+            author_id=self.lookups.user_id(row, 'author'),
+            text=required(row, 'text'),
+            created=created(row),
+        )
+        if row.get('id'):
+            comment.id = integer(row, 'id')
+            self.claim(comment.id)
+        return comment
+
+    def after(self, comments):
+        post_ids = {comment.post_id for comment in comments}
+        self.post_ids |= post_ids
+        self.counted.add(stamps.comments_scope(stamps.INDEX_SCOPE))
+        for post_id in post_ids:
+            slug, username = self.posts[post_id]
+            self.counted.add(stamps.comments_scope(
+                stamps.profile_scope(username)))
+            if slug:
+                self.counted.add(stamps.comments_scope(
+                    stamps.group_scope(slug)))
+        return {stamps.post_scope(post_id) for post_id in post_ids}
+
+
+class FollowImporter(Importer):
+    """Подписка: user, author."""
+
+    model = Follow
+    user_fields = ('user', 'author')
+    rebuild_feeds = True
+
+    def prepare(self, rows):
+        super().prepare(rows)
+        user_ids = {self.lookups.users.get(row.get('user'))
+                    for row in rows} - {None}
+        for chunk in chunked(user_ids):
+            self.present.update(Follow.objects.filter(
+                user_id__in=chunk).values_list('user_id', 'author_id'))
+
+    def build(self, row):
+        follow = Follow(user_id=self.lookups.user_id(row, 'user'),
+                        author_id=self.lookups.user_id(row, 'author'))
+        if follow.user_id == follow.author_id:
+            raise RowError('подписка на себя')
+        self.claim((follow.user_id, follow.author_id))
+        return follow
+
+    def after(self, follows):
+        user_ids = {user_id for follow in follows
+                    for user_id in (follow.user_id, follow.author_id)}
+        self.user_ids |= user_ids
+        profiles = {stamps.profile_scope(self.lookups.usernames[user_id])
+                    for user_id in user_ids}
+        self.counted |= profiles
+        return profiles
+
+
+IMPORTERS = {
+    'posts': PostImporter,
+    'comments': CommentImporter,
+    'follows': FollowImporter,
+}
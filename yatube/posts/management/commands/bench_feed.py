@@ -0,0 +1,120 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext, override_settings
+from core.paginator import CursorPaginator
+from posts.counters import repair
+from posts.feeds import classify, follow_feed
+from posts.models import Follow, Post, Timeline
+from posts.views import POST_COUNT
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает стратегии ленты подписок push, pull и hybrid '
+            'на синтетическом графе подписок. Все данные откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--follows', type=int, default=30,
+                            help='Подписок на одного пользователя.')
+        parser.add_argument('--posts', type=int, default=1000)
+        parser.add_argument('--readers', type=int, default=50,
+                            help='Сколько лент прочитать для замера.')
+        parser.add_argument('--threshold', type=int, default=100,
+                            help='Порог подписчиков для hybrid.')
+        parser.add_argument('--alpha', type=float, default=1.2,
+                            help='Показатель степенного распределения.')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        strategies = (
+            ('push', 10 ** 12),
+            ('pull', 0),
+            ('hybrid', options['threshold']),
+        )
+        with transaction.atomic():
+            users = self.make_graph(rnd, options)
+            authors = self.post_authors(rnd, users, options)
+            readers = rnd.sample(users, min(options['readers'], len(users)))
+            for name, threshold in strategies:
+                with override_settings(FEED_PULL_THRESHOLD=threshold):
+                    classify()
+                    self.run(name, authors, readers)
+            transaction.set_rollback(True)
+
+    def make_graph(self, rnd, options):
+        """Пользователи и подписки со степенной популярностью авторов."""
+        prefix = f'bench_feed_{options["seed"]}_'
+        User.objects.bulk_create(
+            User(username=f'{prefix}{i}') for i in range(options['users'])
+        )
+        users = list(User.objects.filter(
+            username__startswith=prefix).values_list('id', flat=True))
+        weights = [1 / (rank + 1) ** options['alpha']
+                   for rank in range(len(users))]
+        follows = set()
+        for user_id in users:
+            for author_id in rnd.choices(users, weights,
+                                         k=options['follows']):
+                if author_id != user_id:
+                    follows.add((user_id, author_id))
+        Follow.objects.bulk_create(
+            (Follow(user_id=user_id, author_id=author_id)
+             for user_id, author_id in follows),
+        )
+        # bulk_create не шлёт сигналы - счётчики подписчиков пересчитываем
+        repair()
+        self.stdout.write(
+            f'Граф: {len(users)} пользователей, {len(follows)} подписок, '
+            f'максимум подписчиков у автора: '
+            f'{self.max_followers()}'
+        )
+        return users
+
+    def max_followers(self):
+        top = Follow.objects.values('author_id').annotate(
+            followers=Count('id')).order_by('-followers').first()
+        return top['followers'] if top else 0
+
+    def post_authors(self, rnd, users, options):
+        """Авторы постов: популярные пишут чаще."""
+        weights = [1 / (rank + 1) ** options['alpha']
+                   for rank in range(len(users))]
+        return rnd.choices(users, weights, k=options['posts'])
+
+    def run(self, name, authors, readers):
+        timeline_before = Timeline.objects.count()
+        start = time.perf_counter()
+        posts = [
+            Post.objects.create(author_id=author_id, text='bench')
+            for author_id in authors
+        ]
+        write_time = time.perf_counter() - start
+        pushed = Timeline.objects.count() - timeline_before
+
+        read_time = 0
+        read_queries = 0
+        for user_id in readers:
+            start = time.perf_counter()
+            with CaptureQueriesContext(connection) as queries:
+                user = User(id=user_id)
+                page = CursorPaginator(follow_feed(user), POST_COUNT).page()
+                list(page)
+            read_time += time.perf_counter() - start
+            read_queries += len(queries)
+
+        self.stdout.write(
+            f'{name:>6}: запись '
+            f'{write_time / len(posts) * 1000:.2f} мс/пост, '
+            f'{pushed / len(posts):.1f} строк ленты/пост; '
+            f'чтение {read_time / len(readers) * 1000:.2f} мс/страница, '
+            f'{read_queries / len(readers):.1f} запросов/страница'
+        )
+        Post.objects.filter(id__in=[post.id for post in posts]).delete()
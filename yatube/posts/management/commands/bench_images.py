@@ -0,0 +1,74 @@
+import io
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image, ImageOps
+from posts import thumbnails
+from sorl.thumbnail.conf import settings as sorl_settings
+
+IMAGE_SUFFIXES = {'.jpg', '.jpeg', '.png', '.gif', '.webp'}
+
+
+class Command(BaseCommand):
+    help = ('Считает, сколько байт экономят адаптивные варианты картинок '
+            'постов по сравнению с одной JPEG-миниатюрой card. Картинки '
+            'нарезаются в памяти так же, как crop="center" в sorl.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=None,
+                            help='Каталог с картинками, по умолчанию '
+                                 'MEDIA_ROOT/posts.')
+        parser.add_argument('--limit', type=int, default=100)
+
+    def handle(self, *args, **options):
+        root = Path(options['path'] or Path(settings.MEDIA_ROOT, 'posts'))
+        paths = sorted(
+            path for path in root.rglob('*')
+            if path.suffix.lower() in IMAGE_SUFFIXES
+        )[:options['limit']]
+        if not paths:
+            raise CommandError(f'В {root} нет картинок.')
+
+        geometry, card_options = settings.POST_THUMBNAILS[
+            thumbnails.CARD_ALIAS]
+        card_size = tuple(map(int, geometry.split('x')))
+        card_quality = card_options.get(
+            'quality', sorl_settings.THUMBNAIL_QUALITY)
+        baseline = 0
+        totals = {}
+        for path in paths:
+            with Image.open(path) as image:
+                image = image.convert('RGB')
+                baseline += self.encoded_size(
+                    image, card_size, 'JPEG', card_quality)
+                for fmt, width, alias, size, variant in (
+                        thumbnails.variants()):
+                    encoded = self.encoded_size(
+                        image, tuple(map(int, size.split('x'))),
+                        fmt, variant['quality'])
+                    totals[fmt, width] = totals.get((fmt, width), 0) + encoded
+
+        self.stdout.write(
+            f'Картинок: {len(paths)}; card {geometry} JPEG: '
+            f'{baseline / 1024:.1f} КБ')
+        for (fmt, width), total in totals.items():
+            self.stdout.write(
+                f'{fmt:>5} {width:>5}w: {total / 1024:>9.1f} КБ '
+                f'({total / baseline * 100:5.1f}% от card)')
+        for width in settings.POST_IMAGE_WIDTHS:
+            fmt, total = min(
+                ((fmt, total) for (fmt, w), total in totals.items()
+                 if w == width),
+                key=lambda item: item[1],
+            )
+            self.stdout.write(
+                f'Экран {width}w, лучший формат {fmt}: экономия '
+                f'{(baseline - total) / 1024:.1f} КБ '
+                f'({(1 - total / baseline) * 100:.1f}%)')
+
+    def encoded_size(self, image, size, fmt, quality):
+        thumbnail = ImageOps.fit(image, size, Image.LANCZOS)
+        buffer = io.BytesIO()
+        thumbnail.save(buffer, format=fmt, quality=quality, optimize=True)
+        return buffer.tell()
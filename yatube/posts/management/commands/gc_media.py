@@ -0,0 +1,115 @@
+import os
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from posts import media
+
+"""Каталог картинок постов внутри MEDIA_ROOT."""
+MEDIA_DIR = 'posts'
+
+"""Как часто печатать прогресс, в просмотренных файлах."""
+PROGRESS_EVERY: int = 10000
+
+
+class Command(BaseCommand):
+    help = ('Удаляет файлы картинок, на которые не ссылается ни один пост, '
+            'вместе с их миниатюрами. Файлы и столбец Post.image читаются '
+            'по порядку и сливаются потоком.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать, что будет удалено.')
+        parser.add_argument('--quarantine', default=None,
+                            help='Переносить файлы в этот каталог '
+                                 'вместо удаления.')
+        parser.add_argument('--min-age', type=float, default=24,
+                            help='Не трогать файлы моложе стольких часов: '
+                                 'пост с ними мог ещё не сохраниться.')
+        parser.add_argument('--limit', type=int, default=0,
+                            help='Сколько файлов просмотреть за запуск; '
+                                 'следующий продолжит с контрольной точки.')
+        parser.add_argument('--checkpoint',
+                            default=os.path.join(settings.MEDIA_ROOT,
+                                                 '.gc_media'),
+                            help='Файл контрольной точки.')
+        parser.add_argument('--reset', action='store_true',
+                            help='Начать с начала, забыв контрольную точку.')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        after = '' if options['reset'] else self.read_checkpoint(options)
+        storage = media.storage()
+        if hasattr(storage, 'iter_keys'):
+            # Объектное хранилище само отдаёт ключи по порядку
+            if options['quarantine']:
+                raise CommandError(
+                    '--quarantine работает только с файлами на диске.')
+            files = storage.iter_keys(f'{MEDIA_DIR}/', after)
+        else:
+            files = media.walk(os.path.join(settings.MEDIA_ROOT, MEDIA_DIR),
+                               f'{MEDIA_DIR}/', after)
+        if options['limit']:
+            files = islice(files, options['limit'])
+        self.scanned = 0
+        self.last = after
+        self.started = time.monotonic()
+        names = media.referenced(after, options['chunk_size'])
+        found = removed = 0
+        min_mtime = time.time() - options['min_age'] * 60 * 60
+        for name in media.orphans(self.progress(files), names):
+            if storage.get_modified_time(name).timestamp() > min_mtime:
+                continue
+            if not media.unused(name):
+                continue
+            found += 1
+            if options['verbosity'] > 1 or options['dry_run']:
+                self.stdout.write(name)
+            if not options['dry_run']:
+                self.remove(name, options['quarantine'])
+                removed += 1
+
+        finished = not options['limit'] or self.scanned < options['limit']
+        if not options['dry_run']:
+            self.write_checkpoint(options, '' if finished else self.last)
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(
+            f'Просмотрено файлов: {self.scanned} за {elapsed:.1f} с '
+            f'({self.rate():.0f} файлов/с), без ссылок: {found}, '
+            f'убрано: {removed}'
+            + ('' if finished else f'; продолжение после {self.last}')
+        )
+
+    def progress(self, files):
+        for name in files:
+            self.scanned += 1
+            self.last = name
+            if self.scanned % PROGRESS_EVERY == 0:
+                self.stdout.write(
+                    f'... {self.scanned} файлов, {self.rate():.0f} файлов/с')
+            yield name
+
+    def rate(self):
+        return self.scanned / max(time.monotonic() - self.started, 1e-6)
+
+    def remove(self, name, quarantine):
+        if quarantine:
+            target = os.path.join(quarantine, name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(media.storage().path(name), target)
+            media.remove_file(name, keep_original=True)
+        else:
+            media.remove_file(name)
+
+    def read_checkpoint(self, options):
+        try:
+            with open(options['checkpoint']) as checkpoint:
+                return checkpoint.read().strip()
+        except FileNotFoundError:
+            return ''
+
+    def write_checkpoint(self, options, name):
+        os.makedirs(os.path.dirname(options['checkpoint']), exist_ok=True)
+        with open(options['checkpoint'], 'w') as checkpoint:
+            checkpoint.write(name)
@@ -0,0 +1,44 @@
+from concurrent.futures import as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Заранее нарезает миниатюры для картинок всех постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int,
+                            default=settings.THUMBNAIL_WORKERS,
+                            help='Число процессов; 0 - без пула.')
+        parser.add_argument('--missing', action='store_true',
+                            help='Только картинки без готовых миниатюр.')
+
+    def handle(self, *args, **options):
+        names = Post.objects.exclude(image='').order_by().values_list(
+            'image', flat=True).distinct()
+        names = [name for name in names.iterator()
+                 if not options['missing'] or self.missing(name)]
+        if options['workers']:
+            # Пул только нарезает, в kvstore пишет этот процесс
+            with thumbnails.process_pool(options['workers']) as pool:
+                futures = [pool.submit(thumbnails.render, name)
+                           for name in names]
+                results = (thumbnails.store(*future.result())
+                           for future in as_completed(futures))
+                self.report(results, len(names), options)
+        else:
+            results = (thumbnails.generate(name) for name in names)
+            self.report(results, len(names), options)
+        self.stdout.write(f'Обработано картинок: {len(names)}')
+
+    def report(self, results, total, options):
+        for done, result in enumerate(results, 1):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{done}/{total} {result}')
+
+    def missing(self, name):
+        return any(thumbnails.get_cached(name, alias) is None
+                   for alias in thumbnails.aliases())
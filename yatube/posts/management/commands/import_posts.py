@@ -0,0 +1,140 @@
+import os
+import sys
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from posts import counters, feeds, stamps
+from posts.cache import bump_feed_version
+from posts.importer import (IMPORTERS, Lookups, RowError, RowExists,
+                            bulk_insert, explicit_created, read_rows)
+from posts.models import Comment, Post
+
+
+class Command(BaseCommand):
+    help = ('Загружает посты, комментарии или подписки из JSONL или CSV '
+            'пачками bulk_create, минуя формы и save(). Вход читается '
+            'потоком, каждая пачка - своя транзакция; повторный запуск '
+            'продолжает с контрольной точки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORTERS))
+        parser.add_argument('path',
+                            help="Файл .jsonl или .csv; '-' - стандартный "
+                                 "ввод (без контрольной точки).")
+        parser.add_argument('--format', choices=('jsonl', 'csv'),
+                            default=None,
+                            help='По умолчанию - по расширению файла.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Строк в одном INSERT.')
+        parser.add_argument('--chunk-size', type=int, default=10000,
+                            help='Строк в одной транзакции; после каждой '
+                                 'записывается контрольная точка.')
+        parser.add_argument('--images', default=None,
+                            help='Каталог, от которого отсчитываются '
+                                 'пути картинок постов.')
+        parser.add_argument('--create-users', action='store_true',
+                            help='Создавать недостающих пользователей '
+                                 'без пароля.')
+        parser.add_argument('--checkpoint', default=None,
+                            help='Файл контрольной точки, по умолчанию '
+                                 '<path>.checkpoint.')
+        parser.add_argument('--reset', action='store_true',
+                            help='Начать с начала, забыв контрольную точку.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or (
+            'csv' if path.lower().endswith('.csv') else 'jsonl')
+        checkpoint = None
+        if path != '-':
+            checkpoint = options['checkpoint'] or f'{path}.checkpoint'
+        done = 0
+        if checkpoint and not options['reset']:
+            done = self.read_checkpoint(checkpoint)
+        importer = IMPORTERS[options['kind']](
+            Lookups(options['create_users']), options['images'])
+
+        self.read = self.written = self.skipped = self.present = 0
+        self.started = time.monotonic()
+        file = (sys.stdin if path == '-'
+                else open(path, newline='', encoding='utf-8'))
+        try:
+            rows = islice(read_rows(file, fmt), done, None)
+            while True:
+                chunk = list(islice(rows, options['chunk_size']))
+                if not chunk:
+                    break
+                self.load(importer, chunk, done + self.read, options)
+                self.read += len(chunk)
+                if checkpoint:
+                    self.write_checkpoint(checkpoint, done + self.read)
+                self.stdout.write(
+                    f'... {done + self.read} строк, '
+                    f'{self.rate():.0f} строк/с')
+        finally:
+            if file is not sys.stdin:
+                file.close()
+
+        with transaction.atomic():
+            self.finish(importer)
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(
+            f'Прочитано строк: {self.read} за {elapsed:.1f} с '
+            f'({self.rate():.0f} строк/с), записано: {self.written}, '
+            f'пропущено: {self.skipped}, уже были: {self.present}'
+            + (f'; начато после строки {done}' if done else '')
+        )
+
+    def load(self, importer, chunk, offset, options):
+        """Одна пачка - одна транзакция: объекты, производные данные
+        и отметки изменений страниц.
+        """
+        with transaction.atomic(), explicit_created(Post, Comment):
+            importer.prepare(
+                [row for row in chunk if not isinstance(row, RowError)])
+            objs = []
+            for number, row in enumerate(chunk, offset + 1):
+                try:
+                    if isinstance(row, RowError):
+                        raise row
+                    objs.append(importer.build(row))
+                except RowExists:
+                    # Загружена прошлым запуском или раньше в этом
+                    self.present += 1
+                except RowError as error:
+                    self.skipped += 1
+                    self.stderr.write(f'Строка {number}: {error}')
+            bulk_insert(importer.model, objs, options['batch_size'])
+            stamps.touch(*importer.after(objs))
+        self.written += len(objs)
+
+    def finish(self, importer):
+        """Досчитывает то, что при save() делают сигналы."""
+        counters.recount(importer.user_ids, importer.post_ids)
+        if importer.rebuild_feeds:
+            self.stdout.write(f'Записей лент: {feeds.rebuild()}')
+        stamps.touch(*importer.counted)
+        bump_feed_version()
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                    no_style(), [Post, Comment]):
+                cursor.execute(sql)
+
+    def rate(self):
+        return self.read / max(time.monotonic() - self.started, 1e-6)
+
+    def read_checkpoint(self, checkpoint):
+        try:
+            with open(checkpoint) as file:
+                return int(file.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def write_checkpoint(self, checkpoint, number):
+        os.makedirs(os.path.dirname(os.path.abspath(checkpoint)),
+                    exist_ok=True)
+        with open(checkpoint, 'w') as file:
+            file.write(str(number))
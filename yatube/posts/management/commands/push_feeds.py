@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from posts.cache import bump_feed_version
+from posts.feeds import repush
+
+
+class Command(BaseCommand):
+    help = ('Возвращает в ленты подписчиков посты авторов, у которых '
+            'подписчиков стало меньше FEED_PUSH_THRESHOLD. Отписка '
+            'этого не делает, чтобы не перекладывать ленты в запросе; '
+            'команду стоит запускать по расписанию.')
+
+    def handle(self, *args, **options):
+        pushed = repush()
+        if pushed:
+            bump_feed_version()
+        self.stdout.write(f'Возвращено в ленты авторов: {pushed}')
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from posts.counters import repair
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики постов, комментариев и подписок '
+            'и исправляет расхождения.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            fixed_users, fixed_posts = repair()
+        self.stdout.write(
+            f'Исправлено счётчиков пользователей: {fixed_users}, '
+            f'постов: {fixed_posts}'
+        )
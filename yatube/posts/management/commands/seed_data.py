@@ -0,0 +1,288 @@
+import io
+import random
+import time
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import F, Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from core.images import describe
+from PIL import Image, ImageDraw
+from posts import counters, feeds, search, stamps, thumbnails
+from posts.cache import bump_feed_version
+from posts.importer import bulk_insert
+from posts.models import Comment, Follow, Group, MediaFile, Post
+
+User = get_user_model()
+
+"""Слова, из которых собираются тексты постов и комментариев."""
+WORDS = (
+    'дом', 'город', 'утро', 'вечер', 'река', 'лес', 'книга', 'письмо',
+    'дорога', 'поезд', 'море', 'окно', 'сад', 'снег', 'дождь', 'солнце',
+    'чай', 'кот', 'собака', 'друг', 'работа', 'отпуск', 'фото', 'музыка',
+    'новый', 'старый', 'тихий', 'яркий', 'долгий', 'первый', 'последний',
+    'сегодня', 'вчера', 'снова', 'наконец', 'почему-то', 'очень', 'всё',
+    'видел', 'читал', 'думал', 'писал', 'ехал', 'ждал', 'нашёл', 'понял',
+)
+
+"""Среднее время от поста до комментария в всплеске, секунды."""
+BURST_SECONDS: int = 3600
+
+
+def power_law(size, alpha):
+    """Накопленные веса 1/(rank+1)**alpha для random.choices:
+    с ними выбор стоит O(log size), а не O(size).
+    """
+    return list(accumulate(1 / (rank + 1) ** alpha for rank in range(size)))
+
+
+class Command(BaseCommand):
+    help = ('Создаёт воспроизводимый синтетический набор данных для '
+            'нагрузочных тестов: пользователей, группы разного размера, '
+            'степенной граф подписок, посты со всплесками комментариев '
+            'и картинками. Строки пишутся executemany пачками, '
+            'производные данные досчитываются одним проходом в конце.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--follows', type=int, default=30,
+                            help='Подписок на пользователя в среднем.')
+        parser.add_argument('--comments', type=float, default=2,
+                            help='Комментариев на пост в среднем.')
+        parser.add_argument('--images', type=int, default=0,
+                            help='Сколько разных картинок создать.')
+        parser.add_argument('--image-ratio', type=float, default=0.1,
+                            help='Доля постов с картинкой.')
+        parser.add_argument('--group-ratio', type=float, default=0.5,
+                            help='Доля постов в группах.')
+        parser.add_argument('--alpha', type=float, default=1.2,
+                            help='Показатель степенного распределения.')
+        parser.add_argument('--days', type=int, default=365,
+                            help='За сколько дней до --end разбросать '
+                                 'посты.')
+        parser.add_argument('--end', default=None,
+                            help='Дата последнего поста, по умолчанию '
+                                 'сейчас; для одинаковых наборов её '
+                                 'нужно задать явно.')
+        parser.add_argument('--chunk-size', type=int, default=10000,
+                            help='Постов в одной транзакции.')
+        parser.add_argument('--no-timeline', action='store_true',
+                            help='Не раскладывать посты по лентам.')
+        parser.add_argument('--no-search', action='store_true',
+                            help='Не перестраивать поисковый индекс.')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if options['users'] < 2:
+            raise CommandError('Нужно хотя бы два пользователя.')
+        end = timezone.now()
+        if options['end']:
+            end = parse_datetime(options['end'])
+            if end is None:
+                raise CommandError(f'Неверная дата {options["end"]!r}')
+            if timezone.is_naive(end):
+                end = timezone.make_aware(end, timezone.utc)
+        self.prefix = f'seed{options["seed"]}_'
+        if User.objects.filter(username__startswith=self.prefix).exists():
+            raise CommandError(
+                f'Набор с --seed {options["seed"]} уже создан.')
+
+        rnd = random.Random(options['seed'])
+        self.rows = 0
+        self.started = time.monotonic()
+        users = self.make_users(options)
+        groups = self.make_groups(options)
+        self.make_follows(rnd, users, options)
+        images = self.make_images(rnd, options)
+        refs = self.make_posts(rnd, users, groups, images, end, options)
+        with transaction.atomic():
+            self.finish(refs, options)
+
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(
+            f'Создано строк: {self.rows} за {elapsed:.1f} с '
+            f'({self.rate():.0f} строк/с)')
+
+    def make_users(self, options):
+        """Пользователи без пароля. Порядок id - ранг популярности:
+        первые чаще пишут и на них чаще подписываются.
+        """
+        password = make_password(None)
+        objs = [User(username=f'{self.prefix}{i}', password=password)
+                for i in range(options['users'])]
+        bulk_insert(User, objs, len(objs))
+        self.rows += len(objs)
+        return list(User.objects.filter(
+            username__startswith=self.prefix).order_by('id').values_list(
+            'id', flat=True))
+
+    def make_groups(self, options):
+        """Группы и накопленные веса: размеры групп по закону Ципфа."""
+        slug = self.prefix.replace('_', '-')
+        objs = [Group(title=f'Группа {i}', slug=f'{slug}{i}',
+                      description=f'Синтетическая группа {i}')
+                for i in range(options['groups'])]
+        bulk_insert(Group, objs, len(objs))
+        self.rows += len(objs)
+        ids = list(Group.objects.filter(
+            slug__startswith=slug).order_by('id').values_list(
+            'id', flat=True))
+        return ids, power_law(len(ids), 1)
+
+    def make_follows(self, rnd, users, options):
+        """Степенной граф: число подписок у читателя - экспоненциальное,
+        авторы выбираются по популярности.
+        """
+        if options['follows'] <= 0:
+            return
+        weights = power_law(len(users), options['alpha'])
+        rows = []
+        for user_id in users:
+            count = min(int(rnd.expovariate(1 / options['follows'])),
+                        len(users) - 1)
+            authors = set(rnd.choices(users, cum_weights=weights, k=count))
+            authors.discard(user_id)
+            rows.extend((user_id, author_id) for author_id in authors)
+            if len(rows) >= options['chunk_size']:
+                self.flush_follows(rows)
+                rows = []
+        self.flush_follows(rows)
+        self.stdout.write(f'... подписки: {self.rate():.0f} строк/с')
+
+    def flush_follows(self, rows):
+        with transaction.atomic():
+            self.insert(Follow, ('user', 'author'), rows)
+
+    def make_images(self, rnd, options):
+        """Картинки: (имя, ширина, высота, заглушка) каждой."""
+        field = Post._meta.get_field('image')
+        images = []
+        for i in range(options['images']):
+            size = (rnd.randint(320, 1600), rnd.randint(240, 1200))
+            image = Image.new('RGB', size, self.color(rnd))
+            draw = ImageDraw.Draw(image)
+            for _ in range(8):
+                x, y = rnd.randrange(size[0]), rnd.randrange(size[1])
+                draw.ellipse((x, y, x + size[0] // 4, y + size[1] // 4),
+                             fill=self.color(rnd))
+            buffer = io.BytesIO()
+            image.save(buffer, format='JPEG', quality=80)
+            name = field.storage.save(
+                field.generate_filename(None, f'{self.prefix}{i}.jpg'),
+                ContentFile(buffer.getvalue()))
+            images.append((name, *describe(buffer)))
+        return images
+
+    def color(self, rnd):
+        return tuple(rnd.randrange(256) for _ in range(3))
+
+    def make_posts(self, rnd, users, groups, images, end, options):
+        """Посты со всплесками комментариев, пачка - транзакция."""
+        weights = power_law(len(users), options['alpha'])
+        group_ids, group_weights = groups
+        chunk_size = options['chunk_size']
+        burst = power_law(chunk_size, options['alpha'])
+        span = options['days'] * 86400
+        refs = {}
+        next_id = (Post.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        total = options['posts']
+        for start in range(0, total, chunk_size):
+            size = min(chunk_size, total - start)
+            authors = rnd.choices(users, cum_weights=weights, k=size)
+            created = [end - timedelta(seconds=rnd.uniform(0, span))
+                       for _ in range(size)]
+            targets = rnd.choices(range(size), cum_weights=burst[:size],
+                                  k=round(size * options['comments']))
+            commenters = rnd.choices(users, cum_weights=weights,
+                                     k=len(targets))
+            counts = [0] * size
+            comments = []
+            for index, author_id in zip(targets, commenters):
+                counts[index] += 1
+                moment = created[index] + timedelta(
+                    seconds=rnd.expovariate(1 / BURST_SECONDS))
+                comments.append((next_id + index, author_id,
+                                 self.text(rnd, 3, 20),
+                                 self.datetime(min(moment, end))))
+            posts = []
+            for index in range(size):
+                group_id = image = None
+                if group_ids and rnd.random() < options['group_ratio']:
+                    group_id = rnd.choices(group_ids,
+                                           cum_weights=group_weights)[0]
+                if images and rnd.random() < options['image_ratio']:
+                    image = rnd.choice(images)
+                    refs[image[0]] = refs.get(image[0], 0) + 1
+                name, width, height, placeholder = image or ('', None,
+                                                             None, '')
+                posts.append((
+                    next_id + index, authors[index], self.text(rnd, 5, 60),
+                    self.datetime(created[index]), group_id, name, width,
+                    height, placeholder, counts[index],
+                ))
+            with transaction.atomic():
+                self.insert(Post, (
+                    'id', 'author', 'text', 'created', 'group', 'image',
+                    'image_width', 'image_height', 'image_placeholder',
+                    'comments_count'), posts)
+                self.insert(Comment, ('post', 'author', 'text', 'created'),
+                            comments)
+            next_id += size
+            self.stdout.write(
+                f'... посты: {start + size}/{total}, '
+                f'{self.rate():.0f} строк/с')
+        return refs
+
+    def text(self, rnd, shortest, longest):
+        words = rnd.choices(WORDS, k=rnd.randint(shortest, longest))
+        return ' '.join(words).capitalize() + '.'
+
+    def datetime(self, value):
+        return connection.ops.adapt_datetimefield_value(value)
+
+    def insert(self, model, fields, rows):
+        """Строки в таблицу модели одним executemany, без объектов
+        моделей и save(): на миллионах строк они дороже самой вставки.
+        """
+        if not rows:
+            return
+        quote = connection.ops.quote_name
+        columns = ', '.join(quote(model._meta.get_field(name).column)
+                            for name in fields)
+        values = ', '.join(['%s'] * len(fields))
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {quote(model._meta.db_table)} ({columns}) '
+                f'VALUES ({values})', rows)
+        self.rows += len(rows)
+
+    def finish(self, refs, options):
+        """Досчитывает производные данные и сбрасывает кеши."""
+        counters.repair()
+        for name, count in refs.items():
+            if not MediaFile.objects.filter(name=name).update(
+                    refs=F('refs') + count):
+                MediaFile.objects.create(name=name, refs=count)
+            thumbnails.schedule(name)
+        if not options['no_timeline']:
+            self.stdout.write(f'Записей лент: {feeds.rebuild()}')
+        if not options['no_search']:
+            self.stdout.write(f'Постов в индексе: {search.rebuild()}')
+        stamps.touch(stamps.INDEX_SCOPE)
+        bump_feed_version()
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                    no_style(), [Post, Comment]):
+                cursor.execute(sql)
+
+    def rate(self):
+        return self.rows / max(time.monotonic() - self.started, 1e-6)
@@ -0,0 +1,129 @@
+import logging
+import os
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import transaction
+from django.db.models import CharField, F, Func
+from posts.models import MediaFile, Post
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+logger = logging.getLogger(__name__)
+
+
+def storage():
+    return Post._meta.get_field('image').storage
+
+
+def acquire(name):
+    """Атомарно добавляет ссылку на файл."""
+    files = MediaFile.objects.filter(name=name)
+    if not files.update(refs=F('refs') + 1):
+        _, created = MediaFile.objects.get_or_create(
+            name=name, defaults={'refs': 1})
+        if not created:
+            files.update(refs=F('refs') + 1)
+
+
+def release(name):
+    """Убирает ссылку на файл; файл без ссылок удаляется."""
+    MediaFile.objects.filter(name=name, refs__gte=1).update(
+        refs=F('refs') - 1)
+    deleted, _ = MediaFile.objects.filter(name=name, refs=0).delete()
+    if deleted:
+        transaction.on_commit(lambda: delete_file(name))
+
+
+def delete_file(name):
+    # Тот же файл могли загрузить снова, пока шла транзакция
+    if MediaFile.objects.filter(name=name).exists():
+        return
+    # Удаление - уборка: если файл не удалить, он останется сборщику
+    # мусора, а запрос, удаливший пост, не должен из-за этого падать
+    try:
+        remove_file(name)
+    except (OSError, SuspiciousFileOperation):
+        logger.warning('Не удалось удалить файл %s', name, exc_info=True)
+
+
+def remove_file(name, keep_original=False):
+    """Удаляет миниатюры файла и, если не keep_original, сам файл."""
+    default.kvstore.delete(ImageFile(name, storage()))
+    MediaFile.objects.filter(name=name).delete()
+    if not keep_original:
+        storage().delete(name)
+
+
+def walk(root, prefix='', after=''):
+    """Пути файлов под root после after в порядке строк."""
+    def key(entry):
+        if entry.is_dir(follow_symlinks=False):
+            return entry.name + '/'
+        return entry.name
+
+    def scan(directory, prefix):
+        try:
+            entries = sorted(os.scandir(directory), key=key)
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            path = prefix + entry.name
+            if entry.is_dir(follow_symlinks=False):
+                # Все пути внутри лежат между path + '/' и path + '0'
+                if after >= path + '0':
+                    continue
+                yield from scan(entry.path, path + '/')
+            elif path > after:
+                yield path
+
+    yield from scan(root, prefix)
+
+
+class Binary(Func):
+    """Строка с побайтовым сравнением: порядок как у строк Python
+    и walk(), а не по правилам сортировки базы.
+    """
+    template = '%(expressions)s COLLATE BINARY'
+    output_field = CharField()
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection,
+                           template='%(expressions)s COLLATE "C"',
+                           **extra_context)
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection,
+                           template='%(expressions)s COLLATE utf8mb4_bin',
+                           **extra_context)
+
+
+def referenced(after='', chunk_size=1000):
+    """Имена картинок постов по возрастанию, пачками по ключу."""
+    names = Post.objects.exclude(image='').annotate(
+        name=Binary('image')).order_by('name').values_list(
+        'name', flat=True).distinct()
+    while True:
+        chunk = list(names.filter(name__gt=after)[:chunk_size])
+        yield from chunk
+        if len(chunk) < chunk_size:
+            return
+        after = chunk[-1]
+
+
+def orphans(files, names):
+    """Слияние двух отсортированных потоков: файлы, которых нет среди
+    имён. Ни один поток не загружается в память целиком.
+    """
+    names = iter(names)
+    name = next(names, None)
+    for path in files:
+        while name is not None and name < path:
+            name = next(names, None)
+        if path != name:
+            yield path
+
+
+def unused(name):
+    """Файл не нужен ни посту, ни записи MediaFile."""
+    return not (Post.objects.filter(image=name).exists()
+                or MediaFile.objects.filter(name=name, refs__gt=0).exists())
@@ -0,0 +1,57 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:33
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_counters(apps, schema_editor):
+    Comment = apps.get_model('posts', 'Comment')
+    Counter = apps.get_model('posts', 'Counter')
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    values = {}
+    for field, queryset, key in (
+        ('posts', Post.objects, 'author_id'),
+        ('followers', Follow.objects, 'author_id'),
+        ('following', Follow.objects, 'user_id'),
+    ):
+        rows = queryset.order_by().values(key).annotate(
+            total=models.Count('pk'))
+        for row in rows:
+            values.setdefault(row[key], {})[field] = row['total']
+    Counter.objects.bulk_create(
+        Counter(user_id=user_id, **counts)
+        for user_id, counts in values.items()
+    )
+    comments = Comment.objects.order_by().values('post_id').annotate(
+        total=models.Count('pk'))
+    for row in comments:
+        Post.objects.filter(pk=row['post_id']).update(
+            comments_count=row['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0009_timeline'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Counter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('posts', models.PositiveIntegerField(default=0, verbose_name='Постов')),
+                ('followers', models.PositiveIntegerField(default=0, verbose_name='Подписчиков')),
+                ('following', models.PositiveIntegerField(default=0, verbose_name='Подписок')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество комментариев'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:49
+
+import core.storage
+from django.db import migrations, models
+
+
+def fill_media_files(apps, schema_editor):
+    MediaFile = apps.get_model('posts', 'MediaFile')
+    Post = apps.get_model('posts', 'Post')
+    refs = Post.objects.exclude(image='').order_by().values(
+        'image').annotate(total=models.Count('pk'))
+    MediaFile.objects.bulk_create(
+        MediaFile(name=row['image'], refs=row['total']) for row in refs
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_post_image_meta'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaFile',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False, verbose_name='Имя файла')),
+                ('refs', models.PositiveIntegerField(default=0, verbose_name='Ссылок')),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, help_text='Загрузите изображение', storage=core.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Изображение'),
+        ),
+        migrations.RunPython(fill_media_files, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:56
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_post_image_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, help_text='Загрузите изображение', storage=core.storage.PostImageStorage(), upload_to='posts/', verbose_name='Изображение'),
+        ),
+    ]
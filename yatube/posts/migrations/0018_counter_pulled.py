@@ -0,0 +1,26 @@
+# Generated by Django 2.2.16 on 2026-10-18 12:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_pulled(apps, schema_editor):
+    Counter = apps.get_model('posts', 'Counter')
+    Counter.objects.filter(
+        followers__gte=settings.FEED_PULL_THRESHOLD).update(pulled=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_change_stamps'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='counter',
+            name='pulled',
+            field=models.BooleanField(default=False, verbose_name='Подмешивается при чтении'),
+        ),
+        migrations.RunPython(mark_pulled, migrations.RunPython.noop),
+    ]
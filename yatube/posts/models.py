@@ -1,7 +1,9 @@
 # posts/models.py
 from django.contrib.auth import get_user_model
 from django.db import models
+from core.images import describe
 from core.models import CreatedModel
+from core.storage import PostImageStorage
 
 User = get_user_model()
 
@@ -30,6 +32,7 @@ class Post(CreatedModel):
         on_delete=models.CASCADE,
         related_name='posts',
         verbose_name='Автор',
+        db_index=False,
     )
 
     group = models.ForeignKey(
@@ -40,21 +43,87 @@ class Post(CreatedModel):
         related_name='posts',
         verbose_name='Группа',
         help_text='Группа, к которой будет относиться пост',
+        db_index=False,
     )
 
     image = models.ImageField(
         'Изображение',
         upload_to='posts/',
+        storage=PostImageStorage(),
         blank=True,
         help_text='Загрузите изображение',
     )
 
+    # Размеры и заглушка считаются один раз при загрузке картинки,
+    # чтобы страницам не приходилось открывать оригинал.
+    image_width = models.PositiveIntegerField(
+        'Ширина изображения',
+        null=True,
+        editable=False,
+    )
+
+    image_height = models.PositiveIntegerField(
+        'Высота изображения',
+        null=True,
+        editable=False,
+    )
+
+    image_placeholder = models.TextField(
+        'Заглушка изображения',
+        blank=True,
+        editable=False,
+    )
+
+    comments_count = models.PositiveIntegerField(
+        'Количество комментариев',
+        default=0,
+        editable=False,
+    )
+
     class Meta:
         ordering = ['-created']
+        # Индексы повторяют порядок лент: главная, группа, автор.
+        # Индексы по внешним ключам им не нужны, их покрывают составные.
+        indexes = [
+            models.Index(fields=['-created', '-id'],
+                         name='post_created_idx'),
+            models.Index(fields=['group', '-created', '-id'],
+                         name='post_group_created_idx'),
+            models.Index(fields=['author', '-created', '-id'],
+                         name='post_author_created_idx'),
+            # Сборщик мусора читает картинки по порядку имён
+            models.Index(fields=['image'], name='post_image_idx'),
+        ]
 
     def __str__(self) -> str:
         return self.text[:15]
 
+    def describe_image(self):
+        """Заполняет размеры и заглушку по только что загруженной
+        картинке; для битого файла они остаются пустыми.
+        """
+        self.image_width = self.image_height = None
+        self.image_placeholder = ''
+        if not self.image:
+            return
+        try:
+            (self.image_width, self.image_height,
+             self.image_placeholder) = describe(self.image)
+        except (OSError, ValueError):
+            pass
+
+    def save(self, *args, **kwargs):
+        if not self.image or not self.image._committed:
+            self.describe_image()
+        # Счётчик комментариев меняется только F()-выражениями,
+        # поэтому при обновлении поста его устаревшее значение не пишем.
+        if not self._state.adding and not kwargs.get('update_fields'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'comments_count'
+            ]
+        super().save(*args, **kwargs)
+
 
 class Comment(CreatedModel):
     """Модель комментариев."""
@@ -63,6 +132,7 @@ class Comment(CreatedModel):
         Post,
         related_name='comments',
         on_delete=models.CASCADE,
+        db_index=False,
     )
 
     author = models.ForeignKey(
@@ -76,6 +146,13 @@ class Comment(CreatedModel):
         help_text='Введите текст комментария'
     )
 
+    class Meta:
+        ordering = ['created', 'id']
+        indexes = [
+            models.Index(fields=['post', 'created', 'id'],
+                         name='comment_post_created_idx'),
+        ]
+
 
 class Follow(models.Model):
     """Модель подписок"""
@@ -83,13 +160,98 @@ class Follow(models.Model):
         User,
         related_name='follower',
         on_delete=models.CASCADE,
+        db_index=False,
     )
 
     author = models.ForeignKey(
         User,
         related_name='following',
         on_delete=models.CASCADE,
+        db_index=False,
     )
 
     class Meta:
+        # (user, author) покрывает подписки пользователя,
+        # (author, user) - подписчиков автора.
         unique_together = ('user', 'author',)
+        indexes = [
+            models.Index(fields=['author', 'user'],
+                         name='follow_author_user_idx'),
+        ]
+
+
+class Counter(models.Model):
+    """Счётчики пользователя: постов, подписчиков и подписок."""
+    user = models.OneToOneField(
+        User,
+        primary_key=True,
+        related_name='counter',
+        on_delete=models.CASCADE,
+    )
+
+    posts = models.PositiveIntegerField('Постов', default=0)
+
+    followers = models.PositiveIntegerField('Подписчиков', default=0)
+
+    following = models.PositiveIntegerField('Подписок', default=0)
+
+    # Посты автора подмешиваются в ленты при чтении, а не раскладываются;
+    # см. posts.feeds
+    pulled = models.BooleanField('Подмешивается при чтении', default=False)
+
+    def __str__(self) -> str:
+        return f'{self.user}: {self.posts}/{self.followers}/{self.following}'
+
+
+class Timeline(models.Model):
+    """Лента подписок, материализованная при записи."""
+    user = models.ForeignKey(
+        User,
+        related_name='timeline',
+        on_delete=models.CASCADE,
+        db_index=False,
+    )
+
+    post = models.ForeignKey(
+        Post,
+        related_name='timeline',
+        on_delete=models.CASCADE,
+    )
+
+    author = models.ForeignKey(
+        User,
+        related_name='+',
+        on_delete=models.CASCADE,
+    )
+
+    created = models.DateTimeField('Дата создания поста')
+
+    class Meta:
+        ordering = ['-created', '-id']
+        unique_together = ('user', 'post',)
+        indexes = [
+            models.Index(fields=['user', '-created', '-post'],
+                         name='timeline_user_created_idx'),
+            models.Index(fields=['user', 'author'],
+                         name='timeline_user_author_idx'),
+        ]
+
+
+class MediaFile(models.Model):
+    """Файл картинки и число постов, которые на него ссылаются."""
+    name = models.CharField('Имя файла', max_length=255, primary_key=True)
+
+    refs = models.PositiveIntegerField('Ссылок', default=0)
+
+    def __str__(self) -> str:
+        return f'{self.name}: {self.refs}'
+
+
+class ChangeStamp(models.Model):
+    """Время последнего изменения области страниц."""
+    scope = models.CharField('Область', max_length=255, primary_key=True)
+
+    changed = models.DateTimeField('Дата изменения')
+
+    def __str__(self) -> str:
+        return f'{self.scope}: {self.changed}'
@@ -0,0 +1,98 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from core import holes
+from posts import stamps
+from posts.cache import tag_versions
+
+KEY_PREFIX = 'posts:page'
+
+
+def page_key(request):
+    path = request.get_full_path().encode()
+    return f'{KEY_PREFIX}:{hashlib.md5(path).hexdigest()}'
+
+
+def cacheable(request):
+    return (request.method in ('GET', 'HEAD')
+            and 'messages' not in request.COOKIES)
+
+
+def storable(request, response):
+    """В общий кеш не попадают ответы с cookie и CSRF-токеном."""
+    return (response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+            and not request.META.get('CSRF_COOKIE_USED'))
+
+
+def stitch(request, response):
+    """Дыры подставляются только в HTML: там текст пользователей
+    экранирован, а в JSON он мог бы совпасть с меткой дыры.
+    """
+    if response.get('Content-Type', '').startswith('text/html'):
+        response.content = holes.stitch(request, response.content)
+    return response
+
+
+def fresh(request, changed, scopes, kwargs):
+    """Запись не устарела по отметкам изменений в базе."""
+    if not settings.PAGE_CACHE_VERIFY:
+        return True
+    return stamps.last_changed(scopes(request, **kwargs)) == changed
+
+
+def serve(request, response, changed):
+    """Ответ из общей страницы для пользователя запроса."""
+    if changed is not None:
+        etag, last_modified = stamps.validators(request, changed)
+        stamps.set_validators(response, etag, last_modified)
+        # Без совпавших условий возвращается сам response
+        conditional = get_conditional_response(
+            request, etag=etag, last_modified=last_modified,
+            response=response)
+        if conditional is not response:
+            return conditional
+    return stitch(request, response)
+
+
+def shared_cache(scopes):
+    """Декоратор вьюхи: кеш страницы, общий для всех посетителей."""
+    def decorator(view):
+        view = stamps.conditional(scopes)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not cacheable(request):
+                return view(request, *args, **kwargs)
+            key = page_key(request)
+            entry = cache.get(key)
+            if entry is not None:
+                versions, changed, response = entry
+                if (tag_versions(versions) == versions
+                        and fresh(request, changed, scopes, kwargs)):
+                    return serve(request, response, changed)
+            # Условный запрос, скорее всего, получит 304 - кешировать
+            # нечего, теги не вычисляем
+            if ('HTTP_IF_NONE_MATCH' in request.META
+                    or 'HTTP_IF_MODIFIED_SINCE' in request.META):
+                return view(request, *args, **kwargs)
+            # Версии читаются до рендеринга: изменение во время него
+            # сделает запись устаревшей, а не спрячет её
+            versions = tag_versions(stamps.resolve(scopes(request, **kwargs)))
+            request.punch_holes = True
+            try:
+                response = view(request, *args, **kwargs)
+            finally:
+                request.punch_holes = False
+            if response.streaming:
+                return response
+            if storable(request, response):
+                cache.set(key, (versions, request.page_changed, response),
+                          settings.PAGE_CACHE_TIMEOUT)
+            return stitch(request, response)
+        return wrapper
+    return decorator
@@ -0,0 +1,123 @@
+import re
+
+from django.db import connection
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from posts.models import Post
+
+"""Полнотекстовый индекс постов: таблица FTS5 с rowid = id поста."""
+FTS_TABLE = 'posts_post_fts'
+
+"""Сколько слов вокруг совпадения показывать в сниппете."""
+SNIPPET_TOKENS: int = 16
+
+# Маркеры совпадений в сниппете: текст поста экранируется,
+# а маркеры заменяются на <mark> уже после этого.
+MARK_START = '\x02'
+MARK_END = '\x03'
+
+WORD_RE = re.compile(r'\w+')
+
+
+def available():
+    """Индекс есть только на SQLite - см. миграцию 0012."""
+    return connection.vendor == 'sqlite'
+
+
+def match_expression(query):
+    """Строка запроса FTS5: слова в кавычках, как префиксы, через AND."""
+    words = WORD_RE.findall(query)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def index_post(post):
+    index_posts([post])
+
+
+def index_posts(posts):
+    """Индексирует пачку постов двумя executemany."""
+    if not available() or not posts:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                           [[post.pk] for post in posts])
+        cursor.executemany(f'INSERT INTO {FTS_TABLE}(rowid, text) '
+                           f'VALUES (%s, %s)',
+                           [[post.pk, post.text] for post in posts])
+
+
+def unindex_post(post_id):
+    if not available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                       [post_id])
+
+
+def rebuild():
+    """Перестраивает индекс одним INSERT ... SELECT."""
+    if not available():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(f'INSERT INTO {FTS_TABLE}(rowid, text) '
+                       f'SELECT id, text FROM {Post._meta.db_table}')
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) "
+                       f"VALUES ('optimize')")
+        cursor.execute(f'SELECT COUNT(*) FROM {FTS_TABLE}')
+        return cursor.fetchone()[0]
+
+
+def matching_ids_sql():
+    """Подзапрос с id постов, подходящих под выражение MATCH."""
+    return f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+
+
+def highlight(snippet):
+    return mark_safe(
+        escape(snippet)
+        .replace(MARK_START, '<mark>')
+        .replace(MARK_END, '</mark>')
+    )
+
+
+class SearchResults:
+    """Найденные посты по релевантности (bm25)."""
+
+    keys = ('score', 'id')
+
+    def __init__(self, query):
+        self.match = match_expression(query)
+
+    def keyset(self, direction, bound, limit):
+        if not self.match or not available():
+            return []
+        sql = (
+            f'SELECT rowid, rank, snippet({FTS_TABLE}, 0, %s, %s, %s, %s) '
+            f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+        )
+        params = [MARK_START, MARK_END, '…', SNIPPET_TOKENS, self.match]
+        # Меньший bm25 - более релевантный результат
+        lookup, ordering = ('>', 'ASC') if direction == 'n' else ('<', 'DESC')
+        if bound is not None:
+            score, pk = bound
+            sql += (f' AND (rank {lookup} %s '
+                    f'OR (rank = %s AND rowid {lookup} %s))')
+            params += [score, score, pk]
+        sql += f' ORDER BY rank {ordering}, rowid {ordering} LIMIT %s'
+        params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+
+        posts = Post.objects.select_related('author', 'group').in_bulk(
+            [row[0] for row in rows])
+        results = []
+        for pk, score, snippet in rows:
+            post = posts.get(pk)
+            if post is None:
+                continue
+            post.score = score
+            post.snippet = highlight(snippet)
+            results.append(post)
+        return results
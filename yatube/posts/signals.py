@@ -0,0 +1,108 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from posts import counters, feeds, media, search, stamps, thumbnails
+from posts.cache import bump_feed_version
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, **kwargs):
+    """Запоминает прежние картинку и группу поста: картинку нужно
+    освободить, а ленту прежней группы - отметить изменённой.
+    """
+    instance.previous_image = ''
+    instance.previous_group_id = None
+    if not instance._state.adding:
+        image, instance.previous_group_id = Post.objects.filter(
+            pk=instance.pk).values_list('image', 'group_id').first() or (
+            '', None)
+        instance.previous_image = image or ''
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    """Поиск, счётчики, ленты, ссылки на картинки и миниатюры поста."""
+    search.index_post(instance)
+    previous = getattr(instance, 'previous_image', '')
+    if (instance.image.name or '') != previous:
+        if instance.image:
+            media.acquire(instance.image.name)
+            thumbnails.schedule(instance.image.name)
+        if previous:
+            media.release(previous)
+    if created:
+        counters.change(instance.author_id, 'posts', 1)
+        feeds.push_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    search.unindex_post(instance.pk)
+    if instance.image:
+        media.release(instance.image.name)
+    counters.change(instance.author_id, 'posts', -1)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.change_comments(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.change_comments(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    """Подписка меняет счётчики и заполняет ленту постами автора."""
+    if created:
+        counters.change(instance.author_id, 'followers', 1)
+        counters.change(instance.user_id, 'following', 1)
+        feeds.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    """Отписка меняет счётчики и убирает посты автора из ленты."""
+    counters.change(instance.author_id, 'followers', -1)
+    counters.change(instance.user_id, 'following', -1)
+    feeds.prune(instance.user_id, instance.author_id)
+
+
+@receiver([post_save, post_delete], sender=Post)
+@receiver([post_save, post_delete], sender=Comment)
+@receiver([post_save, post_delete], sender=Follow)
+@receiver([post_save, post_delete], sender=Group)
+def feed_changed(sender, **kwargs):
+    """Любое изменение контента сбрасывает кеш фрагментов лент."""
+    bump_feed_version()
+
+
+@receiver([post_save, post_delete], sender=Post)
+def post_changed(sender, instance, **kwargs):
+    stamps.touch_post(instance, getattr(instance, 'previous_group_id', None))
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    stamps.touch_comment(instance)
+
+
+@receiver([post_save, post_delete], sender=Follow)
+def follow_changed(sender, instance, **kwargs):
+    """Подписка меняет счётчики и кнопку в профилях обоих."""
+    stamps.touch(*(
+        stamps.profile_scope(username) for username in
+        User.objects.filter(pk__in=[instance.user_id, instance.author_id])
+        .values_list('username', flat=True)
+    ))
+
+
+@receiver([post_save, post_delete], sender=Group)
+def group_changed(sender, instance, **kwargs):
+    stamps.touch(stamps.INDEX_SCOPE, stamps.group_scope(instance.slug))
@@ -0,0 +1,146 @@
+from functools import wraps
+
+from django.db.models import Max, Q, QuerySet
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from posts.cache import bump_tags
+from posts.models import ChangeStamp, Group, Post
+
+INDEX_SCOPE = 'index'
+
+
+def group_scope(slug):
+    return f'group:{slug}'
+
+
+def profile_scope(username):
+    return f'profile:{username}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def comments_scope(scope):
+    """Число комментариев у постов ленты scope. HTML-ленты его
+    не показывают и от этой области не зависят.
+    """
+    return f'comments:{scope}'
+
+
+def touch(*scopes):
+    """Отмечает, что содержимое областей scopes изменилось сейчас,
+    и сбрасывает их страницы в кеше страниц.
+    """
+    scopes = set(scopes)
+    bump_tags(*scopes)
+    now = timezone.now()
+    stamps = ChangeStamp.objects.filter(scope__in=scopes)
+    if stamps.update(changed=now) < len(scopes):
+        existing = set(stamps.values_list('scope', flat=True))
+        ChangeStamp.objects.bulk_create(
+            (ChangeStamp(scope=scope, changed=now)
+             for scope in scopes - existing),
+            ignore_conflicts=True,
+        )
+
+
+def touch_post(post, previous_group_id=None):
+    """Пост виден на главной, в профиле автора, на своей странице
+    и в лентах групп - прежней и новой.
+    """
+    scopes = [INDEX_SCOPE, post_scope(post.pk),
+              profile_scope(post.author.username)]
+    group_ids = {post.group_id, previous_group_id} - {None}
+    if group_ids:
+        scopes.extend(
+            group_scope(slug) for slug in Group.objects.filter(
+                pk__in=group_ids).values_list('slug', flat=True))
+    touch(*scopes)
+
+
+def touch_comment(comment):
+    """Комментарий меняет страницу поста и число комментариев поста
+    в лентах: на главной, в профиле автора и в группе.
+    """
+    scopes = [post_scope(comment.post_id)]
+    post = Post.objects.filter(pk=comment.post_id).values_list(
+        'author__username', 'group__slug').first()
+    # При удалении поста его комментарии удаляются раньше него
+    if post is not None:
+        username, slug = post
+        feeds = [INDEX_SCOPE, profile_scope(username)]
+        if slug:
+            feeds.append(group_scope(slug))
+        scopes.extend(comments_scope(scope) for scope in feeds)
+    touch(*scopes)
+
+
+def touch_image(name):
+    """Миниатюры картинки готовы - меняются страницы её постов."""
+    for post in Post.objects.filter(image=name).select_related('author'):
+        touch_post(post)
+
+
+def last_changed(scopes):
+    """Последнее изменение в областях за один запрос."""
+    names = [scope for scope in scopes if isinstance(scope, str)]
+    condition = Q(scope__in=names)
+    for scope in scopes:
+        if isinstance(scope, QuerySet):
+            condition |= Q(scope__in=scope)
+    return ChangeStamp.objects.filter(condition).aggregate(
+        changed=Max('changed'))['changed']
+
+
+def resolve(scopes):
+    """Имена областей; QuerySet из scopes выполняется как запрос."""
+    names = []
+    for scope in scopes:
+        if isinstance(scope, QuerySet):
+            names.extend(scope.values_list('scope', flat=True))
+        else:
+            names.append(scope)
+    return names
+
+
+def validators(request, changed):
+    """ETag и Last-Modified страницы для пользователя запроса."""
+    user_id = request.user.pk or 0
+    etag = f'W/"{user_id:x}-{int(changed.timestamp() * 1e6):x}"'
+    last_modified = None if user_id else int(changed.timestamp())
+    return etag, last_modified
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified is None:
+        del response['Last-Modified']
+    else:
+        response['Last-Modified'] = http_date(last_modified)
+    patch_vary_headers(response, ('Cookie',))
+
+
+def conditional(scopes):
+    """Декоратор вьюхи: ответ 304 без рендеринга шаблона."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            changed = last_changed(scopes(request, **kwargs))
+            request.page_changed = changed
+            if changed is None:
+                return view(request, *args, **kwargs)
+            etag, last_modified = validators(request, changed)
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            set_validators(response, etag, last_modified)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,119 @@
+from django.contrib.auth import get_user_model
+from django.contrib.syndication.views import Feed
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.html import linebreaks
+from django.utils.text import Truncator
+from core.paginator import keyset
+from posts.models import Group, Post
+from posts.pagecache import shared_cache
+from posts.stamps import INDEX_SCOPE, group_scope, profile_scope
+
+User = get_user_model()
+
+"""Число последних постов в RSS и Atom лентах."""
+SYNDICATION_SIZE: int = 20
+
+
+def latest(post_list):
+    """Последние посты по ключу (created, id) - тем же индексом,
+    что и страницы лент.
+    """
+    return list(keyset(post_list.select_related('author', 'group'),
+                       ('created', 'id'), 'n', None)[:SYNDICATION_SIZE])
+
+
+class PostsFeed(Feed):
+    """Общая часть лент: как выглядит пост в RSS."""
+
+    def item_title(self, post):
+        return Truncator(post.text).words(8)
+
+    def item_description(self, post):
+        return linebreaks(post.text, autoescape=True)
+
+    def item_link(self, post):
+        return reverse('posts:post_detail', kwargs={'post_id': post.pk})
+
+    def item_author_name(self, post):
+        return post.author.get_full_name() or post.author.username
+
+    def item_author_link(self, post):
+        return reverse('posts:profile',
+                       kwargs={'username': post.author.username})
+
+    def item_pubdate(self, post):
+        return post.created
+
+    def item_categories(self, post):
+        return [post.group.title] if post.group else []
+
+
+class IndexFeed(PostsFeed):
+    title = 'Yatube: последние обновления'
+    description = 'Последние посты всех авторов'
+
+    def link(self):
+        return reverse('posts:index')
+
+    def items(self):
+        return latest(Post.objects.all())
+
+
+class GroupFeed(PostsFeed):
+    def get_object(self, request, slug):
+        return get_object_or_404(Group, slug=slug)
+
+    def title(self, group):
+        return f'Yatube: {group.title}'
+
+    def description(self, group):
+        return group.description
+
+    def link(self, group):
+        return reverse('posts:group_page', kwargs={'slug': group.slug})
+
+    def items(self, group):
+        return latest(group.posts.all())
+
+
+class ProfileFeed(PostsFeed):
+    def get_object(self, request, username):
+        return get_object_or_404(User, username=username)
+
+    def title(self, author):
+        return f'Yatube: {author.get_full_name() or author.username}'
+
+    def description(self, author):
+        return f'Посты пользователя {author.username}'
+
+    def link(self, author):
+        return reverse('posts:profile', kwargs={'username': author.username})
+
+    def items(self, author):
+        return latest(author.posts.all())
+
+
+def atom(feed_class):
+    """Вариант ленты в формате Atom."""
+    return type(f'Atom{feed_class.__name__}', (feed_class,), {
+        'feed_type': Atom1Feed,
+        'subtitle': feed_class.description,
+    })
+
+
+def cached(feed, scopes):
+    """Лента из общего кеша страниц с ответом 304."""
+    return shared_cache(scopes)(feed)
+
+
+index_rss = cached(IndexFeed(), lambda request: [INDEX_SCOPE])
+index_atom = cached(atom(IndexFeed)(), lambda request: [INDEX_SCOPE])
+group_rss = cached(GroupFeed(), lambda request, slug: [group_scope(slug)])
+group_atom = cached(atom(GroupFeed)(),
+                    lambda request, slug: [group_scope(slug)])
+profile_rss = cached(ProfileFeed(),
+                     lambda request, username: [profile_scope(username)])
+profile_atom = cached(atom(ProfileFeed)(),
+                      lambda request, username: [profile_scope(username)])
@@ -0,0 +1,42 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from posts.cache import feed_version
+
+register = template.Library()
+
+
+class FeedCacheNode(template.Node):
+    def __init__(self, nodelist, fragment_name, vary_on):
+        self.nodelist = nodelist
+        self.fragment_name = fragment_name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        request = context.get('request')
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        vary_on.append(feed_version())
+        if request is not None:
+            vary_on.append(request.GET.get('page'))
+            vary_on.append(request.GET.get('cursor'))
+        key = make_template_fragment_key(self.fragment_name, vary_on)
+        value = cache.get(key)
+        if value is None:
+            value = self.nodelist.render(context)
+            cache.set(key, value, settings.FEED_CACHE_TIMEOUT)
+        return value
+
+
+@register.tag
+def feedcache(parser, token):
+    """{% feedcache 'имя' [vary_on ...] %} - фрагмент ленты в кеше."""
+    nodelist = parser.parse(('endfeedcache',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < 2:
+        raise template.TemplateSyntaxError(
+            f'{tokens[0]} tag requires at least 1 argument.')
+    fragment_name = tokens[1].strip('\'"')
+    vary_on = [parser.compile_filter(token) for token in tokens[2:]]
+    return FeedCacheNode(nodelist, fragment_name, vary_on)
@@ -0,0 +1,35 @@
+from django import template
+from posts import thumbnails
+
+register = template.Library()
+
+
+def load(context, post, names=None):
+    """Загружает миниатюры поста, а заодно и всей страницы page_obj."""
+    known = getattr(post, 'thumbnails', {})
+    if any(alias not in known for alias in names or thumbnails.aliases()):
+        page_obj = context.get('page_obj') or []
+        thumbnails.prefetch([post, *page_obj], names)
+
+
+@register.simple_tag(takes_context=True)
+def post_thumbnail(context, post, alias='card'):
+    """{% post_thumbnail post 'card' as im %} - готовая миниатюра или None."""
+    if not post.image:
+        return None
+    load(context, post, [alias])
+    thumbnail = post.thumbnails[alias]
+    if thumbnail is None:
+        thumbnails.schedule(post.image.name)
+    return thumbnail
+
+
+@register.simple_tag(takes_context=True)
+def post_picture(context, post):
+    """{% post_picture post as picture %} - данные для <picture> или None."""
+    if not post.image:
+        return None
+    load(context, post)
+    if not thumbnails.complete(post):
+        thumbnails.schedule(post.image.name)
+    return thumbnails.picture(post)
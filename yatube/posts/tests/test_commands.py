@@ -0,0 +1,361 @@
+# posts/tests/test_commands.py
+import csv
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from posts import search
+from posts.counters import get_counter
+from posts.models import (Comment, Counter, Follow, Group, MediaFile, Post,
+                          Timeline)
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (b'\x47\x49\x46\x38\x39\x61\x02\x00'
+             b'\x01\x00\x80\x00\x00\x00\x00\x00'
+             b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+             b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+             b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+             b'\x0A\x00\x3B')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ImportTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='import-slug', description='Описание')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def run_import(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command('import_posts', *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_import_posts(self):
+        """Посты загружаются с исходными датами, кривые строки
+        пропускаются, производные данные досчитываются.
+        """
+        path = self.write('posts.jsonl', '\n'.join((
+            '{"id": 101, "author": "author", "text": "Старый пост", '
+            '"created": "2015-03-01T10:00:00", "group": "import-slug"}',
+            '{"id": 102, "author": "newcomer", "text": "Пост новичка"}',
+            '{"id": 103, "author": "nobody", "text": "Чужой"}',
+            '{"id": "x", "author": "author", "text": "Без id"}',
+            'не json',
+            '{"id": 104, "author": "author", "text": "Без группы", '
+            '"group": "missing"}',
+        )))
+        out, err = self.run_import('posts', path, '--create-users',
+                                   '--chunk-size', '2')
+        self.assertIn('записано: 3, пропущено: 3', out)
+        self.assertIn('строк/с', out)
+        self.assertIn("Строка 6: нет группы 'missing'", err)
+        post = Post.objects.get(pk=101)
+        self.assertEqual(post.created.year, 2015)
+        self.assertEqual(post.group, self.group)
+        self.assertEqual(Post.objects.get(pk=102).author.username,
+                         'newcomer')
+        self.assertTrue(Post._meta.get_field('created').auto_now_add)
+        self.assertEqual(get_counter(self.author).posts, 1)
+        self.assertTrue(self.reader.timeline.filter(post_id=101).exists())
+        new_post = Post.objects.create(author=self.author, text='Новый')
+        self.assertGreater(new_post.pk, 103)
+
+    def test_import_comments_and_follows_csv(self):
+        Post.objects.create(id=201, author=self.author, text='Пост')
+        path = self.write('comments.csv', (
+            'post,author,text,created\n'
+            '201,reader,"Первый, с запятой",2016-01-01T00:00:00Z\n'
+            '201,author,Второй,\n'
+            '999,reader,К несуществующему,\n'
+        ))
+        out, err = self.run_import('comments', path)
+        self.assertIn('нет поста 999', err)
+        post = Post.objects.get(pk=201)
+        self.assertEqual(post.comments_count, 2)
+        self.assertEqual(
+            list(post.comments.values_list('text', flat=True)),
+            ['Первый, с запятой', 'Второй'])
+
+        follower = User.objects.create_user(username='follower')
+        path = self.write('follows.jsonl', '\n'.join((
+            '{"user": "follower", "author": "author"}',
+            '{"user": "follower", "author": "follower"}',
+        )))
+        out, err = self.run_import('follows', path)
+        self.assertIn('подписка на себя', err)
+        self.assertEqual(get_counter(self.author).followers, 2)
+        self.assertTrue(follower.timeline.filter(post_id=201).exists())
+
+    @override_settings(FEED_PULL_THRESHOLD=3)
+    def test_import_follows_rebuilds_feeds(self):
+        """Ленты раскладываются после пересчёта счётчиков: автор,
+        набравший за импорт порог подписчиков, в ленты не попадает.
+        """
+        star = User.objects.create_user(username='star')
+        Post.objects.create(id=401, author=star, text='Звезда')
+        Post.objects.create(id=402, author=self.author, text='Автор')
+        names = ('fan1', 'fan2', 'fan3')
+        for name in names:
+            User.objects.create_user(username=name)
+        lines = [f'{{"user": "{name}", "author": "star"}}'
+                 for name in names]
+        lines.append('{"user": "fan1", "author": "author"}')
+        path = self.write('follows.jsonl', '\n'.join(lines))
+        out, _ = self.run_import('follows', path, '--chunk-size', '2')
+        self.assertIn('Записей лент', out)
+        self.assertEqual(get_counter(star).followers, 3)
+        self.assertFalse(Timeline.objects.filter(author=star).exists())
+        self.assertEqual(
+            set(Timeline.objects.filter(post_id=402).values_list(
+                'user__username', flat=True)),
+            {'reader', 'fan1'})
+
+    def test_recount_only_touched(self):
+        """В конце импорта пересчитываются счётчики только задетых
+        пользователей и постов.
+        """
+        other = User.objects.create_user(username='other')
+        Counter.objects.create(user=other, posts=7)
+        Post.objects.create(id=501, author=self.author, text='Пост')
+        Post.objects.filter(pk=501).update(comments_count=5)
+        path = self.write('posts.jsonl',
+                          '{"id": 502, "author": "author", "text": "Ещё"}')
+        self.run_import('posts', path)
+        self.assertEqual(Counter.objects.get(user=self.author).posts, 2)
+        self.assertEqual(Counter.objects.get(user=other).posts, 7)
+        path = self.write('comments.jsonl',
+                          '{"post": 501, "author": "reader", "text": "Да"}')
+        self.run_import('comments', path)
+        self.assertEqual(Post.objects.get(pk=501).comments_count, 1)
+        self.assertEqual(Counter.objects.get(user=other).posts, 7)
+
+    def test_restart_from_checkpoint(self):
+        """Прерванный импорт продолжается с контрольной точки,
+        повторный импорт не создаёт дублей.
+        """
+        lines = [f'{{"id": {300 + i}, "author": "author", "text": "№{i}"}}'
+                 for i in range(5)]
+        path = self.write('posts.jsonl', '\n'.join(lines))
+        checkpoint = path + '.checkpoint'
+        with open(checkpoint, 'w') as file:
+            file.write('3')
+        out, _ = self.run_import('posts', path)
+        self.assertIn('начато после строки 3', out)
+        self.assertEqual(set(Post.objects.values_list('pk', flat=True)),
+                         {303, 304})
+        with open(checkpoint) as file:
+            self.assertEqual(file.read(), '5')
+        self.run_import('posts', path, '--reset', '--batch-size', '2')
+        self.run_import('posts', path, '--reset')
+        self.assertEqual(Post.objects.count(), 5)
+
+    def test_import_images(self):
+        """Картинки читаются из каталога и попадают в хранилище."""
+        images = os.path.join(self.directory, 'images')
+        os.makedirs(images)
+        with open(os.path.join(images, 'a.gif'), 'wb') as file:
+            file.write(SMALL_GIF)
+        path = self.write('posts.jsonl', '\n'.join((
+            '{"id": 401, "author": "author", "text": "С картинкой", '
+            '"image": "a.gif"}',
+            '{"id": 402, "author": "author", "text": "Без файла", '
+            '"image": "missing.gif"}',
+        )))
+        out, err = self.run_import('posts', path, '--images', images)
+        self.assertIn("нет файла 'missing.gif'", err)
+        post = Post.objects.get(pk=401)
+        self.assertTrue(os.path.exists(
+            os.path.join(TEMP_MEDIA_ROOT, post.image.name)))
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertEqual(MediaFile.objects.get(name=post.image.name).refs, 1)
+        # Повторный импорт не сохраняет файл и не считает ссылку снова
+        files = os.listdir(os.path.dirname(
+            os.path.join(TEMP_MEDIA_ROOT, post.image.name)))
+        out, _ = self.run_import('posts', path, '--images', images,
+                                 '--reset')
+        self.assertIn('уже были: 1', out)
+        self.assertEqual(MediaFile.objects.get(name=post.image.name).refs, 1)
+        self.assertEqual(files, os.listdir(os.path.dirname(
+            os.path.join(TEMP_MEDIA_ROOT, post.image.name))))
+
+    def test_existing_rows_are_not_touched(self):
+        """Строка с занятым id не перезаписывает пост и не попадает
+        в поиск, ленты и число записанных.
+        """
+        post = Post.objects.create(id=601, author=self.reader,
+                                   text='Исходное яблоко')
+        path = self.write('posts.jsonl', '\n'.join((
+            '{"id": 601, "author": "author", "text": "Чужой банан"}',
+            '{"id": 602, "author": "author", "text": "Новый"}',
+            '{"id": 602, "author": "author", "text": "Дубль в пачке"}',
+        )))
+        out, err = self.run_import('posts', path)
+        self.assertIn('записано: 1, пропущено: 0, уже были: 2', out)
+        self.assertEqual(err, '')
+        post.refresh_from_db()
+        self.assertEqual((post.author, post.text),
+                         (self.reader, 'Исходное яблоко'))
+        self.assertEqual(Post.objects.get(pk=602).text, 'Новый')
+        self.assertFalse(self.reader.timeline.filter(post=post).exists())
+        if search.available():
+            self.assertEqual(list(search.SearchResults('банан').keyset(
+                'n', None, 10)), [])
+
+
+class ExportTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='export-slug', description='Описание')
+        cls.posts = [
+            Post.objects.create(author=cls.author, text=f'Пост, №{i}',
+                                group=cls.group if i % 2 else None)
+            for i in range(5)
+        ]
+        Comment.objects.create(post=cls.posts[0], author=cls.reader,
+                               text='Коммент "в кавычках"')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def export(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command('export_posts', *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_jsonl_in_windows(self):
+        """Окна keyset стыкуются без пропусков и повторов."""
+        out, err = self.export('posts', '--window', '2')
+        rows = [json.loads(line) for line in out.splitlines()]
+        self.assertEqual([row['id'] for row in rows],
+                         [post.pk for post in self.posts])
+        self.assertEqual(rows[1]['group'], 'export-slug')
+        self.assertEqual(rows[1]['author'], 'author')
+        self.assertIn('Выгружено строк: 5', err)
+
+    def test_csv_and_columnar(self):
+        path = os.path.join(self.directory, 'comments.csv')
+        self.export('comments', '--format', 'csv', '--output', path)
+        with open(path, newline='', encoding='utf-8') as file:
+            rows = list(csv.DictReader(file))
+        self.assertEqual(rows[0]['text'], 'Коммент "в кавычках"')
+        self.assertEqual(rows[0]['author'], 'reader')
+        self.assertEqual(os.listdir(self.directory), ['comments.csv'])
+        out, _ = self.export('follows', '--format', 'columnar')
+        self.assertEqual(json.loads(out)['author'], ['author'])
+
+    def test_incremental_by_watermark(self):
+        """Повторная выгрузка с водяным знаком отдаёт только новое."""
+        watermark = os.path.join(self.directory, 'posts.watermark')
+        out, _ = self.export('posts', '--watermark', watermark)
+        self.assertEqual(len(out.splitlines()), 5)
+        post = Post.objects.create(author=self.reader, text='Новый')
+        out, _ = self.export('posts', '--watermark', watermark)
+        self.assertEqual([json.loads(line)['id'] for line in out.splitlines()],
+                         [post.pk])
+        out, _ = self.export('posts', '--watermark', watermark)
+        self.assertEqual(out, '')
+        # Дата строки не важна: импортированный пост с прошлой датой
+        # тоже новый для выгрузки
+        old = Post.objects.create(author=self.reader, text='Старый')
+        Post.objects.filter(pk=old.pk).update(
+            created=self.posts[0].created - timedelta(days=365))
+        out, _ = self.export('posts', '--watermark', watermark)
+        self.assertEqual([json.loads(line)['id'] for line in out.splitlines()],
+                         [old.pk])
+        with open(watermark) as file:
+            self.assertEqual(file.read(), str(old.pk))
+        follow = Follow.objects.create(user=self.author, author=self.reader)
+        out, _ = self.export('follows', '--since', str(follow.pk - 1))
+        self.assertEqual(json.loads(out)['id'], follow.pk)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0,
+                   FEED_PULL_THRESHOLD=20)
+class SeedDataTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def seed(self, *args):
+        call_command('seed_data', '--users', '60', '--posts', '300',
+                     '--groups', '5', '--follows', '8', '--comments', '3',
+                     '--images', '2', '--image-ratio', '0.2',
+                     '--chunk-size', '100', '--end', '2024-01-01T00:00:00',
+                     *args, stdout=StringIO())
+
+    def snapshot(self):
+        return list(Post.objects.order_by('id').values_list(
+            'author__username', 'group__slug', 'text', 'created', 'image',
+            'comments_count'))
+
+    def test_same_seed_same_dataset(self):
+        self.seed()
+        first = self.snapshot()
+        User.objects.filter(username__startswith='seed42_').delete()
+        Group.objects.filter(slug__startswith='seed42-').delete()
+        self.seed()
+        self.assertEqual(self.snapshot(), first)
+        self.seed('--seed', '7')
+        self.assertNotEqual(self.snapshot()[300:], first)
+
+    def test_derived_data(self):
+        """Счётчики, ссылки на картинки, ленты и всплески комментариев."""
+        self.seed()
+        self.assertEqual(Post.objects.count(), 300)
+        self.assertEqual(Comment.objects.count(), 900)
+        counts = list(Post.objects.values_list('comments_count', flat=True))
+        self.assertEqual(sum(counts), 900)
+        self.assertGreater(max(counts), 30)
+        followers = [
+            counter.followers for counter in Counter.objects.order_by(
+                'user_id')]
+        self.assertEqual(sum(followers), Follow.objects.count())
+        self.assertGreater(followers[0], 5 * followers[-1])
+        self.assertEqual(
+            sum(MediaFile.objects.values_list('refs', flat=True)),
+            Post.objects.exclude(image='').count())
+        # Посты авторов от порога подписчиков в ленты не раскладываются
+        pushed = sum(counter.posts * counter.followers
+                     for counter in Counter.objects.all()
+                     if counter.followers < 20)
+        self.assertGreater(pushed, 0)
+        self.assertEqual(Timeline.objects.count(), pushed)
+        self.assertEqual(
+            Timeline.objects.filter(author__counter__followers__gte=20)
+            .count(), 0)
@@ -75,6 +75,12 @@ class PostCreateFormTests(TestCase):
             content=small_gif,
             content_type='image/gif'
         )
+        # Хранилище называет файлы по хешу содержимого
+        storage = Post._meta.get_field('image').storage
+        self.image_name = storage.content_name(
+            'posts/small.gif', self.uploaded)
+        self.new_image_name = storage.content_name(
+            'posts/new_small.gif', self.new_uploaded)
         self.form_data = {
             'text': 'Тестовый текст',
             'group': self.test_group.id,
@@ -118,7 +124,7 @@ class PostCreateFormTests(TestCase):
                 text='Тестовый текст',
                 group=self.test_group.id,
                 author=self.auth.id,
-                image='posts/small.gif',
+                image=self.image_name,
             ).exists()
         )
 
@@ -170,7 +176,7 @@ class PostCreateFormTests(TestCase):
                 created=self.post.created,
                 author=self.auth.id,
                 group=self.new_test_group.id,
-                image='posts/new_small.gif'
+                image=self.new_image_name,
             ).exists()
         )
 
@@ -193,7 +199,7 @@ class PostCreateFormTests(TestCase):
                 created=self.post.created,
                 author=self.auth.id,
                 group=self.new_test_group.id,
-                image='posts/new_small.gif'
+                image=self.new_image_name,
             ).exists()
         )
 
@@ -218,6 +224,6 @@ class PostCreateFormTests(TestCase):
                 created=self.post.created,
                 author=self.auth.id,
                 group=self.new_test_group.id,
-                image='posts/new_small.gif'
+                image=self.new_image_name,
             ).exists()
         )
@@ -1,10 +1,23 @@
 # posts/tests/test_models.py
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
-from posts.models import Group, Post
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from posts import media
+from posts.counters import get_counter
+from posts.models import Comment, Counter, Follow, Group, MediaFile, Post
 
 User = get_user_model()
 
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
 
 class PostModelTest(TestCase):
     @classmethod
@@ -61,3 +74,208 @@ class PostModelTest(TestCase):
                     self.posts_post._meta.get_field(field).help_text,
                     expected_value
                 )
+
+
+class CounterTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def counter(self, user):
+        return get_counter(User.objects.get(pk=user.pk))
+
+    def test_counters_follow_create_and_delete(self):
+        """Счётчики меняются при создании и удалении объектов."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Post.objects.create(author=self.author, text='Ещё пост')
+        Comment.objects.create(post=post, author=self.reader, text='Ок')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.counter(self.author).posts, 2)
+        self.assertEqual(self.counter(self.author).followers, 1)
+        self.assertEqual(self.counter(self.reader).following, 1)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+
+        Comment.objects.all().delete()
+        post.delete()
+        Follow.objects.all().delete()
+        self.assertEqual(self.counter(self.author).posts, 1)
+        self.assertEqual(self.counter(self.author).followers, 0)
+        self.assertEqual(self.counter(self.reader).following, 0)
+
+    def test_post_edit_keeps_comments_count(self):
+        """Сохранение поста не затирает счётчик комментариев."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        stale = Post.objects.get(pk=post.pk)
+        Comment.objects.create(post=post, author=self.reader, text='Ок')
+        stale.text = 'Изменённый пост'
+        stale.save()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+
+    def test_repair_counters(self):
+        """Команда repair_counters исправляет расхождения."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.reader, text='Ок')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Counter.objects.filter(user=self.author).update(posts=5, followers=0)
+        Counter.objects.filter(user=self.reader).delete()
+        Post.objects.filter(pk=post.pk).update(comments_count=7)
+
+        out = StringIO()
+        call_command('repair_counters', stdout=out)
+        self.assertIn('пользователей: 2, постов: 1', out.getvalue())
+        self.assertEqual(self.counter(self.author).posts, 1)
+        self.assertEqual(self.counter(self.author).followers, 1)
+        self.assertEqual(self.counter(self.reader).following, 1)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class MediaFileTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def upload(self, name, color=b'\xFF'):
+        small_gif = (b'\x47\x49\x46\x38\x39\x61\x02\x00'
+                     b'\x01\x00\x80\x00\x00\x00\x00\x00'
+                     + color * 3
+                     + b'\x21\xF9\x04\x00\x00'
+                     b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+                     b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+                     b'\x0A\x00\x3B'
+                     )
+        return SimpleUploadedFile(name=name, content=small_gif,
+                                  content_type='image/gif')
+
+    def refs(self, name):
+        return MediaFile.objects.filter(name=name).values_list(
+            'refs', flat=True).first()
+
+    def test_identical_uploads_share_one_file(self):
+        """Одинаковые картинки хранятся одним файлом в шардах по хешу."""
+        first = Post.objects.create(
+            author=self.author, text='Пост', image=self.upload('a.GIF'))
+        second = Post.objects.create(
+            author=self.author, text='Пост', image=self.upload('b.gif'))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name,
+                         r'^posts/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.gif$')
+        digest = first.image.name.rsplit('/', 1)[1]
+        self.assertTrue(first.image.name.startswith(
+            f'posts/{digest[:2]}/{digest[2:4]}/'))
+        self.assertEqual(self.refs(first.image.name), 2)
+
+    @mock.patch('posts.media.transaction',
+                mock.Mock(on_commit=lambda func: func()))
+    def test_file_deleted_with_last_reference(self):
+        """Файл удаляется, когда на него не остаётся ссылок."""
+        first = Post.objects.create(
+            author=self.author, text='Пост', image=self.upload('a.gif'))
+        second = Post.objects.create(
+            author=self.author, text='Пост', image=self.upload('b.gif'))
+        name = first.image.name
+        storage = media.storage()
+
+        first.delete()
+        self.assertEqual(self.refs(name), 1)
+        self.assertTrue(storage.exists(name))
+
+        second.image = self.upload('c.gif', color=b'\x00')
+        second.save()
+        self.assertIsNone(self.refs(name))
+        self.assertFalse(storage.exists(name))
+        self.assertEqual(self.refs(second.image.name), 1)
+        self.assertTrue(storage.exists(second.image.name))
+
+    def orphan(self, name, age_hours=48):
+        path = os.path.join(TEMP_MEDIA_ROOT, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(b'orphan')
+        mtime = os.path.getmtime(path) - age_hours * 60 * 60
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_walk_matches_string_order(self):
+        """Обход каталогов отдаёт пути в порядке сортировки строк."""
+        for name in ('posts/a/c', 'posts/a-b', 'posts/a/b', 'posts/b'):
+            self.orphan(name)
+        root = os.path.join(TEMP_MEDIA_ROOT, 'posts')
+        paths = list(media.walk(root, 'posts/'))
+        self.assertEqual(paths, sorted(paths))
+        self.assertEqual(list(media.walk(root, 'posts/', 'posts/a/b')),
+                         [path for path in paths if path > 'posts/a/b'])
+        self.assertEqual(
+            list(media.orphans(['a', 'b', 'c', 'd'], ['b', 'bb', 'd'])),
+            ['a', 'c'],
+        )
+
+    def test_gc_media(self):
+        """gc_media убирает только старые файлы без ссылок
+        и продолжает с контрольной точки.
+        """
+        post = Post.objects.create(
+            author=self.author, text='Пост', image=self.upload('a.gif'))
+        kept = os.path.join(TEMP_MEDIA_ROOT, post.image.name)
+        young = self.orphan('posts/young.gif', age_hours=0)
+        old = [self.orphan(f'posts/0{i}/old.gif') for i in range(3)]
+        checkpoint = os.path.join(TEMP_MEDIA_ROOT, 'gc', 'checkpoint')
+
+        out = StringIO()
+        call_command('gc_media', '--dry-run', stdout=out)
+        self.assertIn('posts/00/old.gif', out.getvalue())
+        self.assertTrue(all(os.path.exists(path) for path in old))
+
+        call_command('gc_media', '--limit', '2', '--checkpoint', checkpoint,
+                     stdout=StringIO())
+        self.assertEqual([os.path.exists(path) for path in old],
+                         [False, False, True])
+        with open(checkpoint) as file:
+            self.assertEqual(file.read(), 'posts/01/old.gif')
+
+        quarantine = os.path.join(TEMP_MEDIA_ROOT, 'quarantine')
+        out = StringIO()
+        call_command('gc_media', '--checkpoint', checkpoint,
+                     '--quarantine', quarantine, stdout=out)
+        self.assertIn('убрано: 1', out.getvalue())
+        self.assertFalse(os.path.exists(old[2]))
+        self.assertTrue(os.path.exists(
+            os.path.join(quarantine, 'posts/02/old.gif')))
+        self.assertTrue(os.path.exists(kept))
+        self.assertTrue(os.path.exists(young))
+        with open(checkpoint) as file:
+            self.assertEqual(file.read(), '')
+
+    def test_gc_media_rechecks_candidates(self):
+        """Файл, на который ссылаются, не удаляется, даже если слияние
+        его пропустило.
+        """
+        post = Post.objects.create(
+            author=self.author, text='Пост', image=self.upload('a.gif'))
+        used = os.path.join(TEMP_MEDIA_ROOT, post.image.name)
+        pending = self.orphan('posts/pending.gif')
+        MediaFile.objects.create(name='posts/pending.gif', refs=1)
+        with mock.patch('posts.media.referenced', return_value=iter(())):
+            call_command('gc_media', '--min-age', '0', '--reset',
+                         stdout=StringIO())
+        self.assertTrue(os.path.exists(used))
+        self.assertTrue(os.path.exists(pending))
+
+    def test_referenced_in_code_point_order(self):
+        """Имена картинок идут в порядке строк Python, как у walk()."""
+        for name in ('posts/b.gif', 'posts/Я.gif', 'posts/B.gif'):
+            Post.objects.create(author=self.author, text='Пост', image=name)
+        names = list(media.referenced(chunk_size=2))
+        self.assertEqual(names, sorted(names))
+        self.assertEqual(len(names), 3)
@@ -0,0 +1,242 @@
+# posts/tests/test_storage.py
+import os
+import shutil
+import tempfile
+
+import requests
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from core.s3 import S3Client, S3Error
+from core.s3_standin import S3StandIn
+from core.storage import (ContentAddressedS3Storage, ContentAddressedStorage,
+                          S3Storage)
+from posts import media
+from posts.models import MediaFile, Post
+
+User = get_user_model()
+
+ACCESS_KEY = 'test-access'
+SECRET_KEY = 'test-secret'
+BUCKET = 'yatube-test'
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+class S3StorageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = S3StandIn(ACCESS_KEY, SECRET_KEY, max_keys=2).start()
+        cls.settings = override_settings(
+            S3_ENDPOINT_URL=cls.server.endpoint_url,
+            S3_BUCKET=BUCKET,
+            S3_ACCESS_KEY=ACCESS_KEY,
+            S3_SECRET_KEY=SECRET_KEY,
+            S3_PUBLIC_URL='',
+            S3_MULTIPART_THRESHOLD=10,
+            S3_MULTIPART_CHUNK_SIZE=4,
+        )
+        cls.settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings.disable()
+        cls.server.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.objects.clear()
+        self.server.connections.clear()
+        self.storage = S3Storage()
+
+    def test_save_open_delete(self):
+        """Файл сохраняется, читается и удаляется через хранилище."""
+        name = self.storage.save('posts/a.txt', ContentFile(b'hello'))
+        self.assertEqual(name, 'posts/a.txt')
+        self.assertTrue(self.storage.exists(name))
+        self.assertEqual(self.storage.size(name), 5)
+        with self.storage.open(name) as file:
+            self.assertEqual(file.read(), b'hello')
+        self.storage.delete(name)
+        self.assertFalse(self.storage.exists(name))
+        with self.assertRaises(FileNotFoundError):
+            self.storage.open(name)
+
+    def test_multipart_upload(self):
+        """Большой файл загружается частями и собирается целиком."""
+        content = b'0123456789abcdefghij'
+        self.storage.save('posts/big.bin', ContentFile(content))
+        self.assertEqual(
+            self.server.objects['posts/big.bin']['body'], content)
+        self.assertEqual(self.server.uploads, {})
+
+    def test_connections_are_reused(self):
+        """Запросы к хранилищу идут через одно соединение из пула."""
+        for number in range(5):
+            self.storage.save(f'posts/{number}.txt', ContentFile(b'x'))
+        self.assertEqual(len(self.server.connections), 1)
+
+    def test_presigned_url(self):
+        """Подписанная ссылка открывается без Django, подделанная - нет."""
+        self.storage.save('posts/a.txt', ContentFile(b'hello'))
+        url = self.storage.url('posts/a.txt')
+        self.assertEqual(url, self.storage.url('posts/a.txt'))
+        response = requests.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'hello')
+        tampered = url.replace('posts/a.txt', 'posts/b.txt')
+        self.assertEqual(requests.get(tampered).status_code, 403)
+
+    def test_public_url(self):
+        with override_settings(S3_PUBLIC_URL='https://cdn.example.com/'):
+            self.assertEqual(self.storage.url('posts/a b.gif'),
+                             'https://cdn.example.com/posts/a%20b.gif')
+
+    def test_bad_credentials(self):
+        client = S3Client(self.server.endpoint_url, BUCKET,
+                          ACCESS_KEY, 'wrong-secret')
+        with self.assertRaises(S3Error) as error:
+            client.put_object('posts/a.txt', b'hello')
+        self.assertEqual(error.exception.code, 'SignatureDoesNotMatch')
+        self.assertNotIn('posts/a.txt', self.server.objects)
+
+    def test_listing(self):
+        """listdir() и iter_keys() обходят все страницы списка."""
+        for name in ('posts/aa/1.gif', 'posts/aa/2.gif', 'posts/bb/3.gif',
+                     'posts/c.gif', 'other.gif'):
+            self.storage.save(name, ContentFile(b'x'))
+        self.assertEqual(self.storage.listdir('posts'),
+                         (['aa', 'bb'], ['c.gif']))
+        self.assertEqual(
+            list(self.storage.iter_keys('posts/')),
+            ['posts/aa/1.gif', 'posts/aa/2.gif', 'posts/bb/3.gif',
+             'posts/c.gif'])
+        self.assertEqual(
+            list(self.storage.iter_keys('posts/', 'posts/aa/2.gif')),
+            ['posts/bb/3.gif', 'posts/c.gif'])
+
+    def test_content_addressed(self):
+        """Одинаковое содержимое загружается в хранилище один раз."""
+        storage = ContentAddressedS3Storage()
+        first = storage.save('posts/a.gif', ContentFile(b'same'))
+        second = storage.save('posts/b.gif', ContentFile(b'same'))
+        self.assertEqual(first, second)
+        self.assertEqual(list(self.server.objects), [first])
+
+    @override_settings(POST_IMAGE_STORAGE='core.storage.'
+                                          'ContentAddressedS3Storage',
+                       THUMBNAIL_WORKERS=0)
+    def test_post_image_in_object_storage(self):
+        """Картинка поста сохраняется в объектное хранилище."""
+        small_gif = (b'\x47\x49\x46\x38\x39\x61\x02\x00'
+                     b'\x01\x00\x80\x00\x00\x00\x00\x00'
+                     b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+                     b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+                     b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+                     b'\x0A\x00\x3B'
+                     )
+        post = Post.objects.create(
+            author=User.objects.create_user(username='author'),
+            text='Пост',
+            image=SimpleUploadedFile('small.gif', small_gif, 'image/gif'),
+        )
+        self.assertIsInstance(media.storage().backend,
+                              ContentAddressedS3Storage)
+        self.assertEqual(self.server.objects[post.image.name]['body'],
+                         small_gif)
+        self.assertEqual(
+            self.server.objects[post.image.name]['content_type'],
+            'image/gif')
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertEqual(MediaFile.objects.get(name=post.image.name).refs, 1)
+        self.assertIn('X-Amz-Signature=', post.image.url)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, MEDIA_SENDFILE='')
+class MediaViewTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.content = bytes(range(100))
+        cls.name = ContentAddressedStorage(
+            location=TEMP_MEDIA_ROOT).save('posts/data.bin',
+                                           ContentFile(cls.content))
+        cls.url = f'/media/{cls.name}'
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_file_response(self):
+        """Без прокси файл отдаёт Django с сильным ETag."""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        digest = self.name.rsplit('/', 1)[1].split('.')[0]
+        self.assertEqual(response['ETag'], f'"{digest}"')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('immutable', response['Cache-Control'])
+        response = self.client.get(self.url,
+                                   HTTP_IF_NONE_MATCH=f'"{digest}"')
+        self.assertEqual(response.status_code, 304)
+
+    def test_range(self):
+        """Range отдаёт часть файла, If-Range с чужим ETag - весь файл."""
+        cases = (
+            ('bytes=10-19', 206, self.content[10:20], 'bytes 10-19/100'),
+            ('bytes=90-', 206, self.content[90:], 'bytes 90-99/100'),
+            ('bytes=-5', 206, self.content[95:], 'bytes 95-99/100'),
+            ('bytes=0-9,20-29', 200, self.content, None),
+        )
+        for header, status, body, content_range in cases:
+            with self.subTest(header=header):
+                response = self.client.get(self.url, HTTP_RANGE=header)
+                self.assertEqual(response.status_code, status)
+                self.assertEqual(b''.join(response.streaming_content), body)
+                self.assertEqual(int(response['Content-Length']), len(body))
+                self.assertEqual(response.get('Content-Range'),
+                                 content_range)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */100')
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19',
+                                   HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_sendfile_backends(self):
+        """С прокси Django отдаёт только заголовок с путём файла."""
+        with override_settings(MEDIA_SENDFILE='x-accel-redirect'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'],
+                         f'/protected-media/{self.name}')
+        self.assertEqual(response.content, b'')
+        with override_settings(MEDIA_SENDFILE='x-sendfile'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Sendfile'],
+                         os.path.join(TEMP_MEDIA_ROOT, self.name))
+
+    def test_access(self):
+        """Скрытые файлы и файлы вне публичных каталогов недоступны."""
+        os.makedirs(os.path.join(TEMP_MEDIA_ROOT, 'private'), exist_ok=True)
+        for name in ('.gc_media', 'private/data.bin'):
+            with open(os.path.join(TEMP_MEDIA_ROOT, name), 'wb') as file:
+                file.write(b'secret')
+        cases = (
+            ('/media/.gc_media', 404),
+            ('/media/private/data.bin', 403),
+            ('/media/posts/missing.gif', 404),
+            ('/media/posts/../private/data.bin', 403),
+        )
+        for url, status in cases:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, status)
+        self.assertEqual(self.client.post(self.url).status_code, 405)
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get('/media/private/data.bin')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'private')
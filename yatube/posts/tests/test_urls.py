@@ -1,5 +1,6 @@
 # posts/tests/test_urls.py
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import Client, TestCase
 from posts.models import Group, Post
 
@@ -68,7 +69,9 @@ class PostsURLTests(TestCase):
                                  addr + 'недоступна неавторизованному'
                                  ' пользователю')
 
-                # доступность страницы авторизованному юзеру
+                # доступность страницы авторизованному юзеру; кеш
+                # страниц общий, шаблоны видны только при рендеринге
+                cache.clear()
                 response = self.authorized_client.get(addr)
                 self.assertEqual(response.status_code, resp_login,
                                  addr + ' недоступна авторизованному'
@@ -87,3 +90,11 @@ class PostsURLTests(TestCase):
         self.authorized_client.force_login(self.user)
         response = self.guest_client.get(f'/posts/{self.post.id}/edit/')
         self.assertEqual(response.status_code, 302)
+
+    def test_csrf_failure_uses_custom_template(self):
+        """POST без CSRF-токена получает свою страницу 403."""
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.auth)
+        response = client.post('/create/', {'text': 'Без токена'})
+        self.assertEqual(response.status_code, 403)
+        self.assertTemplateUsed(response, 'core/403csrf.html')
@@ -1,15 +1,29 @@
 # posts/tests/test_views.py
+import re
 import shutil
 import tempfile
+from io import StringIO
+from unittest import mock, skipUnless
+
 from django import forms
 from django.contrib.auth import get_user_model
 from django.conf import settings
 from django.core.cache import cache
+from django.core.cache.backends.dummy import DummyCache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from posts.models import Follow, Group, Post, Comment
-from posts.views import POST_COUNT
+from django.utils import timezone
+from core.paginator import ELLIPSIS, elided_page_range
+from posts import feeds, stamps, thumbnails
+from posts.models import ChangeStamp, Follow, Group, Post, Comment, Timeline
+from posts.syndication import SYNDICATION_SIZE
+from posts.views import POST_COUNT, QUERY_BUDGET
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore
 
 User = get_user_model()
 
@@ -181,6 +195,8 @@ class PostsPagesTests(TestCase):
             data=comment_data,
             follow=True,
         )
+        # Редирект уже положил страницу в кеш, контекст есть при рендеринге
+        cache.clear()
         response = self.authorized_client.get(
             reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
         )
@@ -210,15 +226,30 @@ class PostsPagesTests(TestCase):
 
     def test_cache_index_page(self):
         """Проверка кеширования на главной странице."""
-        Post.objects.create(
+        post = Post.objects.create(
             author=self.auth,
             text='Проверка кеширования',
         )
         response = self.authorized_client.get(reverse('posts:index'))
-        before_delete_post = response.content
-        Post.objects.filter(text='Проверка кеширования').delete()
+        before_update_post = response.content
+        # update() не шлёт сигналов - фрагмент берётся из кеша
+        Post.objects.filter(pk=post.pk).update(text='Тихая правка')
         response = self.authorized_client.get(reverse('posts:index'))
-        self.assertEqual(before_delete_post, response.content)
+        self.assertEqual(before_update_post, response.content)
+        # Удаление поста сбрасывает кеш сразу
+        post.delete()
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertNotContains(response, 'Проверка кеширования')
+        self.assertNotContains(response, 'Тихая правка')
+
+    def test_cache_varies_on_page(self):
+        """Кеш фрагмента ленты различает страницы."""
+        for i in range(POST_COUNT):
+            Post.objects.create(author=self.auth, text=f'Пост №{i}')
+        first = self.guest_client.get(reverse('posts:index'))
+        second = self.guest_client.get(reverse('posts:index') + '?page=2')
+        self.assertContains(second, self.post.text)
+        self.assertNotContains(first, self.post.text)
 
 
 class TestPaginatorAndFiltration(TestCase):
@@ -264,6 +295,8 @@ class TestPaginatorAndFiltration(TestCase):
     def setUp(self):
         # Создаем клиент
         self.client = Client()
+        # Страницы из кеша для анонимов приходят без контекста
+        cache.clear()
 
     def test_pages_contains_POST_COUNT_records(self):
         '''Проверка ожидаемого количества постов на страницах.'''
@@ -300,6 +333,87 @@ class TestPaginatorAndFiltration(TestCase):
                     f' содержит не {page_2_posts_count} постов'
                 )
 
+    def test_page_window_is_bounded(self):
+        """Навигация показывает края и окно вокруг текущей страницы."""
+        response = self.client.get(reverse('posts:index') + '?page=2')
+        self.assertEqual(response.context['page_obj'].page_window, [1, 2])
+        self.assertEqual(
+            elided_page_range(25000, 50000),
+            [1, ELLIPSIS, 24998, 24999, 25000, 25001, 25002, ELLIPSIS, 50000]
+        )
+        self.assertEqual(
+            elided_page_range(1, 50000), [1, 2, 3, ELLIPSIS, 50000]
+        )
+
+    def test_cursor_pagination_walks_all_posts(self):
+        """Курсорная пагинация отдаёт все посты по порядку без повторов."""
+        pages_posts = {
+            reverse('posts:index'): Post.objects.all(),
+            reverse('posts:group_page', kwargs={'slug': self.group_2.slug}):
+                self.group_2.posts.all(),
+            reverse('posts:profile', kwargs={'username': self.auth.username}):
+                self.auth.posts.all(),
+        }
+        for reverse_name, posts in pages_posts.items():
+            with self.subTest(reverse_name=reverse_name):
+                expected = list(
+                    posts.order_by('-created', '-id').values_list(
+                        'id', flat=True)
+                )
+                seen = []
+                response = self.client.get(reverse_name + '?cursor=')
+                page_obj = response.context['page_obj']
+                self.assertFalse(page_obj.has_previous())
+                first_page = [post.id for post in page_obj]
+                seen.extend(first_page)
+                while page_obj.has_next():
+                    response = self.client.get(
+                        reverse_name + '?cursor=' + page_obj.next_cursor
+                    )
+                    page_obj = response.context['page_obj']
+                    self.assertLessEqual(len(page_obj), POST_COUNT)
+                    seen.extend(post.id for post in page_obj)
+                self.assertEqual(seen, expected)
+                if page_obj.has_previous():
+                    response = self.client.get(
+                        reverse_name + '?cursor=' + page_obj.previous_cursor
+                    )
+                    self.assertEqual(
+                        [post.id for post in response.context['page_obj']],
+                        first_page,
+                    )
+
+    def test_navigation_links_to_cursors(self):
+        """Страницы без параметров - курсорные, и ссылки навигации,
+        даже со старых ?page=N, ведут на курсоры.
+        """
+        url = reverse('posts:index')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertFalse(any('COUNT(' in query['sql']
+                             for query in queries.captured_queries))
+        page_obj = response.context['page_obj']
+        self.assertContains(response, f'?cursor={page_obj.next_cursor}')
+        self.assertNotContains(response, '?page=')
+
+        legacy = self.client.get(url + '?page=1').context['page_obj']
+        self.assertEqual(legacy.next_cursor, page_obj.next_cursor)
+        second = self.client.get(url + '?page=2')
+        self.assertContains(
+            second, f'?cursor={second.context["page_obj"].previous_cursor}')
+        response = self.client.get(url + '?cursor=' + legacy.next_cursor)
+        self.assertEqual(
+            [post.id for post in response.context['page_obj']],
+            [post.id for post in second.context['page_obj']],
+        )
+
+    def test_cursor_pagination_bad_cursor(self):
+        """Испорченный курсор отдаёт первую страницу."""
+        response = self.client.get(reverse('posts:index') + '?cursor=xx!')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['page_obj']), POST_COUNT)
+        self.assertFalse(response.context['page_obj'].has_previous())
+
     def test_post_not_in_wrong_group(self):
         """Проверка отсутсвия поста в группе, к которой он не относится."""
         response = self.client.get(
@@ -379,9 +493,839 @@ class TestFollowing(TestCase):
         self.assertEqual(response.context.get('post').text,
                          'Привет подписчики!')
 
+    def test_timeline_follows_posts_and_subscriptions(self):
+        """Лента заполняется постами и подпиской, чистится отпиской."""
+        self.follower_client.get(
+            reverse('posts:profile_follow',
+                    kwargs={'username': self.author.username})
+        )
+        new_post = Post.objects.create(
+            author=self.author,
+            text='Новый пост для ленты',
+        )
+        self.assertEqual(
+            list(Timeline.objects.filter(user=self.follower).values_list(
+                'post_id', flat=True)),
+            [new_post.id, self.post.id],
+        )
+        self.assertFalse(Timeline.objects.filter(
+            user=self.not_follower).exists())
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            [post.id for post in response.context['page_obj']],
+            [new_post.id, self.post.id],
+        )
+
+        self.follower_client.get(
+            reverse('posts:profile_unfollow',
+                    kwargs={'username': self.author.username})
+        )
+        self.assertFalse(Timeline.objects.filter(
+            user=self.follower).exists())
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+    @override_settings(FEED_PULL_THRESHOLD=2)
+    def test_hybrid_feed_merges_pulled_authors(self):
+        """Посты популярного автора подмешиваются в ленту при чтении."""
+        ordinary = User.objects.create_user(username='ordinary')
+        Follow.objects.create(user=self.follower, author=ordinary)
+        Follow.objects.create(user=self.follower, author=self.author)
+        Follow.objects.create(user=self.not_follower, author=self.author)
+        posts = [
+            Post.objects.create(author=author, text=f'Пост №{i}')
+            for i, author in enumerate([ordinary, self.author] * 6)
+        ]
+        # Посты автора выше порога в ленты не раскладываются
+        self.assertFalse(Timeline.objects.filter(
+            author=self.author, post__in=posts).exists())
+        expected = [
+            post.id for post in sorted(
+                posts + [self.post],
+                key=lambda post: (post.created, post.id),
+                reverse=True,
+            )
+        ]
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        first_page = [post.id for post in response.context['page_obj']]
+        response = self.follower_client.get(
+            reverse('posts:follow_index') + '?page=2')
+        second_page = [post.id for post in response.context['page_obj']]
+        self.assertEqual(first_page + second_page, expected)
+
+        response = self.follower_client.get(
+            reverse('posts:follow_index') + '?cursor=')
+        page_obj = response.context['page_obj']
+        cursor_ids = [post.id for post in page_obj]
+        response = self.follower_client.get(
+            reverse('posts:follow_index') + '?cursor=' + page_obj.next_cursor)
+        cursor_ids.extend(post.id for post in response.context['page_obj'])
+        self.assertEqual(cursor_ids, expected)
+
+        # Автор опустился ниже порога - отписка ленты не трогает,
+        # посты возвращает в ленты push_feeds
+        Follow.objects.filter(user=self.not_follower).delete()
+        self.assertFalse(Timeline.objects.filter(
+            user=self.follower, author=self.author,
+            post__in=posts).exists())
+        call_command('push_feeds', stdout=StringIO())
+        self.assertEqual(
+            Timeline.objects.filter(
+                user=self.follower, author=self.author).count(),
+            7,
+        )
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            [post.id for post in response.context['page_obj']],
+            expected[:len(response.context['page_obj'])],
+        )
+
+    @override_settings(FEED_PULL_THRESHOLD=3, FEED_PUSH_THRESHOLD=2)
+    def test_pull_push_hysteresis(self):
+        """Автор возвращается в ленты, только опустившись ниже порога
+        возврата, а не сразу под порог подмешивания.
+        """
+        reader = User.objects.create_user(username='reader')
+        for user in (self.follower, self.not_follower, reader):
+            Follow.objects.create(user=user, author=self.author)
+        self.assertTrue(feeds.is_pulled(self.author.pk))
+        post = Post.objects.create(author=self.author, text='Популярный')
+        self.assertFalse(Timeline.objects.filter(post=post).exists())
+
+        Follow.objects.filter(user=self.not_follower).delete()
+        self.assertEqual(feeds.repush(), 0)
+        self.assertTrue(feeds.is_pulled(self.author.pk))
+
+        Follow.objects.filter(user=reader).delete()
+        self.assertEqual(feeds.repush(), 1)
+        self.assertFalse(feeds.is_pulled(self.author.pk))
+        self.assertEqual(
+            list(Timeline.objects.filter(author=self.author).values_list(
+                'user_id', flat=True)),
+            [self.follower.pk] * 2,
+        )
+
     def test_not_followers_dont_see_post(self):
         """Проверка, неподписанные пользователи не видят посты авторов"""
         not_follower_client = Client()
         not_follower_client.force_login(self.follower)
         response = not_follower_client.get(reverse('posts:follow_index'))
         self.assertFalse(response.context.get('post'))
+
+
+class TestQueryBudget(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Несколько авторов и групп, чтобы N+1 был заметен
+        cls.reader = User.objects.create_user(username='reader')
+        cls.authors = [
+            User.objects.create_user(username=f'author{i}')
+            for i in range(3)
+        ]
+        cls.groups = [
+            Group.objects.create(
+                title=f'Группа №{i}',
+                slug=f'budget-slug{i}',
+                description='Описание',
+            )
+            for i in range(3)
+        ]
+        for i in range(POST_COUNT + 2):
+            post = Post.objects.create(
+                author=cls.authors[i % 3],
+                text=f'Пост №{i}',
+                group=cls.groups[i % 3],
+            )
+            for author in cls.authors:
+                Comment.objects.create(
+                    post=post, author=author, text='Коммент'
+                )
+        for author in cls.authors:
+            Follow.objects.create(user=cls.reader, author=author)
+        cls.post = post
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+        cache.clear()
+
+    def test_views_fit_query_budget(self):
+        """Страницы лент укладываются в объявленный бюджет запросов."""
+        pages = {
+            'posts:index': {},
+            'posts:group_page': {'slug': self.groups[0].slug},
+            'posts:profile': {'username': self.authors[0].username},
+            'posts:post_detail': {'post_id': self.post.id},
+            'posts:follow_index': {},
+            'posts:search': {},
+        }
+        for name, kwargs in pages.items():
+            url = reverse(name, kwargs=kwargs)
+            for query in ('', '?page=2', '?cursor=', '?q=Пост'):
+                with self.subTest(url=url + query):
+                    # Прогреваем сессию и пользователя
+                    self.client.get(url + query)
+                    cache.clear()
+                    with CaptureQueriesContext(connection) as queries:
+                        response = self.client.get(url + query)
+                    self.assertEqual(response.status_code, 200)
+                    # Сессия и пользователь не входят в бюджет вьюхи
+                    self.assertLessEqual(
+                        len(queries) - 2, QUERY_BUDGET[name],
+                        '\n'.join(q['sql'] for q in queries.captured_queries)
+                    )
+
+
+class TestConditionalGet(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='conditional-slug',
+            description='Описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, text='Пост', group=cls.group)
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+        self.urls = {
+            'index': reverse('posts:index'),
+            'group': reverse('posts:group_page',
+                             kwargs={'slug': self.group.slug}),
+            'profile': reverse('posts:profile',
+                               kwargs={'username': self.author.username}),
+            'detail': reverse('posts:post_detail',
+                              kwargs={'post_id': self.post.id}),
+        }
+
+    def etags(self):
+        return {name: self.client.get(url)['ETag']
+                for name, url in self.urls.items()}
+
+    def changed(self, before):
+        after = self.etags()
+        return {name for name in before if before[name] != after[name]}
+
+    def test_not_modified_without_rendering(self):
+        """Совпавший валидатор - 304 за один запрос к базе."""
+        for name, url in self.urls.items():
+            with self.subTest(page=name):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response['ETag'].startswith('W/"'))
+                # Без кеша страниц для анонимов
+                cache.clear()
+                with self.assertNumQueries(1):
+                    response = self.client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(response.status_code, 304)
+                response = self.client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+                self.assertEqual(response.status_code, 304)
+
+    def test_validators_follow_changes(self):
+        """Изменение меняет валидаторы только зависящих от него страниц."""
+        before = self.etags()
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text='Коммент')
+        self.assertEqual(self.changed(before), {'detail'})
+
+        before = self.etags()
+        Post.objects.create(author=self.author, text='Новый пост')
+        self.assertEqual(self.changed(before),
+                         {'index', 'profile', 'detail'})
+
+        before = self.etags()
+        self.post.group = None
+        self.post.save()
+        self.assertEqual(self.changed(before), set(before))
+
+        before = self.etags()
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.changed(before), {'profile', 'detail'})
+
+        before = self.etags()
+        self.post.delete()
+        self.assertEqual(self.client.get(
+            self.urls['detail'], HTTP_IF_NONE_MATCH=before['detail']
+        ).status_code, 404)
+
+    def test_validator_depends_on_user(self):
+        """Страница пользователя не совпадает с анонимной."""
+        anonymous = self.client.get(self.urls['index'])
+        self.client.force_login(self.reader)
+        response = self.client.get(
+            self.urls['index'], HTTP_IF_NONE_MATCH=anonymous['ETag'],
+            HTTP_IF_MODIFIED_SINCE=anonymous['Last-Modified'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], anonymous['ETag'])
+        self.assertFalse(response.has_header('Last-Modified'))
+
+
+# Попадания без запросов к базе - режим общего кеша
+@override_settings(PAGE_CACHE_VERIFY=False)
+class TestAnonymousPageCache(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='page-cache-slug',
+            description='Описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, text='Пост', group=cls.group)
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+        self.urls = {
+            'index': reverse('posts:index'),
+            'group': reverse('posts:group_page',
+                             kwargs={'slug': self.group.slug}),
+            'profile': reverse('posts:profile',
+                               kwargs={'username': self.author.username}),
+            'detail': reverse('posts:post_detail',
+                              kwargs={'post_id': self.post.id}),
+        }
+
+    def cached(self):
+        """Страницы, которые отдаются из кеша без запросов к базе."""
+        result = set()
+        for name, url in self.urls.items():
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(url)
+            if not queries:
+                result.add(name)
+        return result
+
+    def test_anonymous_pages_are_cached(self):
+        for name, url in self.urls.items():
+            with self.subTest(page=name):
+                first = self.client.get(url)
+                with self.assertNumQueries(0):
+                    second = self.client.get(url)
+                self.assertEqual(second.content, first.content)
+                with self.assertNumQueries(0):
+                    response = self.client.get(
+                        url, HTTP_IF_NONE_MATCH=first['ETag'])
+                self.assertEqual(response.status_code, 304)
+
+    def test_query_string_is_part_of_key(self):
+        url = self.urls['index']
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url + '?page=2')
+        self.assertTrue(queries)
+
+    def test_signals_purge_only_affected_pages(self):
+        """Сигналы сбрасывают только страницы, зависящие от изменения."""
+        self.cached()
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text='Коммент')
+        self.assertEqual(self.cached(), {'index', 'group', 'profile'})
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.cached(), {'index', 'group'})
+        Post.objects.create(author=self.reader, text='Чужой пост')
+        self.assertEqual(self.cached(), {'group', 'profile', 'detail'})
+
+    def test_authenticated_pages_share_cache(self):
+        """Вошедший получает общую страницу со своими фрагментами."""
+        anonymous = self.client.get(self.urls['detail'])
+        self.client.force_login(self.author)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.urls['detail'])
+        # Только сессия и пользователь - страница из кеша
+        self.assertEqual(len(queries), 2)
+        edit_url = reverse('posts:post_edit',
+                           kwargs={'post_id': self.post.id})
+        self.assertNotContains(anonymous, edit_url)
+        self.assertContains(response, edit_url)
+        self.assertContains(response, 'csrfmiddlewaretoken')
+        self.assertNotContains(response, '<!--hole:')
+        self.assertNotContains(anonymous, '<!--hole:')
+        self.assertContains(response, self.author.username)
+
+    def test_follow_button_is_personal(self):
+        """Кнопка подписки в профиле из кеша зависит от посетителя."""
+        url = self.urls['profile']
+        unfollow = reverse('posts:profile_unfollow',
+                           kwargs={'username': self.author.username})
+        follow = reverse('posts:profile_follow',
+                         kwargs={'username': self.author.username})
+        self.client.get(url)
+        self.client.force_login(self.reader)
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.client.get(url)
+        self.assertContains(response, unfollow)
+        self.client.force_login(self.author)
+        response = self.client.get(url)
+        self.assertNotContains(response, unfollow)
+        self.assertNotContains(response, follow)
+
+    @override_settings(PAGE_CACHE_VERIFY=True)
+    def test_hit_checks_stamps_in_database(self):
+        """Без общего кеша изменение из другого процесса видно сразу:
+        попадание сверяется с отметкой в базе.
+        """
+        url = self.urls['detail']
+        first = self.client.get(url)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url).content, first.content)
+        # Другой процесс изменил данные: его сброс тегов сюда не дошёл
+        ChangeStamp.objects.filter(
+            scope=stamps.post_scope(self.post.pk)).update(
+            changed=timezone.now())
+        Post.objects.filter(pk=self.post.pk).update(text='Правка')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+        self.assertContains(response, 'Правка')
+
+
+class TestSyndication(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='feed-slug',
+            description='Описание',
+        )
+        cls.other = Group.objects.create(
+            title='Другая группа',
+            slug='other-slug',
+            description='Описание',
+        )
+        # Одно время у всех постов - порядок решает id
+        created = timezone.now()
+        cls.posts = [
+            Post.objects.create(author=cls.author, text=f'Пост <№{i}>',
+                                group=cls.group if i % 2 else cls.other)
+            for i in range(SYNDICATION_SIZE + 3)
+        ]
+        Post.objects.update(created=created)
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+
+    def test_feeds(self):
+        """Ленты содержат последние посты своей области по (created, id)."""
+        cases = {
+            reverse('posts:index_rss'): self.posts,
+            reverse('posts:index_atom'): self.posts,
+            reverse('posts:group_rss', kwargs={'slug': self.group.slug}):
+                self.posts[1::2],
+            reverse('posts:profile_atom',
+                    kwargs={'username': self.author.username}): self.posts,
+        }
+        for url, posts in cases.items():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                content = response.content.decode()
+                # Ссылка на пост есть в link и guid - берём без повторов
+                found = list(dict.fromkeys(
+                    int(pk) for pk in re.findall(r'/posts/(\d+)/', content)))
+                self.assertEqual(
+                    found,
+                    [post.pk for post in posts[::-1][:SYNDICATION_SIZE]])
+                self.assertIn('&lt;№', content)
+        response = self.client.get(reverse('posts:index_atom'))
+        self.assertTrue(response['Content-Type'].startswith(
+            'application/atom+xml'))
+        response = self.client.get(
+            reverse('posts:group_rss', kwargs={'slug': 'missing'}))
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(PAGE_CACHE_VERIFY=False)
+    def test_conditional_and_cached(self):
+        """Читатель с валидатором платит один запрос, повтор - ни одного."""
+        url = reverse('posts:group_atom', kwargs={'slug': self.group.slug})
+        first = self.client.get(url)
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertEqual(second.content, first.content)
+        cache.clear()
+        for header, value in (('HTTP_IF_NONE_MATCH', first['ETag']),
+                              ('HTTP_IF_MODIFIED_SINCE',
+                               first['Last-Modified'])):
+            with self.subTest(header=header):
+                with self.assertNumQueries(1):
+                    response = self.client.get(url, **{header: value})
+                self.assertEqual(response.status_code, 304)
+        Post.objects.create(author=self.author, text='Новый',
+                            group=self.group)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Новый', response.content.decode())
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN из SQLite')
+class TestQueryPlans(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='plan-slug',
+            description='Описание',
+        )
+        for i in range(POST_COUNT * 2):
+            cls.post = Post.objects.create(
+                author=cls.author, text=f'Пост №{i}', group=cls.group)
+            Comment.objects.create(
+                post=cls.post, author=cls.reader, text='Коммент')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+        cache.clear()
+
+    def query_plan(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def test_feeds_use_indexes(self):
+        """Запросы лент не сканируют таблицы и не сортируют во временных
+        B-деревьях.
+        """
+        pages = [
+            reverse('posts:index'),
+            reverse('posts:group_page', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile',
+                    kwargs={'username': self.author.username}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+            reverse('posts:follow_index'),
+        ]
+        for url in pages:
+            response = self.client.get(url + '?cursor=')
+            next_cursor = getattr(
+                response.context.get('page_obj'), 'next_cursor', '') or ''
+            for query in ('', '?page=2', '?cursor=',
+                          '?cursor=' + next_cursor):
+                cache.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.get(url + query)
+                for captured in queries.captured_queries:
+                    sql = captured['sql']
+                    if not sql.startswith('SELECT'):
+                        continue
+                    for detail in self.query_plan(sql):
+                        with self.subTest(url=url + query, sql=sql):
+                            self.assertNotIn('TEMP B-TREE', detail)
+                            if detail.startswith('SCAN'):
+                                self.assertIn('INDEX', detail)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Индекс FTS5 есть только в SQLite')
+class TestSearch(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.auth = User.objects.create_user(username='auth')
+        cls.cat_post = Post.objects.create(
+            author=cls.auth,
+            text='Кот и ещё раз кот: <b>кот</b> спит',
+        )
+        cls.dog_post = Post.objects.create(
+            author=cls.auth,
+            text='Собака и кот дружат',
+        )
+        for i in range(POST_COUNT + 2):
+            Post.objects.create(author=cls.auth, text=f'Котлета №{i}')
+
+    def setUp(self):
+        self.client = Client()
+
+    def search(self, query, cursor=None):
+        params = {'q': query}
+        if cursor is not None:
+            params['cursor'] = cursor
+        return self.client.get(reverse('posts:search'), params)
+
+    def test_search_ranks_and_highlights(self):
+        """Поиск ранжирует посты и подсвечивает совпадения."""
+        response = self.search('собака')
+        page_obj = response.context['page_obj']
+        self.assertEqual([post.id for post in page_obj], [self.dog_post.id])
+        self.assertIn('<mark>Собака</mark>', page_obj[0].snippet)
+
+        response = self.search('кот спит')
+        self.assertEqual(response.context['page_obj'][0], self.cat_post)
+        # Текст поста экранирован, подсвечено только совпадение
+        self.assertContains(response, '&lt;b&gt;<mark>кот</mark>')
+
+    def test_search_cursor_pagination(self):
+        """Результаты поиска листаются курсором без потерь."""
+        expected = set(Post.objects.values_list('id', flat=True))
+        response = self.search('кот')
+        page_obj = response.context['page_obj']
+        self.assertContains(response, 'q=%D0%BA%D0%BE%D1%82&amp;cursor=')
+        seen = [post.id for post in page_obj]
+        while page_obj.has_next():
+            response = self.search('кот', page_obj.next_cursor)
+            page_obj = response.context['page_obj']
+            seen.extend(post.id for post in page_obj)
+        self.assertEqual(len(seen), len(expected))
+        self.assertEqual(set(seen), expected)
+
+    def test_search_index_follows_edits(self):
+        """Правка и удаление поста сразу видны в поиске."""
+        post = Post.objects.get(pk=self.dog_post.pk)
+        post.text = 'Попугай'
+        post.save()
+        self.assertEqual(len(self.search('собака').context['page_obj']), 0)
+        self.assertEqual(len(self.search('попугай').context['page_obj']), 1)
+        post.delete()
+        self.assertEqual(len(self.search('попугай').context['page_obj']), 0)
+
+    def test_rebuild_search_index(self):
+        """Команда rebuild_search_index восстанавливает индекс."""
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM posts_post_fts')
+        self.assertEqual(len(self.search('собака').context['page_obj']), 0)
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn(str(Post.objects.count()), out.getvalue())
+        self.assertEqual(len(self.search('собака').context['page_obj']), 1)
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке ищет по индексу."""
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'собака'})
+        self.assertEqual(
+            [post.id for post in response.context['cl'].result_list],
+            [self.dog_post.id],
+        )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class TestThumbnails(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.auth = User.objects.create_user(username='auth')
+        small_gif = (b'\x47\x49\x46\x38\x39\x61\x02\x00'
+                     b'\x01\x00\x80\x00\x00\x00\x00\x00'
+                     b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+                     b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+                     b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+                     b'\x0A\x00\x3B'
+                     )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.auth,
+                text=f'Пост с картинкой №{i}',
+                image=SimpleUploadedFile(
+                    name=f'thumb{i}.gif',
+                    # Разные картинки, иначе хранилище их объединит
+                    content=small_gif.replace(b'\xFF' * 3, bytes([i]) * 3),
+                    content_type='image/gif'),
+            )
+            for i in range(3)
+        ]
+        cls.post = cls.posts[0]
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_placeholder_until_thumbnail_ready(self):
+        """Пока миниатюры нет, вместо неё выводится заглушка."""
+        url = reverse('posts:post_detail', args=[self.post.id])
+        response = self.client.get(url)
+        self.assertContains(response, self.post.image_placeholder)
+        self.assertNotContains(response, '<picture>')
+        self.assertIsNone(thumbnails.get_cached(self.post.image, 'card'))
+
+        thumbnails.generate(self.post.image.name)
+        thumbnail = thumbnails.get_cached(self.post.image, 'card')
+        self.assertIsNotNone(thumbnail)
+        self.assertEqual((thumbnail.width, thumbnail.height), (960, 339))
+        response = self.client.get(url)
+        self.assertContains(response, '<picture>')
+        self.assertContains(response, thumbnail.url)
+        self.assertContains(response, 'loading="lazy"')
+
+    def test_image_meta_stored_on_upload(self):
+        """Размеры и заглушка картинки сохраняются при загрузке,
+        а лента не открывает оригиналы.
+        """
+        self.assertEqual((self.post.image_width, self.post.image_height),
+                         (2, 1))
+        self.assertTrue(
+            self.post.image_placeholder.startswith('data:image/jpeg;base64,'))
+        for post in self.posts:
+            thumbnails.generate(post.image.name)
+        cache.clear()
+        with mock.patch('django.core.files.storage.'
+                        'FileSystemStorage.open') as storage_open:
+            response = self.client.get(reverse('posts:index'))
+        storage_open.assert_not_called()
+        self.assertContains(response, self.post.image_placeholder)
+
+    def test_responsive_variants(self):
+        """Картинка выводится с srcset всех ширин и форматов."""
+        thumbnails.generate(self.post.image.name)
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.id]))
+        for width in settings.POST_IMAGE_WIDTHS:
+            variant = thumbnails.get_cached(
+                self.post.image, thumbnails.variant_alias('JPEG', width))
+            self.assertEqual(variant.width, width)
+            self.assertContains(response, f'{variant.url} {width}w')
+
+        post = Post.objects.get(pk=self.post.pk)
+        post.thumbnails = {
+            alias: mock.Mock(url=f'/{alias}')
+            for alias in ('card', 'card-webp-480', 'card-jpeg-480')
+        }
+        with mock.patch('posts.thumbnails.supported_formats',
+                        return_value=['WEBP', 'JPEG']):
+            picture = thumbnails.picture(post)
+        self.assertEqual(picture['sources'], [
+            {'type': 'image/webp', 'srcset': '/card-webp-480 480w'},
+        ])
+        self.assertEqual(picture['srcset'], '/card-jpeg-480 480w')
+
+    def test_schedule_once(self):
+        """Картинка ставится в очередь один раз."""
+        with mock.patch('posts.thumbnails.transaction.on_commit') as commit:
+            thumbnails.schedule(self.post.image.name)
+            thumbnails.schedule(self.post.image.name)
+        commit.assert_called_once()
+
+    def test_text_edit_does_not_schedule(self):
+        """Правка текста поста не нарезает миниатюры заново."""
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Только текст'
+        with mock.patch('posts.thumbnails.schedule') as schedule:
+            post.save()
+        schedule.assert_not_called()
+
+    def test_generate_thumbnails_command(self):
+        """Команда generate_thumbnails нарезает миниатюры."""
+        out = StringIO()
+        call_command('generate_thumbnails', '--workers', '0', '--missing',
+                     stdout=out)
+        self.assertIn(str(len(self.posts)), out.getvalue())
+        self.assertIsNotNone(thumbnails.get_cached(self.post.image, 'card'))
+
+    def test_missing_thumbnails_are_not_cached(self):
+        """Промах не запоминается: миниатюру, которую записал в kvstore
+        другой процесс, страница видит со следующего запроса.
+        """
+        post = Post.objects.get(pk=self.post.pk)
+        thumbnails.prefetch([post], ['card'])
+        self.assertIsNone(post.thumbnails['card'])
+        # Другой процесс пишет в базу, но не в кеш этого процесса
+        with mock.patch.object(KVStore, 'cache',
+                               new_callable=mock.PropertyMock,
+                               return_value=DummyCache('dummy', {})):
+            thumbnails.generate(post.image.name)
+        post = Post.objects.get(pk=self.post.pk)
+        thumbnails.prefetch([post], ['card'])
+        self.assertIsNotNone(post.thumbnails['card'])
+
+    def test_thumbnails_batched_per_page(self):
+        """Миниатюры страницы загружаются одним запросом к kvstore."""
+        for post in self.posts:
+            thumbnails.generate(post.image.name)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts:index'))
+        kvstore_queries = [
+            query['sql'] for query in queries.captured_queries
+            if 'thumbnail_kvstore' in query['sql']
+        ]
+        self.assertEqual(len(kvstore_queries), 1)
+        for post in response.context['page_obj']:
+            self.assertContains(response, post.thumbnails['card'].url)
+
+        # Второй раз всё находится в кеше одним get_many
+        posts = list(Post.objects.all())
+        with CaptureQueriesContext(connection) as queries:
+            thumbnails.prefetch(posts)
+        self.assertEqual(len(queries), 0)
+        self.assertTrue(all(post.thumbnails['card'] for post in posts))
+
+
+class TestThumbnailPool(TransactionTestCase):
+    """Нарезка в настоящем пуле процессов, как с настройками
+    по умолчанию.
+    """
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        overrides = self.settings(MEDIA_ROOT=media_root, THUMBNAIL_WORKERS=2)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.addCleanup(self.stop_pool)
+        cache.clear()
+
+    def stop_pool(self):
+        if thumbnails._executor is not None:
+            thumbnails._executor.shutdown()
+            thumbnails._executor = None
+
+    def create_post(self):
+        author = User.objects.create_user(username='auth')
+        small_gif = (b'\x47\x49\x46\x38\x39\x61\x02\x00'
+                     b'\x01\x00\x80\x00\x00\x00\x00\x00'
+                     b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+                     b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+                     b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+                     b'\x0A\x00\x3B'
+                     )
+        return Post.objects.create(
+            author=author, text='Пост с картинкой',
+            image=SimpleUploadedFile(name='pool.gif', content=small_gif,
+                                     content_type='image/gif'))
+
+    def test_pool_thumbnails_reach_pages(self):
+        """Страница, показанная до конца нарезки, после неё получает
+        миниатюры: store() выполняется в процессе сайта.
+        """
+        # Очередь из сигнала и шаблона отключена: пулу картинку
+        # отдаёт сам тест, когда страница уже закеширована
+        with mock.patch('posts.thumbnails.schedule'):
+            post = self.create_post()
+            url = reverse('posts:post_detail', args=[post.id])
+            self.assertNotContains(self.client.get(url), '<picture>')
+            self.assertEqual(thumbnails.submit(post.image.name).result(
+                timeout=120), post.image.name)
+            response = self.client.get(url)
+        self.assertContains(response, '<picture>')
+        card = thumbnails.get_cached(post.image, 'card')
+        self.assertContains(response, card.url)
+
+    def test_generate_thumbnails_command_with_pool(self):
+        """Команда с пулом пишет kvstore сама."""
+        with mock.patch('posts.thumbnails.schedule'):
+            post = self.create_post()
+        call_command('generate_thumbnails', '--workers', '1',
+                     stdout=StringIO())
+        self.assertIsNotNone(thumbnails.get_cached(post.image, 'card'))
@@ -0,0 +1,321 @@
+import logging
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from core.workers import setup as setup_worker
+from PIL import Image
+from posts import media, stamps
+from posts.cache import bump_feed_version
+from sorl.thumbnail import default
+from sorl.thumbnail.base import EXTENSIONS as SORL_EXTENSIONS
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.helpers import serialize, tokey
+from sorl.thumbnail.images import (ImageFile, deserialize_image_file,
+                                   serialize_image_file)
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+try:
+    # До Pillow 11.3 AVIF сохраняется только с этим плагином
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+logger = logging.getLogger(__name__)
+
+"""Сколько секунд не ставить повторно в очередь одну и ту же картинку."""
+QUEUED_TIMEOUT: int = 5 * 60
+
+"""Настройки, которые процесс пула берёт у родителя, чтобы читать
+и писать те же файлы, даже если родитель их переопределил.
+"""
+WORKER_SETTINGS = ('MEDIA_ROOT',)
+
+"""Размер, от которого считаются адаптивные варианты картинки поста."""
+CARD_ALIAS = 'card'
+
+"""MIME-типы форматов для <source type>."""
+MIME_TYPES = {
+    'AVIF': 'image/avif',
+    'WEBP': 'image/webp',
+    'JPEG': 'image/jpeg',
+}
+
+# sorl-thumbnail не знает расширения AVIF
+EXTENSIONS = {**SORL_EXTENSIONS, 'AVIF': 'avif'}
+
+_executor = None
+
+
+class PostThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl-thumbnail: поиск готовых миниатюр без нарезки
+    и имена файлов для форматов, которых нет в самом sorl.
+    """
+
+    def _get_thumbnail_filename(self, source, geometry_string, options):
+        key = tokey(source.key, geometry_string, serialize(options))
+        path = f'{key[:2]}/{key[2:4]}/{key}'
+        extension = EXTENSIONS[options['format']]
+        return f'{sorl_settings.THUMBNAIL_PREFIX}{path}.{extension}'
+
+    def full_options(self, source, options):
+        """Опции с умолчаниями sorl, как в get_thumbnail()."""
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        return options
+
+    def thumbnail_file(self, file_, geometry_string, **options):
+        """ImageFile миниатюры с теми же опциями, что в get_thumbnail()."""
+        source = ImageFile(file_)
+        options = self.full_options(source, options)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def render(self, file_, geometry_string, **options):
+        """Нарезает миниатюру, не трогая key-value store."""
+        source = ImageFile(file_)
+        options = self.full_options(source, options)
+        thumbnail = ImageFile(
+            self._get_thumbnail_filename(source, geometry_string, options),
+            default.storage)
+        if sorl_settings.THUMBNAIL_FORCE_OVERWRITE or not thumbnail.exists():
+            source_image = default.engine.get_image(source)
+            options['image_info'] = default.engine.get_image_info(
+                source_image)
+            try:
+                self._create_thumbnail(source_image, geometry_string,
+                                       options, thumbnail)
+                self._create_alternative_resolutions(
+                    source_image, geometry_string, options, thumbnail.name)
+            finally:
+                default.engine.cleanup(source_image)
+        thumbnail.set_size()
+        return thumbnail
+
+    def get_cached(self, file_, geometry_string, **options):
+        """Готовая миниатюра из key-value store или None."""
+        if not file_:
+            return None
+        return self.get_cached_many([(file_, geometry_string, options)])[0]
+
+    def get_cached_many(self, requests):
+        """Как get_cached() для списка запросов, за один multi-get."""
+        thumbnails = [
+            self.thumbnail_file(file_, geometry_string, **options)
+            for file_, geometry_string, options in requests
+        ]
+        kvstore = default.kvstore
+        if not isinstance(kvstore, KVStore):
+            return [kvstore.get(thumbnail) for thumbnail in thumbnails]
+        keys = [add_prefix(thumbnail.key) for thumbnail in thumbnails]
+        values = kvstore.cache.get_many(keys)
+        missing = [key for key in keys if key not in values]
+        if missing:
+            found = dict(KVStoreModel.objects.filter(
+                key__in=missing).values_list('key', 'value'))
+            if found:
+                kvstore.cache.set_many(
+                    found, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+            values.update(found)
+        return [
+            None if values.get(key, EMPTY_VALUE) == EMPTY_VALUE
+            else deserialize_image_file(values[key])
+            for key in keys
+        ]
+
+
+def supported_formats():
+    """Форматы из POST_IMAGE_FORMATS, которые умеет сохранять Pillow."""
+    Image.init()
+    return [fmt for fmt in settings.POST_IMAGE_FORMATS if fmt in Image.SAVE]
+
+
+def variant_alias(fmt, width):
+    return f'{CARD_ALIAS}-{fmt.lower()}-{width}'
+
+
+def variants():
+    """Адаптивные варианты card: (формат, ширина, alias, геометрия,
+    опции) для всех поддерживаемых форматов и ширин.
+    """
+    geometry, options = settings.POST_THUMBNAILS[CARD_ALIAS]
+    card_width, card_height = map(int, geometry.split('x'))
+    for fmt in supported_formats():
+        for width in settings.POST_IMAGE_WIDTHS:
+            height = round(width * card_height / card_width)
+            alias = variant_alias(fmt, width)
+            yield fmt, width, alias, f'{width}x{height}', {
+                **options,
+                'format': fmt,
+                'quality': settings.POST_IMAGE_FORMATS[fmt],
+            }
+
+
+def aliases():
+    """Все размеры миниатюр: POST_THUMBNAILS и адаптивные варианты."""
+    result = dict(settings.POST_THUMBNAILS)
+    for fmt, width, alias, geometry, options in variants():
+        result[alias] = (geometry, options)
+    return result
+
+
+def render(name):
+    """Нарезает миниатюры картинки во всех размерах aliases()."""
+    # Ключи kvstore зависят от хранилища, поэтому оригинал открывается
+    # через хранилище поля Post.image, как в шаблонах
+    source = ImageFile(name, media.storage())
+    rendered = []
+    for geometry, options in aliases().values():
+        try:
+            thumbnail = default.backend.render(source, geometry, **options)
+        except Exception:
+            logger.exception('Не удалось создать миниатюру %s', name)
+        else:
+            rendered.append(serialize_image_file(thumbnail))
+    return name, rendered
+
+
+def store(name, rendered):
+    """Записывает нарезанное render() и сбрасывает кеши."""
+    source = ImageFile(name, media.storage())
+    default.kvstore.get_or_set(source)
+    for value in rendered:
+        default.kvstore.set(deserialize_image_file(value), source)
+    bump_feed_version()
+    stamps.touch_image(name)
+    return name
+
+
+def generate(name):
+    """Нарезает и сохраняет миниатюры в текущем процессе."""
+    return store(*render(name))
+
+
+def get_cached(image, alias):
+    """Готовая миниатюра картинки в размере alias или None."""
+    geometry, options = aliases()[alias]
+    return default.backend.get_cached(image, geometry, **options)
+
+
+def prefetch(posts, names=None):
+    """Загружает миниатюры всех постов страницы в post.thumbnails."""
+    posts = list({id(post): post for post in posts}.values())
+    known = aliases()
+    requests, targets = [], []
+    for post in posts:
+        if not hasattr(post, 'thumbnails'):
+            post.thumbnails = {}
+        if not post.image:
+            continue
+        for alias in names or known:
+            if alias not in post.thumbnails:
+                geometry, options = known[alias]
+                requests.append((post.image, geometry, options))
+                targets.append((post, alias))
+    if not requests:
+        return
+    found = default.backend.get_cached_many(requests)
+    for (post, alias), thumbnail in zip(targets, found):
+        post.thumbnails[alias] = thumbnail
+
+
+def picture(post):
+    """Данные для <picture>: запасная картинка card и srcset."""
+    fallback = post.thumbnails.get(CARD_ALIAS)
+    if fallback is None:
+        return None
+    srcsets = {}
+    for fmt, width, alias, geometry, options in variants():
+        thumbnail = post.thumbnails.get(alias)
+        if thumbnail is not None:
+            srcsets.setdefault(fmt, []).append(f'{thumbnail.url} {width}w')
+    return {
+        'fallback': fallback,
+        'sources': [
+            {'type': MIME_TYPES[fmt], 'srcset': ', '.join(srcset)}
+            for fmt, srcset in srcsets.items() if fmt != 'JPEG'
+        ],
+        'srcset': ', '.join(srcsets.get('JPEG', [])),
+    }
+
+
+def complete(post):
+    """Готовы ли все размеры картинки поста."""
+    return all(thumbnail is not None
+               for thumbnail in post.thumbnails.values())
+
+
+def process_pool(workers):
+    """Пул процессов для нарезки миниатюр."""
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=setup_worker,
+        initargs=({name: getattr(settings, name)
+                   for name in WORKER_SETTINGS},),
+    )
+
+
+def executor():
+    """Общий пул процесса, создаётся при первом обращении."""
+    global _executor
+    if _executor is None:
+        _executor = process_pool(settings.THUMBNAIL_WORKERS)
+    return _executor
+
+
+def submit(name):
+    """Отдаёт картинку пулу; Future завершается после store()."""
+    global _executor
+    done = Future()
+    try:
+        future = executor().submit(render, name)
+    except BrokenProcessPool:
+        logger.exception('Пул миниатюр сломан, %s пропущена', name)
+        _executor = None
+        cache.delete(f'thumbnails:queued:{name}')
+        done.set_result(None)
+        return done
+    future.add_done_callback(lambda future: finish(future, name, done))
+    return done
+
+
+def finish(future, name, done):
+    """Сохраняет нарезанное пулом; вызывается в потоке пула
+    в этом процессе.
+    """
+    try:
+        store(*future.result())
+    except Exception:
+        logger.exception('Не удалось сохранить миниатюры %s', name)
+        cache.delete(f'thumbnails:queued:{name}')
+    finally:
+        # Соединение этого потока никто, кроме нас, не закроет
+        connections.close_all()
+        done.set_result(name)
+
+
+def schedule(name):
+    """Ставит картинку в очередь на нарезку после коммита."""
+    if not name:
+        return
+    if not cache.add(f'thumbnails:queued:{name}', True, QUEUED_TIMEOUT):
+        return
+    if settings.THUMBNAIL_WORKERS:
+        transaction.on_commit(lambda: submit(name))
+    else:
+        transaction.on_commit(lambda: generate(name))
@@ -1,7 +1,7 @@
 # posts/urls.py
 from django.urls import path
 
-from . import views
+from . import syndication, views
 
 app_name = 'posts'
 
@@ -24,6 +24,12 @@ urlpatterns = [
         views.profile,
         name='profile'
     ),
+    # Поиск по записям
+    path(
+        'search/',
+        views.search,
+        name='search'
+    ),
     # Просмотр записи
     path(
         'posts/<int:post_id>/',
@@ -48,6 +54,37 @@ urlpatterns = [
         views.add_comment,
         name='add_comment'
     ),
+    # Ленты RSS и Atom
+    path(
+        'rss/',
+        syndication.index_rss,
+        name='index_rss'
+    ),
+    path(
+        'atom/',
+        syndication.index_atom,
+        name='index_atom'
+    ),
+    path(
+        'group/<slug:slug>/rss/',
+        syndication.group_rss,
+        name='group_rss'
+    ),
+    path(
+        'group/<slug:slug>/atom/',
+        syndication.group_atom,
+        name='group_atom'
+    ),
+    path(
+        'profile/<str:username>/rss/',
+        syndication.profile_rss,
+        name='profile_rss'
+    ),
+    path(
+        'profile/<str:username>/atom/',
+        syndication.profile_atom,
+        name='profile_atom'
+    ),
     # Подписка на авторов
     path(
         'follow/',
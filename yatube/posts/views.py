@@ -2,9 +2,19 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import CharField, Value
+from django.db.models.functions import Concat
 from django.shortcuts import get_object_or_404, redirect, render
+from django.utils.http import urlencode
+from core.paginator import CursorPaginator, elided_page_range
+from posts.counters import get_counter
+from posts.feeds import follow_feed
 from posts.forms import PostForm, CommentForm
 from posts.models import Group, Post, Comment, Follow
+from posts.pagecache import shared_cache
+from posts.search import SearchResults
+from posts.stamps import INDEX_SCOPE, group_scope, post_scope, profile_scope
 
 User = get_user_model()
 
@@ -13,31 +23,71 @@ User = get_user_model()
 """
 POST_COUNT: int = 10
 
+"""Предельное число SQL-запросов страницы, без запросов сессии и
+пользователя. Проверяется тестами, чтобы изменение шаблона не вернуло N+1.
+Промах кеша страницы поста тратит ещё запрос на теги - автора поста.
+"""
+QUERY_BUDGET: dict = {
+    'posts:index': 3,
+    'posts:group_page': 4,
+    'posts:profile': 5,
+    'posts:post_detail': 4,
+    'posts:follow_index': 3,
+    'posts:search': 2,
+}
+
+
+def feed(post_list):
+    """Подгружает авторов и группы постов одним запросом с лентой."""
+    return post_list.select_related('author', 'group')
+
 
 def pagination(request, post_list):
-    """Пагинатор."""
+    """Пагинатор: по ключу (created, id), ?page=N - для старых ссылок."""
+    cursors = CursorPaginator(post_list, POST_COUNT)
+    if 'page' not in request.GET:
+        return cursors.get_page(request.GET.get('cursor'))
+
     paginator = Paginator(post_list, POST_COUNT)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
+    page_obj.page_window = elided_page_range(
+        page_obj.number, paginator.num_pages)
+    page_obj.next_cursor = page_obj.previous_cursor = None
+    if page_obj.has_next():
+        page_obj.next_cursor = cursors.encode_cursor(page_obj[-1], 'n')
+    if page_obj.has_previous():
+        page_obj.previous_cursor = cursors.encode_cursor(page_obj[0], 'p')
 
     return page_obj
 
 
+def post_scopes(request, post_id):
+    """Страница поста показывает и число постов автора."""
+    author_scope = Post.objects.filter(pk=post_id).annotate(
+        scope=Concat(Value(profile_scope('')), 'author__username',
+                     output_field=CharField()),
+    ).values('scope')
+    return [post_scope(post_id), author_scope]
+
+
+@shared_cache(lambda request: [INDEX_SCOPE])
 def index(request):
     """Wiew функция главной страницы."""
 
-    page_obj = pagination(request, Post.objects.all())
+    page_obj = pagination(request, feed(Post.objects.all()))
     context = {
         'page_obj': page_obj,
     }
     return render(request, 'posts/index.html', context)
 
 
+@shared_cache(lambda request, slug: [group_scope(slug)])
 def group_posts(request, slug):
     """View функция постов выбранной группы."""
 
     group = get_object_or_404(Group, slug=slug)
-    page_obj = pagination(request, group.posts.all())
+    page_obj = pagination(request, feed(group.posts.all()))
     context = {
         'group': group,
         'page_obj': page_obj,
@@ -45,42 +95,57 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@shared_cache(lambda request, username: [profile_scope(username)])
 def profile(request, username):
     """Профиль пользователя, со всеми его постами."""
 
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
-    count = posts.count()
-    page_obj = pagination(request, posts)
-    following = Follow.objects.filter(
-        user=request.user.id, author=author.id).exists()
-    its_not_me = request.user.id != author.id
+    author = get_object_or_404(
+        User.objects.select_related('counter'), username=username)
+    counter = get_counter(author)
+    page_obj = pagination(request, feed(author.posts.all()))
     context = {
         'author': author,
         'page_obj': page_obj,
-        'count': count,
-        'following': following,
-        'its_not_me': its_not_me,
+        'count': counter.posts,
+        'counter': counter,
     }
     return render(request, 'posts/profile.html', context)
 
 
+def search(request):
+    """Поиск по текстам постов, самые релевантные сверху."""
+    query = request.GET.get('q', '').strip()
+    paginator = CursorPaginator(
+        SearchResults(query), POST_COUNT,
+        keys=SearchResults.keys, parse_key=float,
+    )
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'page_params': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@shared_cache(post_scopes)
 def post_detail(request, post_id):
     """Подробности поста, с комментариями."""
-    post = get_object_or_404(Post, id=post_id)
-    count_post = Post.objects.filter(author_id=post.author_id).count()
-    comments = Comment.objects.filter(post=post_id)
-    form = CommentForm(request.POST or None)
+    post = get_object_or_404(
+        feed(Post.objects.select_related('author__counter')), id=post_id)
+    count_post = get_counter(post.author).posts
+    comments = Comment.objects.filter(
+        post=post_id).select_related('author')
     context = {
         'post': post,
         'count': count_post,
         'comments': comments,
-        'form': form,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
 @login_required
+@transaction.atomic
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
     if request.method == 'POST':
@@ -124,6 +189,7 @@ def post_edit(request, post_id):
 
 
 @login_required
+@transaction.atomic
 def add_comment(request, post_id):
     """Добавление комментария к посту."""
     post = get_object_or_404(Post, id=post_id)
@@ -139,8 +205,7 @@ def add_comment(request, post_id):
 @login_required
 def follow_index(request):
     """Все посты авторов, на которых подписан пользователь."""
-    post_list = Post.objects.filter(author__following__user=request.user)
-    page_obj = pagination(request, post_list)
+    page_obj = pagination(request, follow_feed(request.user))
     context = {
         'page_obj': page_obj,
     }
@@ -148,6 +213,7 @@ def follow_index(request):
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     """Подписка на автора."""
     author = get_object_or_404(User, username=username)
@@ -161,6 +227,7 @@ def profile_follow(request, username):
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     """Отписка от автора."""
     Follow.objects.filter(
@@ -46,6 +46,7 @@ INSTALLED_APPS = [
     'core.apps.CoreConfig',
     'users.apps.UsersConfig',
     'posts.apps.PostsConfig',
+    'api.apps.ApiConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -142,6 +143,15 @@ STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Кто передаёт файлы медиа: '' - сам Django (FileResponse),
+# 'x-accel-redirect' - nginx, 'x-sendfile' - Apache или lighttpd.
+MEDIA_SENDFILE = env('MEDIA_SENDFILE', default='')
+# Внутренний location nginx с alias на MEDIA_ROOT.
+MEDIA_ACCEL_PREFIX = env('MEDIA_ACCEL_PREFIX', default='/protected-media/')
+# Файлы, доступные всем: картинки постов и миниатюры sorl-thumbnail.
+MEDIA_PUBLIC_PREFIXES = ('posts/', 'cache/')
+MEDIA_MAX_AGE = 60 * 60 * 24 * 365
+
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 # LOGOUT_REDIRECT_URL = 'posts:index'
@@ -153,8 +163,70 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
+# Посты авторов, у которых подписчиков не меньше порога, не раскладываются
+# по лентам подписчиков, а подмешиваются в ленту при чтении.
+FEED_PULL_THRESHOLD = env.int('FEED_PULL_THRESHOLD', default=1000)
+# Обратно в ленты автор возвращается, только когда подписчиков стало
+# меньше этого порога: зазор не даёт перекладывать ленты при каждой
+# подписке и отписке у границы. Возвращает команда push_feeds.
+FEED_PUSH_THRESHOLD = env.int(
+    'FEED_PUSH_THRESHOLD', default=FEED_PULL_THRESHOLD * 4 // 5)
+
+# Кеш, общий для всех процессов сайта: memcache://host:port,
+# filecache:///path, dbcache://table. По умолчанию - память процесса.
 CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+# Сбросы версий в кеше памяти процесса не видны другим процессам:
+# с ним устаревшее живёт не дольше коротких таймаутов.
+SHARED_CACHE = not CACHES['default']['BACKEND'].endswith('.LocMemCache')
+
+# Время жизни фрагментов лент: в общем кеше их сбрасывает версия,
+# а не таймаут.
+FEED_CACHE_TIMEOUT = env.int(
+    'FEED_CACHE_TIMEOUT', default=60 * 60 * 6 if SHARED_CACHE else 60)
+
+# Время жизни страниц в общем кеше: их сбрасывают сигналы.
+PAGE_CACHE_TIMEOUT = env.int(
+    'PAGE_CACHE_TIMEOUT', default=60 * 60 if SHARED_CACHE else 5 * 60)
+# Сверять страницу из кеша с отметками изменений в базе (один запрос):
+# нужно, когда сбросы тегов в одном процессе не видны другим.
+PAGE_CACHE_VERIFY = env.bool('PAGE_CACHE_VERIFY', default=not SHARED_CACHE)
+
+# Размеры миниатюр постов: имя -> (геометрия, опции sorl-thumbnail).
+POST_THUMBNAILS = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
 }
+
+# Адаптивные варианты картинки поста: ширины для srcset и форматы
+# с качеством в порядке предпочтения. Форматы, которые не умеет
+# сохранять установленный Pillow, пропускаются.
+POST_IMAGE_WIDTHS = (480, 960, 1440, 1920)
+POST_IMAGE_FORMATS = {
+    'AVIF': 60,
+    'WEBP': 80,
+    'JPEG': 85,
+}
+
+# Миниатюры нарезаются в пуле процессов; 0 - сразу, в текущем процессе.
+THUMBNAIL_WORKERS = env.int('THUMBNAIL_WORKERS', default=2)
+
+THUMBNAIL_BACKEND = 'posts.thumbnails.PostThumbnailBackend'
+
+# Хранилища картинок постов и миниатюр. Для S3-совместимого хранилища:
+# core.storage.ContentAddressedS3Storage и core.storage.S3Storage.
+POST_IMAGE_STORAGE = env('POST_IMAGE_STORAGE', default='core.storage.ContentAddressedStorage')
+THUMBNAIL_STORAGE = env('THUMBNAIL_STORAGE', default='django.core.files.storage.FileSystemStorage')
+
+S3_ENDPOINT_URL = env('S3_ENDPOINT_URL', default='')
+S3_BUCKET = env('S3_BUCKET', default='yatube-media')
+S3_ACCESS_KEY = env('S3_ACCESS_KEY', default='')
+S3_SECRET_KEY = env('S3_SECRET_KEY', default='')
+S3_REGION = env('S3_REGION', default='us-east-1')
+# Адрес публичного бакета или CDN; без него url() подписывает ссылки.
+S3_PUBLIC_URL = env('S3_PUBLIC_URL', default='')
+# Срок жизни подписанной ссылки: больше времени жизни фрагментов лент.
+S3_URL_EXPIRES = env.int('S3_URL_EXPIRES', default=60 * 60 * 24)
+S3_MULTIPART_THRESHOLD = env.int('S3_MULTIPART_THRESHOLD', default=8 * 1024 * 1024)
+S3_MULTIPART_CHUNK_SIZE = env.int('S3_MULTIPART_CHUNK_SIZE', default=8 * 1024 * 1024)
+S3_POOL_SIZE = env.int('S3_POOL_SIZE', default=10)
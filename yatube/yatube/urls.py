@@ -15,15 +15,16 @@ Including another URLconf
 """
 # from django.conf import settings
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
+from core.views import media
 
 urlpatterns = [
     path('', include('posts.urls', namespace='posts')),
     path('auth/', include('users.urls', namespace='users')),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
+    path('api/v1/', include('api.urls', namespace='api')),
     path('admin/', admin.site.urls),
 ]
 
@@ -31,7 +32,9 @@ handler404 = 'core.views.page_not_found'
 handler403 = 'core.views.handler403'
 handler500 = 'core.views.handler500'
 
-if settings.DEBUG:
-    urlpatterns += static(
-        settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
-    )
+# Картинки в объектном хранилище раздаёт само хранилище (S3Storage.url)
+if not settings.MEDIA_URL.startswith(('http://', 'https://')):
+    urlpatterns += [
+        path(f'{settings.MEDIA_URL.lstrip("/")}<path:path>', media,
+             name='media'),
+    ]